@@ -1,7 +1,10 @@
+from typing import Optional
 from pydantic import BaseModel
 from fastapi import FastAPI
 
 
 class CropPrediction(BaseModel):
     postcode: str
-    acreage: float
\ No newline at end of file
+    acreage: float
+    # "xgboost" (default) or "climatology" for the fast baseline anomaly model
+    anomaly_mode: Optional[str] = None
\ No newline at end of file
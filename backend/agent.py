@@ -2,10 +2,50 @@ from typing import List, Dict
 from pydantic import BaseModel, Field
 import anthropic
 import json
-from weatherSubAgent import WeatherSubAgent 
+import math
+import os
+import time
+import breaker
+import metrics
+from log_setup import get_logger, debug_dumps_enabled
+from weatherSubAgent import WeatherSubAgent, get_nominatim
 from marketSubAgent import MarketSubAgent
 from soilPrediction import get_soil_from_postcode
-from hybrid_predictor import ImprovedHybridPredictor
+from hybrid_predictor import get_predictor
+import telemetry_store
+
+logger = get_logger(__name__)
+
+# Bump when the telemetry or prompt changes in a way that should invalidate cached strategies
+TELEMETRY_VERSION = 3
+
+# Bounds a slow Anthropic call; past this the rule-based fallback answers instead
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+
+
+def rescale_allocation(crop_data, acres):
+    """Scale an allocation proportionally to `acres`, rounded to 0.1 and summing exactly."""
+    total = sum(crop_data.values())
+    if total == 0:
+        return dict(crop_data)
+
+    # Scale proportionally
+    scale_factor = acres / total
+    fixed_data = {crop: round(value * scale_factor, 1) for crop, value in crop_data.items()}
+
+    # Handle rounding errors
+    total_fixed = sum(fixed_data.values())
+    diff = round(acres - total_fixed, 1)
+
+    if abs(diff) > 0.01:
+        # Add difference to largest non-zero allocation
+        non_zero_crops = {k: v for k, v in fixed_data.items() if v > 0}
+        if non_zero_crops:
+            max_crop = max(non_zero_crops, key=non_zero_crops.get)
+            fixed_data[max_crop] = round(fixed_data[max_crop] + diff, 1)
+
+    return fixed_data
 
 
 class FullAgentResponse(BaseModel):
@@ -50,124 +90,199 @@ Example BAD advice (too specific to acreage):
 """
 
 
+DEFAULT_SOIL = {
+    'clay': 35.0,
+    'sand': 35.0,
+    'silt': 30.0,
+    'texture_class': 'Clay Loam',
+    'drainage': 'Moderate',
+    'water_retention': 'Good',
+    'nutrient_retention': 'Good',
+    'workability': 'Moderate',
+    'description': 'Soil data unavailable - using regional defaults'
+}
+
+
+def format_soil_data(soil_result):
+    """Flatten a soilPrediction result into the telemetry soil dict (regional defaults if None)"""
+    if not soil_result:
+        return dict(DEFAULT_SOIL)
+    soil = {
+        'clay': soil_result['soil_data']['clay'],
+        'sand': soil_result['soil_data']['sand'],
+        'silt': soil_result['soil_data']['silt'],
+        'texture_class': soil_result['texture_class'],
+        'drainage': soil_result['properties']['drainage'],
+        'water_retention': soil_result['properties']['water_retention'],
+        'nutrient_retention': soil_result['properties']['nutrient_retention'],
+        'workability': soil_result['properties']['workability'],
+        'description': soil_result['properties']['description']
+    }
+    root_zone = soil_result.get('root_zone')
+    if root_zone:
+        soil['root_zone'] = {
+            'depth': root_zone['depth'],
+            'clay': root_zone['clay'],
+            'sand': root_zone['sand'],
+            'silt': root_zone['silt'],
+            'texture_class': root_zone['texture_class'],
+            'drainage': root_zone['properties']['drainage'],
+            'water_retention': root_zone['properties']['water_retention'],
+        }
+        soil['layers'] = soil_result['layers']
+    return soil
+
+
+def root_zone_summary(soil):
+    """One-line root-zone description for the prompt ('' without profile data)"""
+    rz = soil.get('root_zone')
+    if not rz:
+        return ''
+    return (f"{rz['texture_class']} ({rz['depth']}: Clay {rz['clay']:.1f}%, Sand {rz['sand']:.1f}%, "
+            f"Silt {rz['silt']:.1f}%; drainage {rz['drainage']})")
+
+
+def stale_entry(age_s):
+    return {'age_s': round(age_s)}
+
+
+def compute_telemetry(weather_agent, extreme_predictor, soil_data, stale=None):
+    """
+    Location/day telemetry from a trained WeatherSubAgent, the extreme-weather predictor and soil.
+
+    Returns None if the weather model could not score the data. Shared by Agent and the
+    nightly district precompute (precompute.py). 'stale' lists the inputs served from a last
+    known good copy because their upstream was unavailable; pass the ones already known.
+    """
+    # Get weather model analysis
+    weather_analysis = weather_agent.model.predict_risk_score(weather_agent.dataframe)
+    
+    if "error" in weather_analysis:
+        return None
+    
+    # Get extreme weather prediction
+    lat = weather_agent.lat
+    lon = weather_agent.long
+    
+    # Get current weather conditions from the dataframe
+    latest_data = weather_agent.dataframe.tail(1)
+    temp = float(latest_data['temperature_2m'].iloc[0]) if 'temperature_2m' in latest_data else 15.0
+    precip = float(latest_data['precipitation'].iloc[0]) if 'precipitation' in latest_data else 0.0
+    soil_moisture = 0.3  # Default if not available
+    wind = float(latest_data['wind_speed_10m'].iloc[0]) if 'wind_speed_10m' in latest_data else 10.0
+    
+    with metrics.stage("extreme_weather"):
+        extreme_pred = extreme_predictor.predict(lat, lon, temp, precip, soil_moisture, wind)
+    
+    # Format telemetry data
+    preds = weather_analysis['predictions']
+    stale = dict(stale or {})
+    if weather_agent.stale_age_s is not None:
+        stale['forecast'] = stale_entry(weather_agent.stale_age_s)
+    if extreme_pred['diagnostics'].get('history_stale_s') is not None:
+        stale['weather_history'] = stale_entry(extreme_pred['diagnostics']['history_stale_s'])
+    
+    return {
+        'extreme_weather': {
+            'likelihood': extreme_pred['prediction']['likelihood'],
+            'risk_level': extreme_pred['prediction']['risk'],
+            'region': extreme_pred['diagnostics']['region'],
+            'temperature_z_score': extreme_pred['diagnostics']['z_temp']
+        },
+        'weather_anomalies': {
+            'soil_temp_delta': preds['soil_temperature_0cm']['delta'],
+            'soil_temp_actual': preds['soil_temperature_0cm']['actual'],
+            'soil_temp_predicted': preds['soil_temperature_0cm']['predicted'],
+            'wind_speed_delta': preds['wind_speed_10m']['delta'],
+            'wind_speed_actual': preds['wind_speed_10m']['actual'],
+            'precipitation_prob_actual': preds['precipitation_probability']['actual'],
+            'precipitation_actual': preds['precipitation']['actual'],
+            'cloud_cover_actual': preds['cloud_cover']['actual'],
+            'overall_risk': weather_analysis['risk_level']
+        },
+        'soil': soil_data,
+        'stale': stale
+    }
+
+
 class Agent:
-    def __init__(self, postcode: str, acres: float):
+    def __init__(self, postcode: str, acres: float, anomaly_mode: str = None):
         self.postcode = postcode
         self.acres = acres
-        self.client = anthropic.Anthropic()
+        self.client = anthropic.Anthropic(timeout=LLM_TIMEOUT_S, max_retries=LLM_MAX_RETRIES)
+        # "llm" once Claude's answer is used, "fallback" for the rule-based response
+        self.response_source = None
+        # Inputs served from a last known good copy: {input: {'age_s': ...}}
+        self.stale = {}
         
         # Define all crops that must be included
         self.all_crops = ['corn', 'oat', 'wheat', 'soybean_meal', 'soybean_oil', 
                           'soybean', 'cocoa', 'coffee', 'cotton', 'sugar']
         
         # Initialize all sub-agents and models
-        print(f"Initializing Agent for postcode: {postcode}")
-        self.weatherAgent = WeatherSubAgent(postcode)
-        self.marketAgent = MarketSubAgent()
-        self.extreme_predictor = ImprovedHybridPredictor()
+        logger.info("Initializing agent for postcode %s", postcode)
+        self.extreme_predictor = get_predictor()
+
+        # Telemetry precomputed overnight for the postcode district, if fresh
+        with metrics.stage("precomputed_lookup"):
+            precomputed = telemetry_store.lookup(postcode, anomaly_mode)
+
+        if precomputed is not None:
+            self.telemetry_source = "precomputed"
+            self.weatherAgent = None
+            # Exact coordinates for the response; the telemetry itself is for the district centroid
+            location = get_nominatim("gb").query_postal_code(postcode)
+            if math.isnan(location.latitude):
+                self.lat, self.long = precomputed['latitude'], precomputed['longitude']
+            else:
+                self.lat, self.long = location.latitude, location.longitude
+            with metrics.stage("market"):
+                self.marketAgent = MarketSubAgent()
+            self._note_market_staleness()
+            self.ml_telemetry = {**precomputed['telemetry'], 'stale': self.stale}
+            self.soil_data = self.ml_telemetry['soil']
+            return
+
+        self.telemetry_source = "live"
+        with metrics.stage("weather"):
+            self.weatherAgent = WeatherSubAgent(postcode, mode=anomaly_mode)
+        self.lat = self.weatherAgent.lat
+        self.long = self.weatherAgent.long
+        with metrics.stage("market"):
+            self.marketAgent = MarketSubAgent()
+        self._note_market_staleness()
         
         # Get soil data
-        print("Fetching soil data...")
-        self.soil_data = self._get_soil_data()
+        with metrics.stage("soil"):
+            self.soil_data = self._get_soil_data()
         
         # Generate ML telemetry
-        self.ml_telemetry = self._generate_ml_telemetry()
+        with metrics.stage("telemetry"):
+            self.ml_telemetry = self._generate_ml_telemetry()
+
+    def _note_market_staleness(self):
+        if self.marketAgent.stale_age_s is not None:
+            self.stale['market_prices'] = stale_entry(self.marketAgent.stale_age_s)
 
     def _get_soil_data(self):
         """Fetch and format soil composition data"""
         try:
-            soil_result = get_soil_from_postcode(self.postcode, max_attempts=10)
-            
-            if soil_result:
-                return {
-                    'clay': soil_result['soil_data']['clay'],
-                    'sand': soil_result['soil_data']['sand'],
-                    'silt': soil_result['soil_data']['silt'],
-                    'texture_class': soil_result['texture_class'],
-                    'drainage': soil_result['properties']['drainage'],
-                    'water_retention': soil_result['properties']['water_retention'],
-                    'nutrient_retention': soil_result['properties']['nutrient_retention'],
-                    'workability': soil_result['properties']['workability'],
-                    'description': soil_result['properties']['description']
-                }
-            else:
-                return {
-                    'clay': 35.0,
-                    'sand': 35.0,
-                    'silt': 30.0,
-                    'texture_class': 'Clay Loam',
-                    'drainage': 'Moderate',
-                    'water_retention': 'Good',
-                    'nutrient_retention': 'Good',
-                    'workability': 'Moderate',
-                    'description': 'Soil data unavailable - using regional defaults'
-                }
+            result = get_soil_from_postcode(self.postcode, max_attempts=10)
+            if result and result.get('stale_age_s') is not None:
+                self.stale['soil'] = stale_entry(result['stale_age_s'])
+            return format_soil_data(result)
         except Exception as e:
-            print(f"Error fetching soil data: {e}")
-            return {
-                'clay': 35.0,
-                'sand': 35.0,
-                'silt': 30.0,
-                'texture_class': 'Clay Loam',
-                'drainage': 'Moderate',
-                'water_retention': 'Good',
-                'nutrient_retention': 'Good',
-                'workability': 'Moderate',
-                'description': 'Error retrieving soil data'
-            }
+            logger.warning("Error fetching soil data: %s", e)
+            return {**DEFAULT_SOIL, 'description': 'Error retrieving soil data'}
 
     def _generate_ml_telemetry(self):
         """Generate comprehensive ML telemetry from weather model predictions"""
         try:
-            # Get weather model analysis
-            weather_analysis = self.weatherAgent.model.predict_risk_score(self.weatherAgent.dataframe)
-            
-            if "error" in weather_analysis:
-                return self._get_fallback_telemetry()
-            
-            # Get extreme weather prediction
-            lat = self.weatherAgent.lat
-            lon = self.weatherAgent.long
-            
-            # Get current weather conditions from the dataframe
-            latest_data = self.weatherAgent.dataframe.tail(1)
-            temp = float(latest_data['temperature_2m'].iloc[0]) if 'temperature_2m' in latest_data else 15.0
-            precip = float(latest_data['precipitation'].iloc[0]) if 'precipitation' in latest_data else 0.0
-            soil_moisture = 0.3  # Default if not available
-            wind = float(latest_data['wind_speed_10m'].iloc[0]) if 'wind_speed_10m' in latest_data else 10.0
-            
-            extreme_pred = self.extreme_predictor.predict(lat, lon, temp, precip, soil_moisture, wind)
-            
-            # Format telemetry data
-            preds = weather_analysis['predictions']
-            
-            telemetry = {
-                'extreme_weather': {
-                    'likelihood': extreme_pred['prediction']['likelihood'],
-                    'risk_level': extreme_pred['prediction']['risk'],
-                    'region': extreme_pred['diagnostics']['region'],
-                    'temperature_z_score': extreme_pred['diagnostics']['z_temp']
-                },
-                'weather_anomalies': {
-                    'soil_temp_delta': preds['soil_temperature_0cm']['delta'],
-                    'soil_temp_actual': preds['soil_temperature_0cm']['actual'],
-                    'soil_temp_predicted': preds['soil_temperature_0cm']['predicted'],
-                    'wind_speed_delta': preds['wind_speed_10m']['delta'],
-                    'wind_speed_actual': preds['wind_speed_10m']['actual'],
-                    'precipitation_prob_actual': preds['precipitation_probability']['actual'],
-                    'precipitation_actual': preds['precipitation']['actual'],
-                    'cloud_cover_actual': preds['cloud_cover']['actual'],
-                    'overall_risk': weather_analysis['risk_level']
-                },
-                'soil': self.soil_data
-            }
+            telemetry = compute_telemetry(self.weatherAgent, self.extreme_predictor, self.soil_data, self.stale)
+            return telemetry if telemetry is not None else self._get_fallback_telemetry()
             
-            return telemetry
-            
-        except Exception as e:
-            print(f"Error generating ML telemetry: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error generating ML telemetry, using fallback telemetry")
             return self._get_fallback_telemetry()
     
     def _get_fallback_telemetry(self):
@@ -190,11 +305,13 @@ class Agent:
                 'cloud_cover_actual': 50.0,
                 'overall_risk': 'STABLE'
             },
-            'soil': self.soil_data
+            'soil': self.soil_data,
+            'stale': self.stale
         }
     
     def _get_fallback_response(self):
         """Fallback response when Claude returns empty data"""
+        self.response_source = "fallback"
         market_prices = self.marketAgent.results
         
         # Create mapping of all crops with market prices
@@ -279,6 +396,8 @@ class Agent:
 
     def get_weather_report(self):
         """Get formatted weather report from weather sub-agent"""
+        if self.weatherAgent is None:
+            return "Weather report unavailable: telemetry was precomputed for the district"
         return self.weatherAgent.get_strategy_signal()
 
     def get_market_report(self):
@@ -288,8 +407,17 @@ class Agent:
         all_prices = {}
         for crop in self.all_crops:
             all_prices[crop] = market_results.get(crop, 'N/A')
-        return "\n".join([f"{crop}: ${price:.2f}" if isinstance(price, (int, float)) else f"{crop}: {price}" 
+        return "\n".join([f"{crop}: ${price:.2f}{self._format_term_structure(crop)}" if isinstance(price, (int, float)) else f"{crop}: {price}" 
                          for crop, price in all_prices.items()])
+
+    def _format_term_structure(self, crop):
+        """Forward prices at the other curve horizons, e.g. ' (30d $451.20, 90d $455.10 [430-480])'"""
+        curve = getattr(self.marketAgent, 'curve', {}).get(crop)
+        if not curve:
+            return ""
+        points = [f"{p['horizon_days']}d ${p['forward']:.2f} [{p['low']:.0f}-{p['high']:.0f}]"
+                  for p in curve['curve'] if p['horizon_days'] != 180]
+        return f" (spot ${curve['spot']:.2f}; " + ", ".join(points) + ")"
     
     def format_telemetry_for_prompt(self):
         """Format ML telemetry data as a clear, structured prompt section"""
@@ -320,6 +448,7 @@ SOIL ANALYSIS:
   - Nutrient Retention: {t['soil']['nutrient_retention']}
   - Workability: {t['soil']['workability']}
   - Description: {t['soil']['description']}
+  - Root Zone: {root_zone_summary(t['soil']) or 'n/a'}
 """
         return formatted
 
@@ -342,12 +471,22 @@ CURRENT CONDITIONS:
 - Weather Risk: {t['weather_anomalies']['overall_risk']}
 
 SOIL: {t['soil']['texture_class']} - Drainage: {t['soil']['drainage']}, Water Retention: {t['soil']['water_retention']}, Workability: {t['soil']['workability']}
+ROOT ZONE: {root_zone_summary(t['soil']) or 'n/a'}
 
-MARKET PRICES (180-day futures):
+MARKET PRICES (180-day futures; spot and other horizons with 10-90% bands in brackets):
 {self.get_market_report()}"""
         
+        try:
+            breaker.check("anthropic")
+        except breaker.CircuitOpen as e:
+            logger.warning("%s, using fallback response", e)
+            return self._get_fallback_response()
+
         # First, try to get Claude's response WITHOUT structured output
+        llm_start = None
+        llm_done = False
         try:
+            llm_start = time.perf_counter()
             response = self.client.messages.create(
                 model="claude-sonnet-4-5-20250929",
                 max_tokens=2000,
@@ -399,14 +538,15 @@ CRITICAL RULES:
                     }
                 ]
             )
+            llm_done = True
+            llm_seconds = time.perf_counter() - llm_start
+            breaker.record("anthropic", llm_seconds, ok=True)
+            metrics.record_stage("llm", llm_seconds)
+            metrics.record_llm_usage(getattr(response, "usage", None))
             
-            # Debug: Print raw response
             raw_response = response.content[0].text
-            print("\n" + "="*60)
-            print("RAW CLAUDE RESPONSE:")
-            print("="*60)
-            print(raw_response)
-            print("="*60 + "\n")
+            if debug_dumps_enabled(logger):
+                logger.debug("Raw Claude response: %s", raw_response)
             
             # Clean the response - remove markdown code blocks if present
             cleaned_response = raw_response.strip()
@@ -420,20 +560,15 @@ CRITICAL RULES:
             
             # Check if response is literally empty JSON
             if cleaned_response in ['{}', '{"crop_data":{},"advice":{}}', '']:
-                print("ERROR: Claude returned literally empty JSON")
-                print("This usually means:")
-                print("  1. Prompt is too complex/long")
-                print("  2. Schema validation failed")
-                print("  3. Model refused the request")
-                print("Falling back to intelligent response...")
+                # Usually an over-long prompt, a schema failure or a refusal
+                logger.error("Claude returned empty JSON, using fallback response")
                 return self._get_fallback_response()
             
             try:
                 parsed_response = json.loads(cleaned_response)
             except json.JSONDecodeError as je:
-                print(f"ERROR: Failed to parse JSON: {je}")
-                print(f"Response was: {cleaned_response[:200]}")
-                print("Using fallback response...")
+                logger.error("Failed to parse Claude JSON (%s), using fallback response; response started: %.200s",
+                             je, cleaned_response)
                 return self._get_fallback_response()
             
             # Validate response has required fields with actual data
@@ -444,30 +579,30 @@ CRITICAL RULES:
             crop_data = self._ensure_all_crops(crop_data)
             
             if not crop_data or not advice:
-                print("WARNING: Claude returned empty response, using intelligent fallback...")
+                logger.warning("Claude returned empty crop_data or advice, using fallback response")
                 return self._get_fallback_response()
             
             # Check if crop_data is actually empty (all zeros or no allocations)
             non_zero_crops = [v for v in crop_data.values() if v > 0]
             if len(non_zero_crops) == 0:
-                print("WARNING: All crop allocations are zero, using fallback...")
+                logger.warning("All crop allocations are zero, using fallback response")
                 return self._get_fallback_response()
             
             # Validate crop allocation sums correctly
             total_allocated = sum(crop_data.values())
             if abs(total_allocated - self.acres) > 0.5:
-                print(f"WARNING: Allocation mismatch ({total_allocated} vs {self.acres}), adjusting...")
+                logger.warning("Allocation mismatch (%s vs %s acres), rescaling", total_allocated, self.acres)
                 crop_data = self._fix_allocation(crop_data)
                 parsed_response['crop_data'] = crop_data
             
-            print(f"✓ Valid response: {len(non_zero_crops)} non-zero crops, {len(advice)} advice categories")
+            logger.info("Valid response: %d non-zero crops, %d advice categories", len(non_zero_crops), len(advice))
+            self.response_source = "llm"
             return parsed_response
             
-        except Exception as e:
-            print(f"Error in Claude API call: {e}")
-            import traceback
-            traceback.print_exc()
-            print("Using intelligent fallback response...")
+        except Exception:
+            if llm_start is not None and not llm_done:
+                breaker.record("anthropic", time.perf_counter() - llm_start, ok=False)
+            logger.exception("Error in Claude API call, using fallback response")
             return self._get_fallback_response()
     
     def _ensure_all_crops(self, crop_data):
@@ -481,27 +616,7 @@ CRITICAL RULES:
         """Fix crop allocation to sum to exact acreage"""
         # Ensure all crops are present
         crop_data = self._ensure_all_crops(crop_data)
-        
-        total = sum(crop_data.values())
-        if total == 0:
-            return crop_data
-        
-        # Scale proportionally
-        scale_factor = self.acres / total
-        fixed_data = {crop: round(acres * scale_factor, 1) for crop, acres in crop_data.items()}
-        
-        # Handle rounding errors
-        total_fixed = sum(fixed_data.values())
-        diff = round(self.acres - total_fixed, 1)
-        
-        if abs(diff) > 0.01:
-            # Add difference to largest non-zero allocation
-            non_zero_crops = {k: v for k, v in fixed_data.items() if v > 0}
-            if non_zero_crops:
-                max_crop = max(non_zero_crops, key=non_zero_crops.get)
-                fixed_data[max_crop] = round(fixed_data[max_crop] + diff, 1)
-        
-        return fixed_data
+        return rescale_allocation(crop_data, self.acres)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,7 @@
 import pandas as pd
 import numpy as np
 import os
-import glob
 import json
-from tqdm import tqdm
 
 class AnomalyLabeler:
     FEATURE_COLS = [
@@ -28,13 +26,15 @@ class AnomalyLabeler:
         seasonal_summary = {}
 
         for v in vars_to_process:
-            grouped = df.groupby('month')[v].agg(['mean', 'std']).to_dict()
+            # Stats and z-scores in float64 so labels do not depend on the storage dtype
+            values = df[v].astype('float64')
+            grouped = values.groupby(df['month']).agg(['mean', 'std']).to_dict()
             seasonal_summary[v] = grouped
             mean_vals = df['month'].map(grouped['mean'])
             std_vals = df['month'].map(grouped['std'])
             
-            df[v + "_z_score"] = (df[v] - mean_vals) / (std_vals + 1e-6)
-            df[v + "_is_extreme"] = (np.abs(df[v + "_z_score"]) > self.z_threshold).astype(int)
+            df[v + "_z_score"] = (values - mean_vals) / (std_vals + 1e-6)
+            df[v + "_is_extreme"] = (np.abs(df[v + "_z_score"]) > self.z_threshold).astype('int8')
             extreme_flags.append(df[v + "_is_extreme"])
             
             for lag in [24, 48, 72]:
@@ -44,17 +44,17 @@ class AnomalyLabeler:
         return df.dropna().reset_index(drop=True), seasonal_summary
 
 if __name__ == "__main__":
+    from tqdm import tqdm
+    from weather_dataset import list_regions, load_region, save_region
+
     labeler = AnomalyLabeler()
-    if not os.path.exists("data/labeled"): os.makedirs("data/labeled")
     if not os.path.exists("models"): os.makedirs("models")
     all_stats = {}
 
-    files = glob.glob("data/raw/*.parquet")
-    for f in tqdm(files, desc="Labeling Anomalies"):
-        name = os.path.basename(f).replace(".parquet", "")
-        df_processed, region_stats = labeler.label_extremes(pd.read_parquet(f))
+    for name in tqdm(list_regions("raw"), desc="Labeling Anomalies"):
+        df_processed, region_stats = labeler.label_extremes(load_region("raw", name, compact=False))
         all_stats[name] = region_stats
-        df_processed.to_parquet("data/labeled/" + name + "_labeled.parquet", index=False)
+        save_region(df_processed, "labeled", name)
 
     with open("models/seasonal_stats.json", "w") as jf:
         json.dump(all_stats, jf)
\ No newline at end of file
@@ -0,0 +1,10 @@
+"""
+Names of the weather anomaly estimators (weatherSubAgent.ANOMALY_MODES).
+
+Kept free of heavy imports so the server can validate a request's anomaly_mode on the
+event loop without loading the model modules.
+"""
+import os
+
+ANOMALY_MODE_NAMES = ("xgboost", "climatology")
+DEFAULT_ANOMALY_MODE = os.getenv("WEATHER_ANOMALY_MODE", "xgboost")
@@ -0,0 +1,188 @@
+"""
+Backtest the regional extreme-weather models over the full labeled history.
+
+Replays ImprovedHybridPredictor scoring for every hour in the labeled dataset. Z-scores are
+rebuilt from the active model's seasonal stats, as in serving, and each region's booster
+scores its whole history in one predict_proba call. Regions run in a process pool.
+
+Reports AUC per month and per year, a calibration curve, and alert hit / false-alarm rates
+at the HIGH (0.5) and EXTREME (0.85) thresholds, all on model_trainer's 20% test split
+(`held_out`). `overall` repeats the metrics over every row, including the ones the model
+was trained on, so it flatters the model.
+
+Run from backend/:
+    python backtest.py                                 # all regions -> models/backtest.json
+    python backtest.py --regions east_anglia,midlands --workers 2
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from log_setup import configure_logging, get_logger
+
+logger = get_logger(__name__)
+
+CALIBRATION_BINS = 10
+_predictor = None
+
+
+def _init_worker(model_dir):
+    global _predictor
+    from hybrid_predictor import ImprovedHybridPredictor
+
+    configure_logging()
+    _predictor = ImprovedHybridPredictor(model_dir=model_dir,
+                                         stats_file=os.path.join(model_dir, "seasonal_stats.json"))
+
+
+def roc_auc(y, p):
+    """ROC AUC, or None when only one class is present."""
+    from sklearn.metrics import roc_auc_score
+
+    if y.min() == y.max():
+        return None
+    return round(float(roc_auc_score(y, p)), 4)
+
+
+def alert_rates(y, p, threshold):
+    """Hit rate, false-alarm ratio (share of alerts that were wrong) and false-alarm rate."""
+    alert = p > threshold
+    event = y == 1
+    hits = int((alert & event).sum())
+    false_alarms = int((alert & ~event).sum())
+    events, alerts, quiet = int(event.sum()), int(alert.sum()), int((~event).sum())
+    return {
+        "alerts": alerts,
+        "hit_rate": round(hits / events, 4) if events else None,
+        "false_alarm_ratio": round(false_alarms / alerts, 4) if alerts else None,
+        "false_alarm_rate": round(false_alarms / quiet, 4) if quiet else None,
+    }
+
+
+def calibration_curve(y, p, bins=CALIBRATION_BINS):
+    """Mean predicted probability against observed event rate in equal-width bins."""
+    idx = np.minimum((p * bins).astype(int), bins - 1)
+    count = np.bincount(idx, minlength=bins)
+    predicted = np.bincount(idx, weights=p, minlength=bins)
+    observed = np.bincount(idx, weights=y, minlength=bins)
+    return [
+        {"bin": [round(i / bins, 2), round((i + 1) / bins, 2)], "count": int(count[i]),
+         "mean_predicted": round(predicted[i] / count[i], 4), "observed_rate": round(observed[i] / count[i], 4)}
+        for i in range(bins) if count[i]
+    ]
+
+
+def summarise(y, p):
+    from hybrid_predictor import EXTREME_THRESHOLD, HIGH_THRESHOLD
+
+    return {
+        "rows": int(len(y)),
+        "events": int(y.sum()),
+        "auc": roc_auc(y, p),
+        "brier": round(float(np.mean((p - y) ** 2)), 5),
+        "high": alert_rates(y, p, HIGH_THRESHOLD),
+        "extreme": alert_rates(y, p, EXTREME_THRESHOLD),
+    }
+
+
+def held_out_mask(y):
+    """model_trainer's test split (same order, stratification and seed)."""
+    from sklearn.model_selection import train_test_split
+    from model_trainer import SPLIT_SEED, TEST_SIZE
+
+    _, test_idx = train_test_split(np.arange(len(y)), test_size=TEST_SIZE, stratify=y, random_state=SPLIT_SEED)
+    mask = np.zeros(len(y), dtype=bool)
+    mask[test_idx] = True
+    return mask
+
+
+def backtest_region(region):
+    from hybrid_predictor import EXTREME_VARS, LAGS
+    from weather_dataset import load_region
+
+    if region not in _predictor.models:
+        logger.warning("No model for region %s, skipping", region)
+        return region, None
+
+    start = time.perf_counter()
+    lag_cols = [f"{v}_lag_{lag}h" for v in EXTREME_VARS for lag in LAGS]
+    df = load_region("labeled", region, columns=EXTREME_VARS + lag_cols + ["target"])
+    frame = df[EXTREME_VARS + lag_cols].assign(month=df["timestamp"].dt.month)
+    y = df["target"].to_numpy(dtype=np.int8)
+    p = _predictor.predict_proba_frame(region, frame).astype(np.float64)
+    scored_s = time.perf_counter() - start
+
+    test = held_out_mask(y)
+    y_test, p_test = y[test], p[test]
+    by_period = {}
+    for period in ("month", "year"):
+        keys = getattr(df["timestamp"].dt, period).to_numpy()[test]
+        by_period[period] = {int(k): summarise(y_test[keys == k], p_test[keys == k]) for k in np.unique(keys)}
+
+    return region, {
+        "overall": summarise(y, p),
+        "held_out": summarise(y_test, p_test),
+        "by_month": by_period["month"],
+        "by_year": by_period["year"],
+        "calibration": calibration_curve(y_test, p_test),
+        "first": df["timestamp"].iloc[0].isoformat(),
+        "last": df["timestamp"].iloc[-1].isoformat(),
+        "scoring_s": round(scored_s, 2),
+        "elapsed_s": round(time.perf_counter() - start, 2),
+    }
+
+
+def run(regions=None, model_dir="models", workers=None):
+    from weather_dataset import list_regions
+
+    regions = regions or list_regions("labeled")
+    workers = max(1, min(workers or os.cpu_count() or 1, len(regions)))
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_dir,)) as pool:
+        results = {region: r for region, r in pool.map(backtest_region, regions) if r is not None}
+    logger.info("Backtested %d regions in %.1fs", len(results), time.perf_counter() - start)
+    return results
+
+
+def print_report(results):
+    print(f"{'region':12} {'rows':>8} {'in-sample':>9} {'AUC':>7} {'worst month':>12} "
+          f"{'hit@0.5':>8} {'FAR@0.5':>8} {'hit@0.85':>8} {'FAR@0.85':>8}")
+
+    def fmt(value):
+        return f"{value:.4f}" if value is not None else "-"
+
+    for region, r in sorted(results.items()):
+        months = {m: s["auc"] for m, s in r["by_month"].items() if s["auc"] is not None}
+        worst = min(months, key=months.get) if months else None
+        worst_txt = f"{worst:>2}: {months[worst]:.4f}" if worst else "-"
+        o = r["held_out"]
+        print(f"{region:12} {o['rows']:>8} {fmt(r['overall']['auc']):>9} {fmt(o['auc']):>7} {worst_txt:>12} "
+              f"{fmt(o['high']['hit_rate']):>8} {fmt(o['high']['false_alarm_ratio']):>8} "
+              f"{fmt(o['extreme']['hit_rate']):>8} {fmt(o['extreme']['false_alarm_ratio']):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--regions", help="comma-separated regions (default: every labeled region)")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--workers", type=int, help="processes (default: CPU count)")
+    parser.add_argument("--output", help="report path (default: <model-dir>/backtest.json)")
+    args = parser.parse_args()
+
+    configure_logging()
+    regions = [r.strip() for r in args.regions.split(",")] if args.regions else None
+    start = time.perf_counter()
+    results = run(regions, args.model_dir, args.workers)
+    output = args.output or os.path.join(args.model_dir, "backtest.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print_report(results)
+    print(f"\nWrote {output} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Offline per-stage and end-to-end benchmark of the /predict-crops pipeline.
+
+Every upstream call and postcode lookup is served from benchmarks/fixtures, so runs are
+repeatable and need no network. Only synthetic upstream fixtures are committed; record
+real ones locally to benchmark on them. For each stage it reports p50/p95/p99 latency over
+--iterations timed runs, plus the peak and retained Python allocations of one extra run under
+tracemalloc (native allocations inside XGBoost are not visible to tracemalloc).
+
+Results are written to benchmarks/results/<commit>.json; pass --compare with an earlier
+result file to print the change per stage.
+
+Run from backend/:
+    python -m benchmarks.bench_pipeline --iterations 20
+    python -m benchmarks.bench_pipeline --stages weather_train,predict_risk_score
+    python -m benchmarks.bench_pipeline --compare benchmarks/results/a03fe34.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks import fixtures
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+STAGES = ["geocode", "weather_train", "predict_risk_score", "extreme_predict", "soil",
+          "market_curve", "get_crops"]
+
+
+def build_stages(postcode, acreage):
+    """{stage: zero-argument callable}; must run inside fixtures.replay()."""
+    import marketPrediction
+    from hybrid_predictor import get_predictor
+    from marketSubAgent import TICKER_DICT
+    from server import getCrops
+    import soilPrediction
+    from weatherPrediction import WeatherModel
+    from weatherSubAgent import get_nominatim
+    from weather_schema import frame_from_hourly
+
+    forecast, _ = fixtures.load("open_meteo_forecast")
+    df = frame_from_hourly(forecast["hourly"])
+    location = get_nominatim("gb").query_postal_code(postcode)
+    predictor = get_predictor()
+    trained = WeatherModel()
+    trained.train(df, parallel=True)
+    last = df.iloc[-1]
+
+    def market_curve():
+        # Measure the download-free reduction, not a cache hit
+        marketPrediction.price_cache.clear()
+        marketPrediction.curve_cache.clear()
+        return marketPrediction.MarketModel(TICKER_DICT).get_forward_curve()
+
+    def soil():
+        # The full profile query and classification, not a cache hit
+        soilPrediction.profiles.clear()
+        return soilPrediction.get_soil_from_postcode(postcode)
+
+    def get_crops():
+        result = getCrops(postcode, acreage, use_cache=False)
+        if "error" in result:
+            raise RuntimeError(result["details"])
+        return result
+
+    return {
+        "geocode": lambda: get_nominatim("gb").query_postal_code(postcode),
+        "weather_train": lambda: WeatherModel().train(df, parallel=True),
+        "predict_risk_score": lambda: trained.predict_risk_score(df),
+        "extreme_predict": lambda: predictor.predict(location.latitude, location.longitude,
+                                                     float(last["temperature_2m"]), float(last["precipitation"]),
+                                                     0.3, float(last["wind_speed_10m"])),
+        "soil": soil,
+        "market_curve": market_curve,
+        "get_crops": get_crops,
+    }
+
+
+def measure(fn, iterations, warmup):
+    for _ in range(warmup):
+        fn()
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    ms = np.array(timings) * 1000
+    return {
+        "n": iterations,
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "min_ms": round(float(ms.min()), 3),
+        "peak_alloc_kb": round((peak - before) / 1024, 1),
+        "retained_alloc_kb": round((current - before) / 1024, 1),
+    }
+
+
+def commit_id():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, check=True).stdout.strip()
+        return sha + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(result, baseline=None):
+    base = (baseline or {}).get("stages", {})
+    print(f"\n{'stage':20} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'peak KiB':>10} {'kept KiB':>10}"
+          + ("   p50 vs base" if base else ""))
+    for name, s in result["stages"].items():
+        line = (f"{name:20} {s['p50_ms']:10.2f} {s['p95_ms']:10.2f} {s['p99_ms']:10.2f} "
+                f"{s['peak_alloc_kb']:10.1f} {s['retained_alloc_kb']:10.1f}")
+        if name in base and base[name]["p50_ms"]:
+            line += f"   {(s['p50_ms'] / base[name]['p50_ms'] - 1) * 100:+7.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--postcode", default="SW1A 1AA")
+    parser.add_argument("--acreage", type=float, default=10.0)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset of " + ",".join(STAGES))
+    parser.add_argument("--compare", metavar="RESULT_JSON", help="earlier result file to diff against")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    selected = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = sorted(set(selected) - set(STAGES))
+    if unknown:
+        parser.error(f"unknown stages: {unknown}")
+
+    with fixtures.replay() as sources:
+        stages = build_stages(args.postcode, args.acreage)
+        result = {
+            "commit": commit_id(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "postcode": args.postcode,
+            "fixtures": {k: "recorded" if v else "synthetic" for k, v in sources.items()},
+            "stages": {},
+        }
+        for name in selected:
+            print(f"Benchmarking {name}...", flush=True)
+            result["stages"][name] = measure(stages[name], args.iterations, args.warmup)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Comparing against {baseline.get('commit')} ({baseline.get('timestamp')})")
+    print_report(result, baseline)
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, result["commit"] + ".json")
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nSaved {path}")
+
+
+if __name__ == "__main__":
+    main()
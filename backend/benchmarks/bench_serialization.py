@@ -0,0 +1,128 @@
+"""
+Serialisation and compression microbenchmark for API response bodies.
+
+Encodes a /predict-crops response and a /market/history response with the stdlib encoder
+Starlette used, FastAPI's default path (jsonable_encoder + JSONResponse) and orjson
+(responses.dumps). It then compresses the orjson bytes with gzip and brotli at the levels
+the server uses and at maximum. Reports throughput and payload size.
+
+Run from backend/:
+    python -m benchmarks.bench_serialization --seconds 1
+"""
+import argparse
+import gzip
+import json
+import time
+
+import brotli
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import responses
+from benchmarks import fixtures
+
+
+def predict_payload():
+    """A /predict-crops body shaped like a cached strategy response."""
+    llm, _ = fixtures.load("anthropic")
+    answer = json.loads(llm["text"])
+    # Real advice runs to several sentences per point and several points per category
+    advice = {category: points * 4 for category, points in answer["advice"].items()}
+    telemetry = {
+        "extreme_weather": {"likelihood": "12.5%", "risk_level": "LOW", "region": "southeast",
+                            "temperature_z_score": -0.42},
+        "weather_anomalies": {"soil_temp_delta": 1.3, "soil_temp_actual": 7.9, "soil_temp_predicted": 6.6,
+                              "wind_speed_delta": -2.1, "wind_speed_actual": 14.2,
+                              "precipitation_prob_actual": 35.0, "precipitation_actual": 0.4,
+                              "cloud_cover_actual": 78.0, "overall_risk": "STABLE"},
+        "soil": {"texture_class": "Loam", "clay_pct": 24.0, "sand_pct": 38.0, "silt_pct": 38.0},
+    }
+    return {
+        "crop_data": answer["crop_data"],
+        "advice": advice,
+        "metadata": {"postcode": "SW1A 1AA", "total_acres": 10.0, "ml_telemetry": telemetry,
+                     "coordinates": {"latitude": 51.501, "longitude": -0.1416},
+                     "cache": {"status": "fresh", "etag": '"' + "0" * 40 + '"'}},
+    }
+
+
+def history_payload(points=300):
+    """A /market/history body: every crop downsampled to `points`."""
+    raw, _ = fixtures.load("yahoo_finance")
+    dates = raw["dates"][-points:]
+    return {"as_of": dates[-1], "period": "5y", "points": points, "crops": {
+        ticker: {"dates": dates, "price_trend": [None if v is None else round(v, 2) for v in closes[-points:]]}
+        for ticker, closes in raw["close"].items()
+    }}
+
+
+def stdlib(content):
+    return json.dumps(content).encode()
+
+
+def starlette(content):
+    return JSONResponse(content).body
+
+
+def fastapi_default(content):
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+ENCODERS = {"json.dumps": stdlib, "starlette": starlette, "fastapi": fastapi_default, "orjson": responses.dumps}
+COMPRESSORS = {
+    f"gzip-{responses.COMPRESS_GZIP_LEVEL}": lambda b: gzip.compress(b, compresslevel=responses.COMPRESS_GZIP_LEVEL),
+    "gzip-9": lambda b: gzip.compress(b, compresslevel=9),
+    f"br-{responses.COMPRESS_BROTLI_QUALITY}": lambda b: brotli.compress(b, quality=responses.COMPRESS_BROTLI_QUALITY),
+    "br-11": lambda b: brotli.compress(b, quality=11),
+}
+
+
+def throughput(fn, arg, seconds):
+    """Calls per second of fn(arg), timed over roughly `seconds`."""
+    fn(arg)
+    calls, start = 0, time.perf_counter()
+    while True:
+        for _ in range(50):
+            fn(arg)
+        calls += 50
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return calls / elapsed
+
+
+def run(seconds):
+    results = {}
+    for name, payload in (("predict-crops", predict_payload()), ("market-history", history_payload())):
+        body = responses.dumps(payload)
+        rows = {enc: {"ops_s": round(throughput(fn, payload, seconds)), "bytes": len(fn(payload))}
+                for enc, fn in ENCODERS.items()}
+        for comp, fn in COMPRESSORS.items():
+            rows[comp] = {"ops_s": round(throughput(fn, body, seconds)), "bytes": len(fn(body))}
+        results[name] = rows
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=1.0, help="timing window per measurement")
+    parser.add_argument("--json", action="store_true", help="print raw results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.seconds)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, rows in results.items():
+        raw = rows["orjson"]["bytes"]
+        print(f"\n{name} ({raw} bytes as JSON)")
+        print(f"  {'':12} {'ops/s':>10} {'us/op':>8} {'bytes':>8} {'ratio':>6}")
+        for label, r in rows.items():
+            print(f"  {label:12} {r['ops_s']:>10} {1e6 / r['ops_s']:>8.1f} {r['bytes']:>8} "
+                  f"{r['bytes'] / raw:>6.2f}")
+    print("\nSpeed-up of orjson over FastAPI's default: "
+          + ", ".join(f"{name} {rows['orjson']['ops_s'] / rows['fastapi']['ops_s']:.1f}x"
+                      for name, rows in results.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Cold-start benchmark for the API server.
+
+Measures, each in a fresh interpreter:
+  - time to `import server` and which training-only modules it pulled in
+  - time from process start until /ready returns 200 (warm-up finished)
+  - time until the first successful /health and (optionally) /predict-crops request
+
+Run from backend/:
+    python -m benchmarks.bench_startup --runs 3
+    python -m benchmarks.bench_startup --predict "SW1A 1AA"     # needs upstream APIs
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+# Must never be imported by the serving process
+TRAINING_ONLY = ["sklearn", "tqdm", "weather_dataset", "pyarrow.dataset"]
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import server
+elapsed = time.perf_counter() - start
+print(json.dumps({"import_s": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def measure_import():
+    out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], capture_output=True, text=True, check=True)
+    data = json.loads(out.stdout.strip().splitlines()[-1])
+    leaked = [m for m in TRAINING_ONLY if m in data["modules"]]
+    return data["import_s"], leaked
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, start, timeout, method="GET", body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    while time.perf_counter() - start < timeout:
+        try:
+            req = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                if resp.status == 200:
+                    return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.05)
+    return None
+
+
+def measure_server(timeout, predict):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, "WARMUP_MARKET": os.getenv("WARMUP_MARKET", "0")},
+    )
+    try:
+        result = {
+            "first_health_s": wait_for(base + "/health", start, timeout),
+            "ready_s": wait_for(base + "/ready", start, timeout),
+        }
+        if predict:
+            result["first_predict_s"] = wait_for(base + "/predict-crops", start, timeout, "POST",
+                                                 {"postcode": predict, "acreage": 10.0})
+        return result
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--predict", metavar="POSTCODE", help="also time the first /predict-crops")
+    args = parser.parse_args()
+
+    imports, runs = [], []
+    for _ in range(args.runs):
+        elapsed, leaked = measure_import()
+        imports.append(elapsed)
+        runs.append(measure_server(args.timeout, args.predict))
+
+    print(f"import server       median {np.median(imports):6.3f}s")
+    if leaked:
+        print(f"  training-only modules imported: {leaked}")
+    for key in runs[0]:
+        values = [r[key] for r in runs if r[key] is not None]
+        if values:
+            print(f"{key:18} median {np.median(values):6.3f}s  ({len(values)}/{len(runs)} succeeded)")
+        else:
+            print(f"{key:18} never succeeded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark WeatherModel.train: serial per-target loop vs shared-matrix parallel mode.
+
+Run from backend/:
+    python -m benchmarks.bench_weather_train --repeat 3 --threads 8
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from weatherPrediction import WeatherModel
+from benchmarks.synthetic import forecast_frame
+
+
+def time_train(df, repeat, **kwargs):
+    timings = []
+    model = None
+    for _ in range(repeat):
+        model = WeatherModel()
+        start = time.perf_counter()
+        model.train(df, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return timings, model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=os.cpu_count())
+    parser.add_argument("--past-days", type=int, default=92)
+    args = parser.parse_args()
+
+    df = forecast_frame(past_days=args.past_days)
+    print(f"Training frame: {len(df)} rows, {args.threads} threads\n")
+
+    modes = {
+        "serial": {},
+        "parallel": {"parallel": True, "n_threads": args.threads},
+        "parallel+multi_output": {"parallel": True, "n_threads": args.threads, "multi_output": True},
+    }
+
+    baseline = None
+    for name, kwargs in modes.items():
+        timings, model = time_train(df, args.repeat, **kwargs)
+        analysis = model.predict_risk_score(df)
+        best = min(timings)
+        baseline = baseline or best
+        print(f"{name:24} best {best:6.2f}s  median {np.median(timings):6.2f}s  "
+              f"speedup x{baseline / best:4.2f}  risk={analysis['risk_level']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Offline accuracy/latency comparison of the weather anomaly modes.
+
+For a set of evaluation hours near the end of each frame, both models are trained on the
+history before that hour and asked to predict it, so the scored hour is always held out. Reports per-target MAE, risk_level
+agreement with the XGBoost mode and train+predict latency.
+
+Run from backend/:
+    python -m benchmarks.compare_anomaly_modes --frames 3 --points 12
+    python -m benchmarks.compare_anomaly_modes --fixture fixtures/forecast_sw1a.json
+"""
+import argparse
+import json
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from weatherSubAgent import ANOMALY_MODES
+from benchmarks.synthetic import forecast_frame
+
+
+def load_frames(args):
+    if args.fixture:
+        frames = []
+        for path in args.fixture:
+            with open(path) as f:
+                frames.append(pd.DataFrame(json.load(f)["hourly"]))
+        return frames
+    return [forecast_frame(seed=seed) for seed in range(args.frames)]
+
+
+def evaluate(frames, points, step):
+    errors = {mode: defaultdict(list) for mode in ANOMALY_MODES}
+    risks = {mode: [] for mode in ANOMALY_MODES}
+    latency = {mode: [] for mode in ANOMALY_MODES}
+
+    for df in frames:
+        # Evaluate the last `points` hours of observed history, `step` hours apart
+        for k in range(points):
+            history = df.iloc[:len(df) - k * step]
+            for mode, model_cls in ANOMALY_MODES.items():
+                start = time.perf_counter()
+                model = model_cls()
+                # The last row is the hour being scored; keep it out of training
+                model.train(history.iloc[:-1])
+                analysis = model.predict_risk_score(history)
+                latency[mode].append(time.perf_counter() - start)
+
+                risks[mode].append(analysis["risk_level"])
+                for target, p in analysis["predictions"].items():
+                    errors[mode][target].append(abs(p["delta"]))
+
+    return errors, risks, latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=3, help="synthetic frames (ignored with --fixture)")
+    parser.add_argument("--fixture", action="append", help="recorded Open-Meteo forecast JSON")
+    parser.add_argument("--points", type=int, default=12, help="evaluation hours per frame")
+    parser.add_argument("--step", type=int, default=6, help="hours between evaluation points")
+    args = parser.parse_args()
+
+    errors, risks, latency = evaluate(load_frames(args), args.points, args.step)
+
+    targets = list(errors["xgboost"].keys())
+    print(f"{'target':28}" + "".join(f"{m + ' MAE':>18}" for m in ANOMALY_MODES))
+    for target in targets:
+        print(f"{target:28}" + "".join(f"{np.mean(errors[m][target]):>18.3f}" for m in ANOMALY_MODES))
+
+    print()
+    for mode in ANOMALY_MODES:
+        agree = np.mean([a == b for a, b in zip(risks[mode], risks["xgboost"])])
+        print(f"{mode:12} p50 {np.percentile(latency[mode], 50) * 1000:8.1f}ms  "
+              f"p95 {np.percentile(latency[mode], 95) * 1000:8.1f}ms  "
+              f"risk agreement with xgboost {agree:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Upstream responses for offline benchmarks.
+
+Covers the four services the request path talks to: Open-Meteo (forecast + archive),
+SoilGrids, Yahoo Finance and Anthropic. `replay()` patches the clients so nothing leaves
+the machine; any fixture that has not been recorded is synthesised deterministically.
+
+Only the synthetic fixtures ship with the repo, so benchmark numbers measure our own code on
+synthetic payloads of realistic size, not real upstream data. Each result file lists which
+fixtures were recorded. Postcodes resolve against a small pgeocode GB table in
+benchmarks/fixtures/pgeocode (approximate centroids of the districts the benchmarks use),
+so pgeocode never downloads its full table.
+
+Record real responses locally (needs network and ANTHROPIC_API_KEY), from backend/:
+    python -m benchmarks.fixtures record --postcode "SW1A 1AA"
+"""
+import argparse
+import json
+import os
+import time
+from contextlib import ExitStack, contextmanager
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import forecast_hourly
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+POSTCODE_DIR = os.path.join(FIXTURE_DIR, "pgeocode")
+SERVICES = ("open_meteo_forecast", "open_meteo_archive", "soilgrids", "yahoo_finance", "anthropic")
+
+
+def service_for_url(url):
+    if "archive-api.open-meteo" in url:
+        return "open_meteo_archive"
+    if "open-meteo" in url:
+        return "open_meteo_forecast"
+    if "soilgrids" in url:
+        return "soilgrids"
+    raise ValueError(f"No fixture for {url}")
+
+
+def _synthetic_archive(days=5, seed=1):
+    rng = np.random.default_rng(seed)
+    time_index = pd.date_range(end=pd.Timestamp("2026-02-01"), periods=days * 24, freq="h")
+    n = len(time_index)
+    return {"hourly": {
+        "time": time_index.strftime("%Y-%m-%dT%H:%M").tolist(),
+        "temperature_2m": np.round(6 + 3 * np.sin(np.arange(n) * 2 * np.pi / 24) + rng.normal(0, 1, n), 1).tolist(),
+        "precipitation": np.round(np.where(rng.random(n) < 0.2, rng.gamma(1.2, 1.0, n), 0.0), 1).tolist(),
+        "soil_moisture_0_to_7cm": np.round(0.3 + rng.normal(0, 0.02, n), 3).tolist(),
+        "wind_gusts_10m": np.round(np.abs(25 + rng.normal(0, 8, n)), 1).tolist(),
+    }}
+
+
+def _synthetic_yahoo(years=5, seed=2):
+    from marketSubAgent import TICKER_DICT
+
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=pd.Timestamp("2026-02-01"), periods=years * 252)
+    series = {}
+    for i, ticker in enumerate(TICKER_DICT.values()):
+        walk = 100 * (1 + i / 4) * np.exp(np.cumsum(rng.normal(0.0002, 0.015, len(dates))))
+        series[ticker] = np.round(walk, 2).tolist()
+    return {"dates": dates.strftime("%Y-%m-%d").tolist(), "close": series}
+
+
+def _synthetic_anthropic():
+    allocation = {"corn": 1.5, "oat": 1.0, "wheat": 2.0, "soybean_meal": 0.5, "soybean_oil": 0.5,
+                  "soybean": 1.5, "cocoa": 0.5, "coffee": 0.5, "cotton": 1.0, "sugar": 1.0}
+    advice = {
+        "Market Strategy": ["Lock in wheat forward contracts within the next 2 weeks."],
+        "Soil Management": ["Avoid heavy machinery on wet ground before mid-March."],
+        "Weather Risk Mitigation": ["Keep drainage channels clear ahead of forecast rainfall."],
+    }
+    return {"text": json.dumps({"crop_data": allocation, "advice": advice}),
+            "usage": {"input_tokens": 1200, "output_tokens": 450}}
+
+
+SYNTHETIC = {
+    "open_meteo_forecast": lambda: {"hourly": forecast_hourly()},
+    "open_meteo_archive": _synthetic_archive,
+    # Clay rises and sand falls with depth; each layer still sums to 100%
+    "soilgrids": lambda: {"properties": {"layers": [
+        {"name": name, "depths": [{"label": depth, "values": {"mean": mean + sign * shift}}
+                                  for depth, shift in (("0-5cm", 0), ("5-15cm", 10), ("15-30cm", 25), ("30-60cm", 40))]}
+        for name, mean, sign in (("clay", 240, 1), ("sand", 380, -1), ("silt", 380, 0))
+    ]}},
+    "yahoo_finance": _synthetic_yahoo,
+    "anthropic": _synthetic_anthropic,
+}
+
+
+def fixture_path(service, fixture_dir=FIXTURE_DIR):
+    return os.path.join(fixture_dir, service + ".json")
+
+
+def load(service, fixture_dir=FIXTURE_DIR):
+    """Recorded fixture if present, otherwise the synthetic one. Returns (payload, recorded)."""
+    path = fixture_path(service, fixture_dir)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)["payload"], True
+    return SYNTHETIC[service](), False
+
+
+def save(service, payload, elapsed_s, fixture_dir=FIXTURE_DIR):
+    os.makedirs(fixture_dir, exist_ok=True)
+    with open(fixture_path(service, fixture_dir), "w") as f:
+        json.dump({"recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                   "elapsed_s": round(elapsed_s, 4), "payload": payload}, f)
+
+
+class _Response:
+    def __init__(self, payload, status_code=200):
+        self._payload = payload
+        self.status_code = status_code
+        self.headers = {"Content-Type": "application/json"}
+
+    @property
+    def text(self):
+        return json.dumps(self._payload)
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} from fixture")
+
+
+def _yahoo_frame(payload):
+    index = pd.DatetimeIndex(pd.to_datetime(payload["dates"]), name="Date")
+    columns = {(ticker, "Close"): values for ticker, values in payload["close"].items()}
+    return pd.DataFrame(columns, index=index)
+
+
+def _anthropic_client(payload):
+    message = SimpleNamespace(content=[SimpleNamespace(text=payload["text"])],
+                              usage=SimpleNamespace(**payload["usage"]))
+    return SimpleNamespace(messages=SimpleNamespace(create=lambda **kwargs: message))
+
+
+@contextmanager
+def replay(fixture_dir=FIXTURE_DIR):
+    """Serve every upstream call from fixtures. Yields {service: recorded?}."""
+    payloads, sources = {}, {}
+    for service in SERVICES:
+        payloads[service], sources[service] = load(service, fixture_dir)
+
+    def http_get(url, *args, **kwargs):
+        return _Response(payloads[service_for_url(url)])
+
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch("requests.get", side_effect=http_get))
+        stack.enter_context(mock.patch("requests.Session.get", side_effect=http_get))
+        stack.enter_context(mock.patch("yfinance.download",
+                                       side_effect=lambda *a, **k: _yahoo_frame(payloads["yahoo_finance"])))
+        stack.enter_context(mock.patch("anthropic.Anthropic",
+                                       side_effect=lambda *a, **k: _anthropic_client(payloads["anthropic"])))
+        stack.enter_context(mock.patch("pgeocode.STORAGE_DIR", POSTCODE_DIR))
+        stack.enter_context(mock.patch.dict("weatherSubAgent._nominatim", clear=True))
+        yield sources
+
+
+@contextmanager
+def record(fixture_dir=FIXTURE_DIR):
+    """Pass upstream calls through and save the last successful response of each service."""
+    import anthropic
+    import requests
+    import yfinance
+
+    real_get, real_session_get = requests.get, requests.Session.get
+    real_download, real_client = yfinance.download, anthropic.Anthropic
+    saved = []
+
+    def timed(service, call, to_payload):
+        start = time.perf_counter()
+        result = call()
+        elapsed = time.perf_counter() - start
+        payload = to_payload(result)
+        if payload is not None:
+            save(service, payload, elapsed, fixture_dir)
+            saved.append(service)
+        return result
+
+    def http_payload(response):
+        return response.json() if response.status_code == 200 else None
+
+    def http_get(url, *args, **kwargs):
+        return timed(service_for_url(url), lambda: real_get(url, *args, **kwargs), http_payload)
+
+    def session_get(self, url, *args, **kwargs):
+        return timed(service_for_url(url), lambda: real_session_get(self, url, *args, **kwargs), http_payload)
+
+    def download(tickers, *args, **kwargs):
+        def to_payload(raw):
+            return {"dates": raw.index.strftime("%Y-%m-%d").tolist(),
+                    "close": {t: [None if pd.isna(v) else float(v) for v in raw[t]["Close"]] for t in tickers}}
+        return timed("yahoo_finance", lambda: real_download(tickers, *args, **kwargs), to_payload)
+
+    def client(*args, **kwargs):
+        real = real_client(*args, **kwargs)
+
+        def create(**request):
+            def to_payload(response):
+                usage = {k: getattr(response.usage, k) for k in ("input_tokens", "output_tokens")}
+                return {"text": response.content[0].text, "usage": usage}
+            return timed("anthropic", lambda: real.messages.create(**request), to_payload)
+        return SimpleNamespace(messages=SimpleNamespace(create=create))
+
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch("requests.get", side_effect=http_get))
+        stack.enter_context(mock.patch.object(requests.Session, "get", session_get))
+        stack.enter_context(mock.patch("yfinance.download", side_effect=download))
+        stack.enter_context(mock.patch("anthropic.Anthropic", side_effect=client))
+        yield saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="run one live getCrops and save every upstream response")
+    rec.add_argument("--postcode", default="SW1A 1AA")
+    rec.add_argument("--acreage", type=float, default=10.0)
+    sub.add_parser("status", help="show which fixtures are recorded")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        from hybrid_predictor import get_predictor
+        from server import getCrops
+
+        get_predictor()
+        with record() as saved:
+            result = getCrops(args.postcode, args.acreage, use_cache=False)
+        if "error" in result:
+            print(f"getCrops failed: {result['details']}")
+        print(f"Recorded: {sorted(set(saved))}")
+        missing = sorted(set(SERVICES) - set(saved))
+        if missing:
+            print(f"Not recorded (still synthetic): {missing}")
+    else:
+        for service in SERVICES:
+            path = fixture_path(service)
+            if os.path.exists(path):
+                with open(path) as f:
+                    print(f"{service:22} recorded {json.load(f)['recorded_at']}")
+            else:
+                print(f"{service:22} synthetic")
+
+
+if __name__ == "__main__":
+    main()
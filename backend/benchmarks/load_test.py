@@ -0,0 +1,152 @@
+"""
+Open-loop load test of /predict-crops against local upstream stand-ins.
+
+Starts the stand-ins (see benchmarks/standins.py), launches uvicorn with its upstream URLs
+pointed at them, waits for /ready, then for each arrival rate fires requests on a Poisson
+schedule for --duration seconds. Arrivals do not wait for earlier responses, so queueing shows
+up as latency and errors instead of a lower offered load.
+
+Reports per rate: offered and completed requests/s, p50/p95/p99 latency of successful
+responses, error and timeout rates, and the status-code mix.
+
+Run from backend/:
+    python -m benchmarks.load_test --rates 0.5,1,2,4 --duration 60
+    python -m benchmarks.load_test --rates 2 --latency anthropic=fixed:15000 --errors soilgrids=0.2
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --rates 1   # already-running server
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+from benchmarks.bench_pipeline import RESULTS_DIR, commit_id
+from benchmarks.bench_startup import free_port, wait_for
+from benchmarks.standins import StandIns, add_arguments, parse_overrides
+
+POSTCODES = ["SW1A 1AA", "NR1 3QU", "LS1 4AP", "EH1 1YZ", "M1 1AE", "EX1 1HS", "B1 1BB", "CB2 1TN"]
+
+
+async def run_rate(client, url, rate, duration, timeout, seed):
+    rng = np.random.default_rng(seed)
+    results = []
+
+    async def one(i):
+        body = {"postcode": POSTCODES[i % len(POSTCODES)], "acreage": 10.0}
+        start = time.perf_counter()
+        try:
+            response = await client.post(url + "/predict-crops", json=body, timeout=timeout)
+            status = response.status_code
+        except Exception as e:
+            status = "timeout" if "Timeout" in type(e).__name__ else "connection_error"
+        results.append((status, time.perf_counter() - start))
+
+    tasks = []
+    start = time.perf_counter()
+    next_at = 0.0
+    i = 0
+    while next_at < duration:
+        delay = start + next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(i)))
+        i += 1
+        next_at += rng.exponential(1 / rate)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    ok = np.array([s for status, s in results if status == 200]) * 1000
+    statuses = Counter(str(status) for status, _ in results)
+    return {
+        "rate": rate,
+        "sent": len(results),
+        "offered_rps": round(len(results) / duration, 3),
+        "completed_rps": round(len(ok) / elapsed, 3),
+        "p50_ms": round(float(np.percentile(ok, 50)), 1) if len(ok) else None,
+        "p95_ms": round(float(np.percentile(ok, 95)), 1) if len(ok) else None,
+        "p99_ms": round(float(np.percentile(ok, 99)), 1) if len(ok) else None,
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else None,
+        "timeout_rate": round(statuses.get("timeout", 0) / len(results), 4) if results else None,
+        "statuses": dict(statuses),
+    }
+
+
+async def drive(url, rates, duration, timeout):
+    import httpx
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+    async with httpx.AsyncClient(limits=limits) as client:
+        report = []
+        for n, rate in enumerate(rates):
+            print(f"Offering {rate} req/s for {duration:.0f}s...", flush=True)
+            report.append(await run_rate(client, url, rate, duration, timeout, seed=n))
+        return report
+
+
+def start_server(env, timeout):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"), **env},
+    )
+    if wait_for(url + "/ready", start, timeout) is None:
+        proc.terminate()
+        raise SystemExit("Server never became ready")
+    return proc, url
+
+
+def print_report(report):
+    print(f"\n{'rate':>6} {'sent':>6} {'done/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8}  statuses")
+    fmt = lambda v: f"{v:9.0f}" if v is not None else f"{'-':>9}"
+    for r in report:
+        print(f"{r['rate']:6g} {r['sent']:6d} {r['completed_rps']:8.2f} {fmt(r['p50_ms'])} {fmt(r['p95_ms'])} "
+              f"{fmt(r['p99_ms'])} {r['error_rate'] * 100:7.1f}%  {r['statuses']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rates", default="0.5,1,2", help="comma-separated arrival rates (req/s)")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds per rate")
+    parser.add_argument("--timeout", type=float, default=120.0, help="client timeout per request")
+    parser.add_argument("--url", help="drive an already-running server instead of starting one")
+    parser.add_argument("--no-save", action="store_true")
+    add_arguments(parser)
+    args = parser.parse_args()
+    rates = [float(r) for r in args.rates.split(",")]
+
+    with StandIns(parse_overrides(args.latency), parse_overrides(args.errors, float)) as standins:
+        proc = None
+        url = args.url
+        if url is None:
+            proc, url = start_server(standins.env(), args.timeout)
+        try:
+            report = asyncio.run(drive(url, rates, args.duration, args.timeout))
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+        upstream = standins.stats()
+
+    print_report(report)
+    print("\nUpstream stand-ins:")
+    for service, s in upstream.items():
+        print(f"  {service:22} {s['latency']:24} {s['requests']:6d} requests, {s['errors']} injected errors")
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"load-{commit_id()}.json")
+        with open(path, "w") as f:
+            json.dump({"commit": commit_id(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                       "duration_s": args.duration, "rates": report, "upstream": upstream}, f, indent=2)
+        print(f"\nSaved {path}")
+
+
+if __name__ == "__main__":
+    main()
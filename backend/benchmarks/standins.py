@@ -0,0 +1,218 @@
+"""
+Local stand-ins for the upstream services, with injected latency and errors.
+
+Each service gets its own HTTP server on a free port and answers with the payloads from
+benchmarks/fixtures (recorded or synthetic):
+    open_meteo_forecast   GET  /v1/forecast
+    open_meteo_archive    GET  /v1/archive
+    soilgrids             GET  /soilgrids/v2.0/properties/query
+    yahoo_finance         GET  /v8/finance/chart/<ticker>
+    anthropic             POST /v1/messages
+
+`env()` returns the variables that point the app at them (OPEN_METEO_FORECAST_URL,
+OPEN_METEO_ARCHIVE_URL, SOILGRIDS_URL, YAHOO_CHART_URL, ANTHROPIC_BASE_URL), plus
+PGEOCODE_DATA_DIR for the fixture postcode table.
+
+Latency specs: "fixed:MS", "uniform:LO_MS,HI_MS" or "lognormal:MEDIAN_MS,SIGMA".
+
+Run standalone from backend/:
+    python -m benchmarks.standins --latency anthropic=lognormal:8000,0.3 --errors soilgrids=0.1
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import fixtures
+
+DEFAULT_LATENCY = {
+    "open_meteo_forecast": "lognormal:250,0.4",
+    "open_meteo_archive": "lognormal:400,0.5",
+    "soilgrids": "lognormal:900,0.6",
+    "yahoo_finance": "lognormal:300,0.4",
+    "anthropic": "lognormal:7000,0.3",
+}
+
+ENV_VARS = {
+    "open_meteo_forecast": ("OPEN_METEO_FORECAST_URL", "/v1/forecast"),
+    "open_meteo_archive": ("OPEN_METEO_ARCHIVE_URL", "/v1/archive"),
+    "soilgrids": ("SOILGRIDS_URL", "/soilgrids/v2.0/properties/query"),
+    "yahoo_finance": ("YAHOO_CHART_URL", "/v8/finance/chart"),
+    "anthropic": ("ANTHROPIC_BASE_URL", ""),
+}
+
+
+def parse_latency(spec):
+    """Latency spec -> callable returning seconds."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",")] if args else []
+    rng = np.random.default_rng()
+    if kind == "fixed":
+        return lambda: values[0] / 1000
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda: rng.lognormal(np.log(median), sigma) / 1000
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+def _yahoo_chart(payload):
+    """Per-ticker v8 chart responses built from the yahoo_finance fixture."""
+    timestamps = (pd.to_datetime(payload["dates"]).astype("int64") // 10**9).tolist()
+    return {
+        ticker: {"chart": {"result": [{"meta": {"symbol": ticker}, "timestamp": timestamps,
+                                       "indicators": {"quote": [{"close": close}]}}], "error": None}}
+        for ticker, close in payload["close"].items()
+    }
+
+
+def _anthropic_message(payload):
+    return {
+        "id": "msg_standin", "type": "message", "role": "assistant", "model": "standin",
+        "content": [{"type": "text", "text": payload["text"]}],
+        "stop_reason": "end_turn", "stop_sequence": None,
+        "usage": {"input_tokens": 0, "output_tokens": 0, **payload["usage"]},
+    }
+
+
+class StandIn:
+    """One service: fixture body, latency distribution, error rate and request counters."""
+
+    def __init__(self, service, latency, error_rate=0.0, error_status=500):
+        self.service = service
+        self.latency = parse_latency(latency)
+        self.latency_spec = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = np.random.default_rng()
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+        payload, _ = fixtures.load(service)
+        if service == "yahoo_finance":
+            self.bodies = {k: json.dumps(v).encode() for k, v in _yahoo_chart(payload).items()}
+        elif service == "anthropic":
+            self.body = json.dumps(_anthropic_message(payload)).encode()
+        else:
+            self.body = json.dumps(payload).encode()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}" + ENV_VARS[service][1]
+
+    def respond(self, path):
+        """(status, body) for one request, after the injected delay."""
+        time.sleep(self.latency())
+        with self._lock:
+            self.requests += 1
+            failed = self.rng.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if failed:
+            return self.error_status, json.dumps({"error": "injected"}).encode()
+        if self.service == "yahoo_finance":
+            body = self.bodies.get(path.split("?")[0].rstrip("/").rsplit("/", 1)[-1])
+            return (200, body) if body else (404, b'{"chart": {"result": null, "error": "not found"}}')
+        return 200, self.body
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _serve(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                status, body = standin.respond(self.path)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = _serve
+            do_POST = _serve
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name=f"standin-{self.service}", daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StandIns:
+    def __init__(self, latency=None, errors=None):
+        latency = {**DEFAULT_LATENCY, **(latency or {})}
+        errors = errors or {}
+        self.services = {s: StandIn(s, latency[s], errors.get(s, 0.0)) for s in DEFAULT_LATENCY}
+
+    def __enter__(self):
+        for standin in self.services.values():
+            standin.start()
+        return self
+
+    def __exit__(self, *exc):
+        for standin in self.services.values():
+            standin.stop()
+
+    def env(self):
+        env = {ENV_VARS[s][0]: standin.url for s, standin in self.services.items()}
+        env["ANTHROPIC_API_KEY"] = "standin"
+        env["PGEOCODE_DATA_DIR"] = fixtures.POSTCODE_DIR
+        return env
+
+    def stats(self):
+        return {s: {"latency": st.latency_spec, "error_rate": st.error_rate,
+                    "requests": st.requests, "errors": st.errors}
+                for s, st in self.services.items()}
+
+
+def parse_overrides(items, cast=str):
+    """["service=value", ...] -> {service: value}"""
+    overrides = {}
+    for item in items or []:
+        service, _, value = item.partition("=")
+        if service not in DEFAULT_LATENCY:
+            raise SystemExit(f"Unknown service {service!r}; expected one of {list(DEFAULT_LATENCY)}")
+        overrides[service] = cast(value)
+    return overrides
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency", action="append", metavar="SERVICE=SPEC",
+                        help="override a latency distribution, e.g. soilgrids=lognormal:2000,0.5")
+    parser.add_argument("--errors", action="append", metavar="SERVICE=RATE",
+                        help="fraction of requests answered with HTTP 500, e.g. anthropic=0.05")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    with StandIns(parse_overrides(args.latency), parse_overrides(args.errors, float)) as standins:
+        for key, value in standins.env().items():
+            print(f"export {key}={value}")
+        print("\nServing; Ctrl-C to stop.")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Deterministic synthetic weather frames for offline benchmarks."""
+import numpy as np
+import pandas as pd
+
+HOURLY_VARIABLES = ["temperature_2m", "precipitation", "soil_temperature_0cm",
+                    "wind_speed_10m", "cloud_cover", "wind_direction_10m",
+                    "precipitation_probability", "weather_code"]
+
+
+def forecast_hourly(past_days=92, forecast_days=2, seed=0, end=None):
+    """Hourly dict shaped like the Open-Meteo forecast response (`raw["hourly"]`)."""
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end or "2026-02-01").normalize() + pd.Timedelta(days=forecast_days)
+    time = pd.date_range(end=end, periods=(past_days + forecast_days) * 24, freq="h", inclusive="left")
+    n = len(time)
+    hour = time.hour.to_numpy()
+    doy = time.dayofyear.to_numpy()
+
+    diurnal = 4.0 * np.sin(2 * np.pi * (hour - 9) / 24)
+    seasonal = 8.0 * np.sin(2 * np.pi * (doy - 110) / 365)
+    temp = 9.0 + seasonal + diurnal + rng.normal(0, 1.5, n).cumsum() * 0.05
+    precip = np.where(rng.random(n) < 0.15, rng.gamma(1.2, 1.0, n), 0.0)
+    cloud = np.clip(50 + 40 * np.sin(np.arange(n) / 17) + rng.normal(0, 10, n), 0, 100)
+
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M").tolist(),
+        "temperature_2m": np.round(temp, 1).tolist(),
+        "precipitation": np.round(precip, 1).tolist(),
+        "soil_temperature_0cm": np.round(temp * 0.8 + 1.5, 1).tolist(),
+        "wind_speed_10m": np.round(np.abs(12 + rng.normal(0, 5, n)), 1).tolist(),
+        "cloud_cover": np.round(cloud).tolist(),
+        "wind_direction_10m": np.round(rng.uniform(0, 360, n)).tolist(),
+        "precipitation_probability": np.round(np.clip(precip * 30 + cloud / 3, 0, 100)).tolist(),
+        "weather_code": np.where(precip > 0, 61, np.where(cloud > 70, 3, 0)).tolist(),
+    }
+
+
+def forecast_frame(**kwargs):
+    return pd.DataFrame(forecast_hourly(**kwargs))
@@ -0,0 +1,169 @@
+"""
+Circuit breakers for the upstream services (Open-Meteo, SoilGrids, Yahoo, Anthropic).
+
+Each service's breaker watches its calls over the last BREAKER_WINDOW_S. Once at least
+BREAKER_MIN_CALLS have been seen, it opens when the share of failures reaches
+BREAKER_ERROR_RATE, or when the share of calls slower than the service's latency limit
+reaches BREAKER_SLOW_RATE. While open, guard() raises CircuitOpen at once instead of
+calling out, and callers serve their last known good value. After BREAKER_COOLDOWN_S one
+trial call is let through (half-open). Success closes the breaker; failure opens it for
+another cooldown.
+
+Breaker state is per process. Calls are also counted in upstream_requests_total.
+
+Environment:
+    BREAKER_WINDOW_S     default 60
+    BREAKER_MIN_CALLS    default 5
+    BREAKER_ERROR_RATE   default 0.5
+    BREAKER_SLOW_RATE    default 0.5
+    BREAKER_COOLDOWN_S   default 30
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import metrics
+from log_setup import get_logger
+
+logger = get_logger(__name__)
+
+WINDOW_S = float(os.getenv("BREAKER_WINDOW_S", "60"))
+MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+SLOW_RATE = float(os.getenv("BREAKER_SLOW_RATE", "0.5"))
+COOLDOWN_S = float(os.getenv("BREAKER_COOLDOWN_S", "30"))
+
+# A call slower than this counts against the service even when it succeeds
+SLOW_CALL_S = {
+    "open_meteo_forecast": 10.0,
+    "open_meteo_archive": 20.0,
+    "soilgrids": 10.0,
+    "yahoo_finance": 20.0,
+    "anthropic": 60.0,
+}
+DEFAULT_SLOW_CALL_S = 30.0
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitOpen(Exception):
+    def __init__(self, service, retry_after):
+        super().__init__(f"{service} circuit open, retry after {retry_after}s")
+        self.service = service
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, service, slow_call_s=None, window_s=WINDOW_S, min_calls=MIN_CALLS,
+                 error_rate=ERROR_RATE, slow_rate=SLOW_RATE, cooldown_s=COOLDOWN_S):
+        self.service = service
+        self.slow_call_s = slow_call_s or SLOW_CALL_S.get(service, DEFAULT_SLOW_CALL_S)
+        self.window_s = window_s
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.cooldown_s = cooldown_s
+        self.state = CLOSED
+        self._calls = deque()   # (finished_at, ok, slow)
+        self._opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+        metrics.CIRCUIT_STATE.set(STATE_VALUES[CLOSED], service=service)
+
+    def _set_state(self, state, reason=""):
+        if state != self.state:
+            logger.warning("Circuit for %s %s -> %s%s", self.service, self.state, state, reason,
+                           extra={"service": self.service, "circuit": state})
+        self.state = state
+        metrics.CIRCUIT_STATE.set(STATE_VALUES[state], service=self.service)
+
+    def allow(self):
+        """True if a call may go out now (in half-open state, for one caller only)."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown_s:
+                    return False
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._trial:
+                    return False
+                self._trial = True
+            return True
+
+    def retry_after(self):
+        return max(1, round(self.cooldown_s - (time.monotonic() - self._opened_at)))
+
+    def record(self, seconds, ok):
+        now = time.monotonic()
+        slow = seconds > self.slow_call_s
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trial = False
+                if ok and not slow:
+                    self._calls.clear()
+                    self._set_state(CLOSED)
+                else:
+                    self._open(now, " (trial call failed)")
+                return
+            self._calls.append((now, ok, slow))
+            while self._calls and now - self._calls[0][0] > self.window_s:
+                self._calls.popleft()
+            if self.state != CLOSED or len(self._calls) < self.min_calls:
+                return
+            errors = sum(1 for _, ok_, _ in self._calls if not ok_) / len(self._calls)
+            slow_share = sum(1 for _, _, slow_ in self._calls if slow_) / len(self._calls)
+            if errors >= self.error_rate:
+                self._open(now, f" ({errors:.0%} errors over {len(self._calls)} calls)")
+            elif slow_share >= self.slow_rate:
+                self._open(now, f" ({slow_share:.0%} of {len(self._calls)} calls over {self.slow_call_s}s)")
+
+    def _open(self, now, reason):
+        self._opened_at = now
+        self._calls.clear()
+        self._set_state(OPEN, reason)
+
+
+def get_breaker(service):
+    with _breakers_lock:
+        if service not in _breakers:
+            _breakers[service] = CircuitBreaker(service)
+        return _breakers[service]
+
+
+def check(service):
+    """Raise CircuitOpen unless a call to `service` may go out now."""
+    b = get_breaker(service)
+    if not b.allow():
+        metrics.CIRCUIT_REJECTIONS.inc(service=service)
+        raise CircuitOpen(service, b.retry_after())
+
+
+def record(service, seconds, ok):
+    """Count a finished upstream call in /metrics and in the service's breaker."""
+    metrics.record_upstream(service, seconds, ok)
+    get_breaker(service).record(seconds, ok)
+
+
+@contextmanager
+def guard(service):
+    """metrics.upstream() behind the service's breaker: CircuitOpen while it is open."""
+    check(service)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        record(service, time.perf_counter() - start, ok=False)
+        raise
+    record(service, time.perf_counter() - start, ok=True)
+
+
+def states():
+    """{service: state} for every breaker used so far."""
+    with _breakers_lock:
+        return {service: b.state for service, b in _breakers.items()}
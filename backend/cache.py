@@ -0,0 +1,248 @@
+"""
+TTL caches, one per namespace (get_cache("strategy_results", ...)).
+
+An entry is fresh for `fresh_s`, then served as stale for up to `stale_s` more while one
+caller refreshes it (stale-while-revalidate). Lookups are counted in cache_requests_total.
+
+By default each process keeps its own caches in memory. With CACHE_BACKEND=sqlite they live in
+one SQLite file (WAL) instead, so every worker process on the host shares the same entries
+and refresh claims (see prefork.py). Values are pickled.
+
+Environment:
+    CACHE_BACKEND   "memory" (default) or "sqlite"
+    CACHE_DB        default data/cache.db
+"""
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from peewee import BlobField, CharField, CompositeKey, FloatField, Model, SqliteDatabase
+
+import metrics
+
+FRESH, STALE, MISS = "fresh", "stale", "miss"
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+db = SqliteDatabase(None)
+_db_lock = threading.Lock()
+
+
+class CacheEntry(Model):
+    namespace = CharField()
+    key = CharField()
+    value = BlobField()
+    stored_at = FloatField(index=True)
+
+    class Meta:
+        database = db
+        table_name = "cache_entries"
+        primary_key = CompositeKey("namespace", "key")
+
+
+class RefreshClaim(Model):
+    namespace = CharField()
+    key = CharField()
+    claimed_at = FloatField()
+
+    class Meta:
+        database = db
+        table_name = "refresh_claims"
+        primary_key = CompositeKey("namespace", "key")
+
+
+def init_db(path=None):
+    """Open the shared cache store (idempotent)."""
+    with _db_lock:
+        if db.database is not None:
+            return
+        path = path or os.getenv("CACHE_DB", "data/cache.db")
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        db.init(path, pragmas={"journal_mode": "wal", "busy_timeout": 5000, "synchronous": "normal"})
+        db.create_tables([CacheEntry, RefreshClaim], safe=True)
+
+
+def close_db():
+    """Close this thread's connection, e.g. before forking so children don't share it."""
+    if db.database is not None and not db.is_closed():
+        db.close()
+
+
+class TTLCache:
+    def __init__(self, namespace, fresh_s, stale_s=0.0, max_entries=10000):
+        self.namespace = namespace
+        self.fresh_s = fresh_s
+        self.stale_s = stale_s
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (value, stored_at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """(value, FRESH | STALE, age_s), or (None, MISS, None)."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] > self.fresh_s + self.stale_s:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        metrics.record_cache(self.namespace, entry is not None)
+        if entry is None:
+            return None, MISS, None
+        age = now - entry[1]
+        return entry[0], FRESH if age <= self.fresh_s else STALE, age
+
+    def peek(self, key):
+        """Like get(), but without touching LRU order or the hit/miss counters."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or now - entry[1] > self.fresh_s + self.stale_s:
+            return None, MISS, None
+        age = now - entry[1]
+        return entry[0], FRESH if age <= self.fresh_s else STALE, age
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            self._refreshing.discard(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def claim_refresh(self, key):
+        """True for exactly one caller per stale key until set() or release_refresh()."""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def release_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._refreshing.clear()
+
+
+class SharedTTLCache:
+    """TTLCache's interface over the SQLite store; keys must be strings."""
+
+    # Claims older than this are assumed to belong to a worker that died mid-refresh
+    CLAIM_TIMEOUT_S = 300
+    # Expired and surplus rows are deleted every this many set() calls
+    TRIM_EVERY = 100
+    # Decoded values kept per process, so unchanged entries are not unpickled on every hit
+    DECODED_ENTRIES = 64
+
+    def __init__(self, namespace, fresh_s, stale_s=0.0, max_entries=10000):
+        self.namespace = namespace
+        self.fresh_s = fresh_s
+        self.stale_s = stale_s
+        self.max_entries = max_entries
+        self._decoded = OrderedDict()   # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._sets = 0
+
+    def _where(self, model, key=None):
+        clause = model.namespace == self.namespace
+        return clause if key is None else clause & (model.key == key)
+
+    def _lookup(self, key, record):
+        init_db()
+        now = time.time()
+        row = (CacheEntry.select(CacheEntry.stored_at, CacheEntry.value)
+               .where(self._where(CacheEntry, key)).tuples().first())
+        if row is not None and now - row[0] > self.fresh_s + self.stale_s:
+            row = None
+        if record:
+            metrics.record_cache(self.namespace, row is not None)
+        if row is None:
+            return None, MISS, None
+        stored_at, blob = row
+        with self._lock:
+            decoded = self._decoded.get(key)
+        if decoded is not None and decoded[0] == stored_at:
+            value = decoded[1]
+        else:
+            value = pickle.loads(blob)
+            self._remember(key, stored_at, value)
+        age = now - stored_at
+        return value, FRESH if age <= self.fresh_s else STALE, age
+
+    def _remember(self, key, stored_at, value):
+        with self._lock:
+            self._decoded[key] = (stored_at, value)
+            self._decoded.move_to_end(key)
+            while len(self._decoded) > self.DECODED_ENTRIES:
+                self._decoded.popitem(last=False)
+
+    def get(self, key):
+        """(value, FRESH | STALE, age_s), or (None, MISS, None)."""
+        return self._lookup(key, record=True)
+
+    def peek(self, key):
+        """Like get(), but without touching the hit/miss counters."""
+        return self._lookup(key, record=False)
+
+    def set(self, key, value):
+        init_db()
+        stored_at = time.time()
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with db.atomic():
+            CacheEntry.replace(namespace=self.namespace, key=key, value=blob, stored_at=stored_at).execute()
+            RefreshClaim.delete().where(self._where(RefreshClaim, key)).execute()
+        self._remember(key, stored_at, value)
+        with self._lock:
+            self._sets += 1
+            trim = self._sets % self.TRIM_EVERY == 0
+        if trim:
+            self._trim(stored_at)
+
+    def _trim(self, now):
+        expired = CacheEntry.stored_at < now - self.fresh_s - self.stale_s
+        CacheEntry.delete().where(self._where(CacheEntry) & expired).execute()
+        cutoff = (CacheEntry.select(CacheEntry.stored_at).where(self._where(CacheEntry))
+                  .order_by(CacheEntry.stored_at.desc()).offset(self.max_entries).limit(1).scalar())
+        if cutoff is not None:
+            CacheEntry.delete().where(self._where(CacheEntry) & (CacheEntry.stored_at <= cutoff)).execute()
+
+    def claim_refresh(self, key):
+        """True for exactly one caller, across every process, until set() or release_refresh()."""
+        init_db()
+        now = time.time()
+        with db.atomic(lock_type="IMMEDIATE"):
+            RefreshClaim.delete().where(self._where(RefreshClaim, key)
+                                        & (RefreshClaim.claimed_at < now - self.CLAIM_TIMEOUT_S)).execute()
+            query = RefreshClaim.insert(namespace=self.namespace, key=key, claimed_at=now).on_conflict_ignore()
+            return db.execute(query).rowcount == 1
+
+    def release_refresh(self, key):
+        init_db()
+        RefreshClaim.delete().where(self._where(RefreshClaim, key)).execute()
+
+    def clear(self):
+        init_db()
+        with db.atomic():
+            CacheEntry.delete().where(self._where(CacheEntry)).execute()
+            RefreshClaim.delete().where(self._where(RefreshClaim)).execute()
+        with self._lock:
+            self._decoded.clear()
+
+
+def get_cache(namespace, fresh_s=3600.0, stale_s=0.0, max_entries=10000):
+    """The process-wide cache for `namespace`; settings apply on first use only."""
+    with _caches_lock:
+        if namespace not in _caches:
+            backend = SharedTTLCache if os.getenv("CACHE_BACKEND", "memory") == "sqlite" else TTLCache
+            _caches[namespace] = backend(namespace, fresh_s, stale_s, max_entries)
+        return _caches[namespace]
@@ -0,0 +1,88 @@
+# Lightweight climatology-baseline anomaly model. Same output as WeatherModel.predict_risk_score,
+# but built from robust per-hour / per-day baselines instead of eight gradient-boosted regressors.
+# The forecast window is ~94 days, so each day of the year appears once and there is no
+# per-day-of-year baseline to learn; the EWMA of recent daily medians carries the seasonal level.
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from weatherPrediction import TARGETS, engineer_features, prediction_entry, summarise_risk
+
+
+class ClimatologyModel:
+    def __init__(self, ewma_span_days=7):
+        self.targets = list(TARGETS)
+        self.ewma_span_days = ewma_span_days
+        # (24, n_targets) median deviation from the daily level for each hour of day
+        self.hour_profile = None
+        self.is_trained = False
+
+    def _day_hour_grid(self, df):
+        """Reshape an hourly frame into a (days, 24, n_targets) array, padding gaps with NaN."""
+        times = df['time'].dt.floor('h')
+        start = times.iloc[0].normalize()
+        end = times.iloc[-1].normalize() + pd.Timedelta(days=1)
+        full_index = pd.date_range(start, end, freq='h', inclusive='left')
+
+        values = df[self.targets].astype(float)
+        values.index = times
+        values = values[~values.index.duplicated(keep='last')].reindex(full_index)
+        return values.to_numpy().reshape(-1, 24, len(self.targets))
+
+    def train(self, dataframe):
+        df = engineer_features(dataframe)
+        if df.empty:
+            return False
+
+        grid = self._day_hour_grid(df)
+        with warnings.catch_warnings():
+            # All-NaN days/hours are expected when the API returns nulls
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            daily_level = np.nanmedian(grid, axis=1)
+            residual = grid - daily_level[:, None, :]
+            profile = np.nanmedian(residual, axis=0)
+
+        self.hour_profile = np.nan_to_num(profile)
+        self.is_trained = True
+        return True
+
+    def _ewma_level(self, daily_level):
+        """EWMA of the daily medians (oldest first), ignoring missing days."""
+        alpha = 2.0 / (self.ewma_span_days + 1)
+        weights = (1 - alpha) ** np.arange(len(daily_level))[::-1]
+        present = ~np.isnan(daily_level)
+        weighted = np.where(present, daily_level, 0.0) * weights[:, None]
+        norm = (present * weights[:, None]).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return weighted.sum(axis=0) / norm
+
+    def predict_risk_score(self, current_data):
+        if not self.is_trained:
+            return {"error": "Model not trained (Insufficient Data)"}
+
+        df = engineer_features(pd.DataFrame(current_data))
+        if df.empty:
+            return {"error": "No data available"}
+
+        # Same convention as WeatherModel: the last row is "Now"
+        df_now = df.tail(1)
+        hour_now = int(df_now['hour'].iloc[0])
+
+        grid = self._day_hour_grid(df)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            daily_level = np.nanmedian(grid, axis=1)
+
+        # Level for today comes from the days before it; fall back to today's own median
+        level = self._ewma_level(daily_level[:-1]) if len(daily_level) > 1 else daily_level[-1]
+        level = np.where(np.isnan(level), daily_level[-1], level)
+        predicted = np.nan_to_num(level + self.hour_profile[hour_now])
+
+        results = {}
+        for i, target in enumerate(self.targets):
+            actual_val = df_now[target].iloc[0]
+            results[target] = prediction_entry(target, float(predicted[i]), actual_val)
+
+        return summarise_risk(results)
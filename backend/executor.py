@@ -0,0 +1,109 @@
+"""
+Bounded worker pool with admission control for blocking request handlers.
+
+At most `workers` calls run at once and at most `queue_limit` more wait. Anything beyond that
+is rejected straight away with Overloaded, so a burst does not pile up behind multi-second
+pipelines. A caller that waits past its deadline gets DeadlineExceeded and its call is dropped
+if it has not started. Both carry a Retry-After estimate from the recent service time.
+
+Calls run in a copy of the caller's context, so request IDs and stage timers follow them
+into the worker thread.
+"""
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Deadline exceeded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    def __init__(self, name, workers=4, queue_limit=16, initial_service_s=10.0):
+        self.name = name
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+        # EWMA of call duration, used for Retry-After
+        self._service_s = initial_service_s
+
+    @property
+    def queue_depth(self):
+        return max(self._admitted - self._running, 0)
+
+    def _publish(self):
+        metrics.EXECUTOR_QUEUE_DEPTH.set(self.queue_depth, executor=self.name)
+        metrics.EXECUTOR_ACTIVE.set(self._running, executor=self.name)
+
+    def retry_after(self):
+        """Seconds until a new request would likely get a worker."""
+        with self._lock:
+            waves = self.queue_depth / self.workers + 1
+            return int(min(max(math.ceil(waves * self._service_s), 1), 300))
+
+    def _call(self, fn, args, kwargs, admitted_at):
+        started = time.monotonic()
+        metrics.EXECUTOR_QUEUE_WAIT.observe(started - admitted_at, executor=self.name)
+        with self._lock:
+            self._running += 1
+            self._publish()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._service_s = 0.8 * self._service_s + 0.2 * (time.monotonic() - started)
+                self._publish()
+
+    def _release(self, future):
+        with self._lock:
+            self._admitted -= 1
+            self._publish()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) on the pool and return its Future, or raise Overloaded."""
+        with self._lock:
+            if self._admitted >= self.workers + self.queue_limit:
+                reject = True
+            else:
+                reject = False
+                self._admitted += 1
+                self._publish()
+        if reject:
+            metrics.EXECUTOR_REJECTIONS.inc(executor=self.name, reason="queue_full")
+            raise Overloaded(self.retry_after())
+
+        ctx = contextvars.copy_context()
+        future = self._pool.submit(ctx.run, self._call, fn, args, kwargs, time.monotonic())
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args, deadline=None, **kwargs):
+        """Run fn(*args, **kwargs) on the pool and await it, or raise Overloaded/DeadlineExceeded."""
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=deadline)
+        except asyncio.TimeoutError:
+            # Drops the call if it is still queued; a running call finishes in the background
+            future.cancel()
+            metrics.EXECUTOR_REJECTIONS.inc(executor=self.name, reason="deadline")
+            raise DeadlineExceeded(self.retry_after()) from None
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
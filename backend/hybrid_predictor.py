@@ -1,59 +1,168 @@
 import pandas as pd
 import numpy as np
 import os, json
+import threading
+import metrics
 from datetime import datetime, timedelta
 from model_trainer import ExtremeWeatherModel
 from anomaly_labeler import AnomalyLabeler
 from weather_fetcher import get_nearest_region, WeatherDataFetcher
+from model_bundle import ModelBundle, SeasonalStats, current_bundle_path
+from cache import FRESH, get_cache
+
+EXTREME_VARS = ['temperature_2m', 'precipitation', 'soil_moisture_0_to_7cm', 'wind_gusts_10m']
+LAGS = [24, 48, 72]
+# Alert cut-offs on the extreme-weather probability (risk_label)
+HIGH_THRESHOLD = 0.5
+EXTREME_THRESHOLD = 0.85
+# Archive lookback per (grid point, day); the archive only gains new hours a few times a day.
+# Past HISTORY_CACHE_TTL_S an entry is refetched, but still served if the archive is down.
+HISTORY_CACHE_TTL_S = float(os.getenv("HISTORY_CACHE_TTL_S", "3600"))
+history = get_cache("weather_history", fresh_s=HISTORY_CACHE_TTL_S, stale_s=24 * 3600, max_entries=5000)
+# The lookback is optional (lags fall back to the current reading), so serving never waits out
+# archive rate limits
+HISTORY_FETCH = dict(attempts=2, max_backoff_s=1.0, timeout=10)
 
 class ImprovedHybridPredictor:
-    def __init__(self, model_dir="models", stats_file="models/seasonal_stats.json"):
+    def __init__(self, model_dir="models", stats_file="models/seasonal_stats.json", bundle=None, use_mmap=False):
         self.model_dir = model_dir
-        self.fetcher = WeatherDataFetcher()
-        with open(stats_file, 'r') as f:
-            self.seasonal_stats = json.load(f)
-        
-        self.models = {
-            reg: ExtremeWeatherModel.load(reg, model_dir)
-            for reg in WeatherDataFetcher.UK_REGIONS.keys()
-            if os.path.exists(os.path.join(model_dir, reg + ".json"))
-        }
+        self.fetcher = WeatherDataFetcher(**HISTORY_FETCH)
+
+        # Prefer the single-file bundle; fall back to the loose per-region JSON files
+        bundle = bundle or current_bundle_path(model_dir)
+        if bundle and os.path.exists(bundle):
+            self.load_bundle(bundle, use_mmap=use_mmap)
+        else:
+            with open(stats_file, 'r') as f:
+                seasonal_stats = SeasonalStats.from_json(json.load(f), EXTREME_VARS)
+            models = {
+                reg: ExtremeWeatherModel.load(reg, model_dir)
+                for reg in WeatherDataFetcher.UK_REGIONS.keys()
+                if os.path.exists(os.path.join(model_dir, reg + ".json"))
+            }
+            self.bundle = ModelBundle(None, models, seasonal_stats, AnomalyLabeler.FEATURE_COLS, {})
+
+    def load_bundle(self, path, use_mmap=False):
+        """Load a bundle and switch to it in one assignment, so readers never see a mix of versions."""
+        self.bundle = ModelBundle.load(path, use_mmap=use_mmap)
+        return self.bundle.version
+
+    @property
+    def models(self):
+        return self.bundle.models
+
+    @property
+    def seasonal_stats(self):
+        return self.bundle.seasonal_stats
+
+    def seasonal_z_score(self, region, var, month, value):
+        v_mean, v_std = self.seasonal_stats.mean_std(region, var, month)
+        return (value - v_mean) / (v_std + 1e-6)
+
+    def resolve_region(self, lat, lon):
+        target_region = get_nearest_region(lat, lon)
+        return target_region if target_region in self.models else list(self.models.keys())[0]
+
+    def build_features(self, region, month, current, lags):
+        """
+        Assemble one model input row.
+
+        Args:
+            current: {variable: value} for the inference hour
+            lags: {(variable, lag_hours): value}
+        """
+        input_data = dict(current)
+        for v in EXTREME_VARS:
+            input_data[v + "_z_score"] = self.seasonal_z_score(region, v, month, input_data[v])
+            for lag in LAGS:
+                input_data[v + "_lag_" + str(lag) + "h"] = lags[(v, lag)]
+        return input_data
+
+    def predict_proba_batch(self, region, rows):
+        """Extreme-weather probabilities for many feature rows of one region in a single model call."""
+        X_inf = pd.DataFrame(rows)[AnomalyLabeler.FEATURE_COLS]
+        return self.models[region].model.predict_proba(X_inf)[:, 1]
+
+    def build_feature_frame(self, region, frame):
+        """
+        Vectorised build_features over many hours.
+
+        `frame` holds the current values, the lag columns and `month`; z-scores come from the
+        same seasonal stats as single-row scoring.
+        """
+        X = frame.copy()
+        for v in EXTREME_VARS:
+            v_mean, v_std = self.seasonal_stats.monthly(region, v, frame['month'])
+            X[v + "_z_score"] = (frame[v].to_numpy(dtype='float64') - v_mean) / (v_std + 1e-6)
+        return X[AnomalyLabeler.FEATURE_COLS]
+
+    def predict_proba_frame(self, region, frame):
+        """Extreme-weather probabilities for every row of `frame` in a single model call."""
+        return self.models[region].model.predict_proba(self.build_feature_frame(region, frame))[:, 1]
+
+    def fetch_history(self, lat, lon, start, end):
+        """
+        Archive hours for the lag features, cached per ~1km point and date range.
+
+        Returns (DataFrame or None, age of the cached copy served when the archive was
+        unavailable, else None).
+        """
+        key = f"{lat:.2f},{lon:.2f}|{start}|{end}"
+        cached, state, age = history.get(key)
+        if state == FRESH:
+            return cached, None
+        history_df = self.fetcher.fetch_historical_data(lat, lon, start_date_str=start, end_date_str=end)
+        if history_df is not None:
+            history.set(key, history_df)
+            return history_df, None
+        return cached, age
 
     def predict(self, lat, lon, temp, precip, soil, wind, date=None):
         inf_date = date or datetime.now()
-        inf_month = str(inf_date.month)
-        target_region = get_nearest_region(lat, lon)
-        
-        region = target_region if target_region in self.models else list(self.models.keys())[0]
-        m_stats = self.seasonal_stats[region]
-        model = self.models[region]
-        
+        region = self.resolve_region(lat, lon)
 
         start_lookback = (inf_date - timedelta(days=4)).strftime('%Y-%m-%d')
         end_lookback = inf_date.strftime('%Y-%m-%d')
-        history_df = self.fetcher.fetch_historical_data(lat, lon, start_date_str=start_lookback, end_date_str=end_lookback)
-        
-        input_data = {'temperature_2m': temp, 'precipitation': precip, 'soil_moisture_0_to_7cm': soil, 'wind_gusts_10m': wind}
+        with metrics.stage("extreme_weather.history"):
+            history_df, history_stale_s = self.fetch_history(lat, lon, start_lookback, end_lookback)
         
-        for v in ['temperature_2m', 'precipitation', 'soil_moisture_0_to_7cm', 'wind_gusts_10m']:
-            v_mean = m_stats[v]['mean'][inf_month]
-            v_std = m_stats[v]['std'][inf_month]
-            input_data[v + "_z_score"] = (input_data[v] - v_mean) / (v_std + 1e-6)
-            
-            for lag in [24, 48, 72]:
+        current = {'temperature_2m': temp, 'precipitation': precip, 'soil_moisture_0_to_7cm': soil, 'wind_gusts_10m': wind}
+        lags = {}
+        for v in EXTREME_VARS:
+            for lag in LAGS:
                 lag_val = temp
                 if history_df is not None and len(history_df) >= lag:
                     lag_val = history_df[v].iloc[-lag]
-                input_data[v + "_lag_" + str(lag) + "h"] = lag_val
+                lags[(v, lag)] = lag_val
 
-        X_inf = pd.DataFrame([input_data])[AnomalyLabeler.FEATURE_COLS]
-        prob = float(model.model.predict_proba(X_inf)[:, 1][0])
+        with metrics.stage("extreme_weather.inference"):
+            input_data = self.build_features(region, inf_date.month, current, lags)
+            prob = float(self.predict_proba_batch(region, [input_data])[0])
             
         return {
-            "prediction": {"likelihood": str(round(prob * 100, 2)) + "%", "risk": "EXTREME" if prob > 0.85 else "HIGH" if prob > 0.5 else "LOW"},
-            "diagnostics": {"region": region, "z_temp": round(input_data['temperature_2m_z_score'], 2)}
+            "prediction": {"likelihood": str(round(prob * 100, 2)) + "%", "risk": risk_label(prob)},
+            "diagnostics": {"region": region, "z_temp": round(input_data['temperature_2m_z_score'], 2),
+                            "history_stale_s": history_stale_s}
         }
 
+
+_shared_predictor = None
+_shared_lock = threading.Lock()
+
+
+def get_predictor():
+    """Process-wide predictor, so the regional models are loaded once rather than per request."""
+    global _shared_predictor
+    with _shared_lock:
+        metrics.record_cache("extreme_models", _shared_predictor is not None)
+        if _shared_predictor is None:
+            _shared_predictor = ImprovedHybridPredictor()
+        return _shared_predictor
+
+
+def risk_label(prob):
+    return "EXTREME" if prob > EXTREME_THRESHOLD else "HIGH" if prob > HIGH_THRESHOLD else "LOW"
+
 if __name__ == "__main__":
     predictor = ImprovedHybridPredictor()
     result = predictor.predict(52.6, 1.2, 20.0, 0, 0.3, 10.0, date=datetime(2026, 2, 1))
@@ -0,0 +1,362 @@
+"""
+Asynchronous prediction jobs persisted in SQLite (peewee).
+
+POST /jobs/predict-crops stores a job and hands its ID to a pool of worker processes; GET
+/jobs/{id} reads the status and result back. Submitting a job identical to one that is still
+pending or running returns the existing job instead of queueing another. Finished jobs are
+deleted JOB_TTL_S after they finish.
+
+Every unfinished job has an owner, the process ("host:pid") running it, and that process
+refreshes the job's heartbeat every JOB_HEARTBEAT_S. A job whose owner has died, or whose heartbeat
+is older than JOB_ORPHAN_S, is released back to pending with no owner (release_orphans()), and
+exactly one live process adopts and re-runs it (adopt()). Jobs that a live process is still running
+are never re-queued, however many processes run recovery or however often they restart.
+
+A standalone API process owns the jobs it is sent and runs them in its own pool of spawned
+processes (maintain()). Under prefork.py the serving workers only queue jobs, with no owner; one
+job runner forked from the warmed-up master adopts and runs them on JOB_WORKERS threads
+(run_forever()), so the models stay shared copy-on-write.
+
+Environment:
+    JOBS_DB           default data/jobs.db
+    JOB_WORKERS       worker processes, or job runner threads under prefork.py (default 2)
+    JOB_QUEUE_LIMIT   unfinished jobs allowed before submissions are refused (default 100)
+    JOB_TTL_S         seconds a finished job is kept (default 86400)
+    JOB_HEARTBEAT_S   how often an owner refreshes its jobs' heartbeat (default 30)
+    JOB_ORPHAN_S      heartbeat age after which a job is re-queued (default 120)
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from peewee import CharField, FloatField, Model, SqliteDatabase, TextField
+from playhouse.migrate import SqliteMigrator, migrate
+
+from log_setup import get_logger, request_id
+
+logger = get_logger(__name__)
+
+JOBS_DB = os.getenv("JOBS_DB", "data/jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "100"))
+JOB_TTL_S = float(os.getenv("JOB_TTL_S", "86400"))
+JOB_HEARTBEAT_S = float(os.getenv("JOB_HEARTBEAT_S", "30"))
+JOB_ORPHAN_S = float(os.getenv("JOB_ORPHAN_S", "120"))
+CLEANUP_INTERVAL_S = 600
+# How often the prefork job runner looks for new jobs
+JOB_POLL_S = float(os.getenv("JOB_POLL_S", "1"))
+HOST = socket.gethostname()
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+UNFINISHED = (PENDING, RUNNING)
+FINISHED = (DONE, FAILED)
+
+db = SqliteDatabase(None)
+_db_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job(Model):
+    id = CharField(primary_key=True)
+    key = CharField(index=True)
+    status = CharField(index=True, default=PENDING)
+    request = TextField()
+    result = TextField(null=True)
+    error = TextField(null=True)
+    created_at = FloatField()
+    started_at = FloatField(null=True)
+    finished_at = FloatField(null=True, index=True)
+    owner = CharField(null=True, index=True)
+    heartbeat_at = FloatField(null=True)
+
+    class Meta:
+        database = db
+        table_name = "jobs"
+
+    def to_dict(self):
+        body = {
+            "id": self.id,
+            "status": self.status,
+            "request": json.loads(self.request),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == DONE:
+            body["result"] = json.loads(self.result)
+        elif self.status == FAILED:
+            body["error"] = self.error
+        return body
+
+
+def init_db(path=None):
+    """Open the job store (idempotent). WAL lets the API read while workers write."""
+    with _db_lock:
+        if db.database is not None:
+            return
+        path = path or JOBS_DB
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        db.init(path, pragmas={"journal_mode": "wal", "busy_timeout": 5000, "synchronous": "normal"})
+        db.create_tables([Job], safe=True)
+        # Stores created before jobs had owners
+        columns = {c.name for c in db.get_columns("jobs")}
+        missing = [f for f in (Job.owner, Job.heartbeat_at) if f.column_name not in columns]
+        if missing:
+            migrator = SqliteMigrator(db)
+            migrate(*[migrator.add_column("jobs", f.column_name, f) for f in missing])
+
+
+def close_db():
+    """Close this thread's connection, e.g. before forking so children don't share it."""
+    if db.database is not None and not db.is_closed():
+        db.close()
+
+
+def shared_runner():
+    """True under prefork.py, where the master's job runner runs every job."""
+    return os.getenv("SERVE_PREFORK") == "1"
+
+
+def owner_id():
+    # Evaluated per call: prefork workers import this module before they are forked
+    return f"{HOST}:{os.getpid()}"
+
+
+def _owner_alive(owner):
+    """False only when the owner is known to be dead (a process on this host that has exited)."""
+    host, _, pid = owner.rpartition(":")
+    if host != HOST or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def job_key(postcode, acreage, anomaly_mode=None):
+    normalised = postcode.replace(" ", "").upper()
+    return hashlib.sha1(f"{normalised}|{float(acreage):.4f}|{anomaly_mode or ''}".encode()).hexdigest()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the API process has live threads (log listener, executors)
+            _pool = ProcessPoolExecutor(
+                max_workers=JOB_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(db.database,),
+            )
+        return _pool
+
+
+def _dispatch(job_id):
+    future = _get_pool().submit(run_job, job_id)
+    future.add_done_callback(partial(_check_worker, job_id))
+
+
+def _check_worker(job_id, future):
+    if future.cancelled():
+        return
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Job %s worker failed: %s", job_id, exc)
+        _finish(job_id, error=f"Worker failed: {exc}")
+
+
+def submit(postcode, acreage, anomaly_mode=None):
+    """Queue a job, or return the identical unfinished one. Returns (job, created)."""
+    init_db()
+    key = job_key(postcode, acreage, anomaly_mode)
+    # IMMEDIATE takes the write lock up front, so two submitters can't both miss the duplicate
+    with db.atomic(lock_type="IMMEDIATE"):
+        existing = Job.select().where((Job.key == key) & Job.status.in_(UNFINISHED)).first()
+        if existing is not None:
+            return existing, False
+        if Job.select().where(Job.status.in_(UNFINISHED)).count() >= JOB_QUEUE_LIMIT:
+            raise QueueFull(f"{JOB_QUEUE_LIMIT} jobs already queued")
+        job = Job.create(
+            id=uuid.uuid4().hex,
+            key=key,
+            status=PENDING,
+            request=json.dumps({"postcode": postcode, "acreage": acreage, "anomaly_mode": anomaly_mode}),
+            created_at=time.time(),
+            owner=None if shared_runner() else owner_id(),
+            heartbeat_at=time.time(),
+        )
+    if not shared_runner():
+        _dispatch(job.id)
+    logger.info("Queued job %s for %s", job.id, postcode)
+    return job, True
+
+
+def get_job(job_id):
+    init_db()
+    job = Job.get_or_none(Job.id == job_id)
+    return job.to_dict() if job else None
+
+
+def _finish(job_id, result=None, error=None):
+    Job.update(
+        status=FAILED if error is not None else DONE,
+        result=json.dumps(result) if result is not None else None,
+        error=error,
+        finished_at=time.time(),
+    ).where((Job.id == job_id) & Job.status.in_(UNFINISHED)).execute()
+
+
+def cleanup(ttl=None):
+    """Delete jobs that finished more than `ttl` seconds ago."""
+    init_db()
+    cutoff = time.time() - (JOB_TTL_S if ttl is None else ttl)
+    removed = Job.delete().where(Job.status.in_(FINISHED) & (Job.finished_at < cutoff)).execute()
+    if removed:
+        logger.info("Removed %d expired jobs", removed)
+    return removed
+
+
+def heartbeat():
+    """Mark this process's unfinished jobs as still owned."""
+    init_db()
+    return Job.update(heartbeat_at=time.time()).where(
+        (Job.owner == owner_id()) & Job.status.in_(UNFINISHED)).execute()
+
+
+def release_orphans(orphan_s=None):
+    """Return unfinished jobs whose owner is gone to pending with no owner. Returns the count."""
+    init_db()
+    cutoff = time.time() - (JOB_ORPHAN_S if orphan_s is None else orphan_s)
+    # Ownerless running jobs were started before jobs had owners
+    candidates = Job.select(Job.id, Job.owner, Job.heartbeat_at).where(
+        Job.status.in_(UNFINISHED) & (Job.owner.is_null(False) | (Job.status == RUNNING)))
+    released = 0
+    for job in candidates:
+        if (job.owner is not None and job.heartbeat_at is not None and job.heartbeat_at >= cutoff
+                and _owner_alive(job.owner)):
+            continue
+        same_owner = Job.owner.is_null() if job.owner is None else Job.owner == job.owner
+        released += Job.update(status=PENDING, owner=None, started_at=None).where(
+            (Job.id == job.id) & same_owner & Job.status.in_(UNFINISHED)).execute()
+    if released:
+        logger.info("Released %d orphaned jobs", released)
+    return released
+
+
+def adopt(limit=None):
+    """Claim up to `limit` ownerless pending jobs for this process and run them. Returns the count."""
+    init_db()
+    adopted = 0
+    query = Job.select(Job.id).where((Job.status == PENDING) & Job.owner.is_null()).order_by(Job.created_at)
+    if limit is not None:
+        query = query.limit(limit)
+    for job in query:
+        # Conditional on still being ownerless, so only one process wins each job
+        claimed = Job.update(owner=owner_id(), heartbeat_at=time.time()).where(
+            (Job.id == job.id) & Job.owner.is_null() & (Job.status == PENDING)).execute()
+        if claimed:
+            _dispatch(job.id)
+            adopted += 1
+    if adopted:
+        logger.info("Adopted %d pending jobs", adopted)
+    return adopted
+
+
+def maintain():
+    """
+    One round of job upkeep for a standalone API process: heartbeat its own jobs, release
+    orphans, and adopt ownerless pending jobs.
+    """
+    heartbeat()
+    release_orphans()
+    adopt()
+
+
+def recover():
+    """Re-queue and run jobs whose owner is gone (heartbeat-safe, so any process may call it)."""
+    release_orphans()
+    return adopt()
+
+
+def run_forever(workers=None, poll_s=None, stop=None):
+    """
+    The prefork job runner: adopt pending jobs and run them on this process's threads.
+
+    Runs in a child forked from the warmed-up master, so jobs use the models it loaded.
+    Returns once `stop` (a threading.Event) is set, after the running jobs finish.
+    """
+    global _pool
+    workers = workers or JOB_WORKERS
+    poll_s = JOB_POLL_S if poll_s is None else poll_s
+    stop = stop or threading.Event()
+    with _pool_lock:
+        _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+    next_heartbeat = 0.0
+    while not stop.is_set():
+        try:
+            if time.monotonic() >= next_heartbeat:
+                heartbeat()
+                next_heartbeat = time.monotonic() + JOB_HEARTBEAT_S
+            # Claim only what the threads can start now; the rest stay pending with no owner
+            owned = Job.select().where((Job.owner == owner_id()) & Job.status.in_(UNFINISHED)).count()
+            free = workers - owned
+            if free > 0:
+                adopt(free)
+        except Exception:
+            logger.exception("Job runner round failed")
+        stop.wait(poll_s)
+    _pool.shutdown(wait=True)
+
+
+def shutdown():
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _init_worker(db_path):
+    from log_setup import configure_logging
+    import warmup
+
+    configure_logging()
+    init_db(db_path)
+    warmup.warm_up()
+
+
+def run_job(job_id):
+    """Worker-process entry point."""
+    from server import getCrops
+
+    claimed = Job.update(status=RUNNING, started_at=time.time()).where(
+        (Job.id == job_id) & (Job.status == PENDING)).execute()
+    if not claimed:
+        return
+    request = json.loads(Job.get_by_id(job_id).request)
+
+    token = request_id.set("job-" + job_id[:12])
+    try:
+        result = getCrops(request["postcode"], request["acreage"], request.get("anomaly_mode"))
+    finally:
+        request_id.reset(token)
+
+    if "error" in result:
+        _finish(job_id, error=result.get("details") or result["error"])
+    else:
+        _finish(job_id, result=result)
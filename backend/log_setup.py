@@ -0,0 +1,128 @@
+"""
+Structured logging for the serving path.
+
+Records go through a QueueHandler, so request threads only enqueue. Message formatting
+and stdout writes happen on one listener thread. Every record carries the current request
+ID. Use %-style arguments (`logger.info("x=%s", x)`), never f-strings, so disabled levels
+cost nothing.
+
+Environment:
+    LOG_LEVEL        default INFO
+    LOG_FORMAT       "json" (default) or "text"
+    LOG_DEBUG_DUMPS  "1" to log large debug payloads (raw LLM responses, weather frames)
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+request_id = contextvars.ContextVar("request_id", default="-")
+
+# Large payload dumps are opt-in even at DEBUG level
+DEBUG_DUMPS = os.getenv("LOG_DEBUG_DUMPS", "0") == "1"
+
+# Attributes every LogRecord has; anything else was passed via `extra=` and is emitted as a field
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_listener = None
+_config = (None, None)
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records unformatted; only the traceback is rendered here (it can't cross threads)."""
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(level=None, fmt=None):
+    """Install the queue handler on the root logger (idempotent)."""
+    global _listener, _config
+    if _listener is not None:
+        return
+    _config = (level, fmt)
+
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    fmt = fmt or os.getenv("LOG_FORMAT", "json")
+
+    stream = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    handler = _DeferredQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def flush_logging():
+    """Stop the listener after it has written every queued record (for exits that skip atexit)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_after_fork():
+    # The listener thread does not survive os.fork(); give the child its own queue and listener
+    global _listener
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if isinstance(h, _DeferredQueueHandler)]:
+        root.removeHandler(handler)
+    _listener = None
+    configure_logging(*_config)
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def get_logger(name):
+    return logging.getLogger(name)
+
+
+def debug_dumps_enabled(logger):
+    return DEBUG_DUMPS and logger.isEnabledFor(logging.DEBUG)
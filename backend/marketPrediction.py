@@ -1,61 +1,181 @@
-import yfinance as yf
+import os
+import threading
+from datetime import date
+
+import numpy as np
 import pandas as pd
 import warnings
+import breaker
+from cache import get_cache
+from log_setup import get_logger
 warnings.filterwarnings('ignore')
 
+logger = get_logger(__name__)
+
+# Forward horizons (in trading days) computed for every crop
+DEFAULT_HORIZONS = (30, 90, 180, 365)
+# Percentiles of the historical premium used as the dispersion band around each forward price
+BAND_PERCENTILES = (10, 90)
+
+# Optional Yahoo v8 chart-compatible endpoint (e.g. a load-test stand-in) used instead of yfinance
+YAHOO_CHART_URL = os.getenv("YAHOO_CHART_URL")
+
+# Shared by every MarketModel so a day's prices are downloaded and reduced only once.
+# Prices are keyed by calendar day, curves by the last trading day in the data. The latest
+# download is also kept under a "latest" key for MARKET_LAST_GOOD_S, to serve (marked stale)
+# while Yahoo is unavailable.
+MARKET_LAST_GOOD_S = float(os.getenv("MARKET_LAST_GOOD_S", str(7 * 86400)))
+price_cache = get_cache("market_prices", fresh_s=86400, stale_s=MARKET_LAST_GOOD_S, max_entries=16)
+curve_cache = get_cache("market_curve", fresh_s=86400, max_entries=64)
+_cache_lock = threading.Lock()
+
+
 class MarketModel:
 # Futures tickers
     def __init__(self, tickers):
         self.tickers = tickers
+        # Age of the prices when they are the last good download rather than today's
+        self.stale_age_s = None
+
+    def get_close_prices(self, period="5y"):
+        """Daily close prices, one column per crop (cached for the rest of the day)."""
+        prefix = f"{list(self.tickers.items())}|{period}"
+        key = f"{prefix}|{date.today().isoformat()}"
+        with _cache_lock:
+            close_prices, _, _ = price_cache.get(key)
+            if close_prices is not None:
+                return close_prices
+
+            try:
+                close_prices = self._download(period)
+            except Exception as e:
+                close_prices, _, age = price_cache.get(f"{prefix}|latest")
+                if close_prices is None:
+                    raise
+                logger.warning("Market data unavailable (%s), using prices downloaded %.1fh ago", e, age / 3600)
+                self.stale_age_s = age
+                return close_prices
+
+            price_cache.set(key, close_prices)
+            price_cache.set(f"{prefix}|latest", close_prices)
+            return close_prices
+
+    def _download(self, period):
+        logger.info("Downloading %s of futures history for %d tickers", period, len(self.tickers))
+        if YAHOO_CHART_URL:
+            return self._download_chart(period)
+
+        import yfinance as yf
+
+        with breaker.guard("yahoo_finance"):
+            raw = yf.download(
+                list(self.tickers.values()),
+                period=period,
+                group_by="ticker",
+                threads=True,
+                progress=False
+            )
+            # yfinance reports failed tickers on stderr and returns what it got
+            if raw.empty:
+                raise RuntimeError("Yahoo Finance returned no prices")
+
+        # Extract close prices
+        return pd.DataFrame({
+            crop: raw[ticker]["Close"].values
+            for crop, ticker in self.tickers.items()
+        }, index=raw.index)
+
+    def _download_chart(self, period):
+        """Close prices from the v8 chart API at YAHOO_CHART_URL, one request per ticker."""
+        import requests
 
+        series = {}
+        with breaker.guard("yahoo_finance"):
+            for crop, ticker in self.tickers.items():
+                response = requests.get(f"{YAHOO_CHART_URL.rstrip('/')}/{ticker}",
+                                        params={"range": period, "interval": "1d"}, timeout=30)
+                response.raise_for_status()
+                result = response.json()["chart"]["result"][0]
+                index = pd.to_datetime(result["timestamp"], unit="s").normalize()
+                series[crop] = pd.Series(result["indicators"]["quote"][0]["close"], index=index, dtype=float)
+        return pd.DataFrame(series).sort_index()
+
+    def get_forward_curve(self, horizons=DEFAULT_HORIZONS, period="5y"):
+        """
+        Empirical forward curve for every crop at several horizons.
+
+        For each horizon h the historical premium is price[t + h] / price[t] - 1, computed for
+        all crops at once on the aligned (days x crops) price matrix.
+
+        Returns:
+            dict: {crop: {"spot": float, "curve": [{"horizon_days", "forward", "premium",
+                   "premium_std", "low", "high"}, ...]}}
+        """
+        close_prices = self.get_close_prices(period)
+        horizons = tuple(sorted(horizons))
+        key = f"{list(close_prices.columns)}|{horizons}|{period}|{close_prices.index[-1]}"
+        curve, _, _ = curve_cache.get(key)
+        if curve is not None:
+            return curve
+
+        prices = close_prices.to_numpy(dtype=float)
+        spot = close_prices.ffill().to_numpy(dtype=float)[-1]
+
+        # (horizons x crops) summary statistics of the premium distribution
+        mean = np.full((len(horizons), prices.shape[1]), np.nan)
+        std = np.full_like(mean, np.nan)
+        low = np.full_like(mean, np.nan)
+        high = np.full_like(mean, np.nan)
+        for i, h in enumerate(horizons):
+            if h >= len(prices):
+                continue
+            premium = prices[h:] / prices[:-h] - 1
+            mean[i] = np.nanmean(premium, axis=0)
+            std[i] = np.nanstd(premium, axis=0)
+            low[i], high[i] = np.nanpercentile(premium, BAND_PERCENTILES, axis=0)
+
+        curve = {}
+        for j, crop in enumerate(close_prices.columns):
+            curve[crop] = {
+                "spot": round(float(spot[j]), 2),
+                "curve": [
+                    {
+                        "horizon_days": h,
+                        "forward": round(float(spot[j] * (1 + mean[i, j])), 2),
+                        "premium": round(float(mean[i, j]), 4),
+                        "premium_std": round(float(std[i, j]), 4),
+                        "low": round(float(spot[j] * (1 + low[i, j])), 2),
+                        "high": round(float(spot[j] * (1 + high[i, j])), 2),
+                    }
+                    for i, h in enumerate(horizons)
+                ],
+            }
+
+        curve_cache.set(key, curve)
+        return curve
 
     def get_180day_futures_prices(self, period="5y"):
         """
         Calculate 180-day forward prices for all crops based on historical data.
-        
+
         Returns:
             dict: {crop_name: forward_price_180days}
         """
-        # Download historical data
-        print("Downloading historical data...")
-        raw = yf.download(
-            list(self.tickers.values()),
-            period=period,
-            group_by="ticker",
-            threads=True,
-            progress=False
-        )
-        
-        # Extract close prices
-        close_prices = pd.DataFrame({
-            crop: raw[ticker]["Close"].values
-            for crop, ticker in self.tickers.items()
-        }, index=raw.index)
-        
-        # Calculate 180-day empirical forward premiums
         horizon = 180
+        curve = self.get_forward_curve(tuple(sorted(set(DEFAULT_HORIZONS) | {horizon})), period)
+
         results = {}
-        
-        for crop in close_prices.columns:
-            prices = close_prices[crop]
-            current_price = prices.iloc[-1]
-            
-            # Calculate historical premium
-            future_price = prices.shift(-horizon)
-            premium = (future_price / prices) - 1
-            avg_premium = premium.mean()
-            
-            # Apply to current price
-            forward_price = current_price * (1 + avg_premium)
-            results[crop] = round(forward_price, 2)
-        
+        for crop, data in curve.items():
+            point = next(p for p in data["curve"] if p["horizon_days"] == horizon)
+            results[crop] = point["forward"]
+
         return results
 
 
 if __name__ == "__main__":
     # Get 180-day futures prices
     futures_prices = {}
-    
+
     print("\nFutures Prices in a year's time:")
     print("=" * 40)
     for crop, price in futures_prices.items():
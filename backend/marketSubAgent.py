@@ -16,5 +16,9 @@ TICKER_DICT = {
 class MarketSubAgent:
     def __init__(self):
         self.model = MarketModel(TICKER_DICT)
+        # Both come from the same cached price matrix, so the curve costs nothing extra
+        self.curve = self.model.get_forward_curve()
         self.results = self.model.get_180day_futures_prices()
+        # Set when Yahoo was unavailable and the last good download was used
+        self.stale_age_s = self.model.stale_age_s
       
\ No newline at end of file
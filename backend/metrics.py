@@ -0,0 +1,194 @@
+"""
+In-process metrics with Prometheus text exposition (served on /metrics).
+
+Stage timers also collect into an optional per-request `timings` dict (see collect_timings),
+which getCrops can return in `metadata` for debugging.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_timings = contextvars.ContextVar("stage_timings", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[n] for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_label_str(self.labelnames, key)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_sample(self, key, state):
+        counts, total, count = state
+        names = self.labelnames + ("le",)
+        lines = [f"{self.name}_bucket{_label_str(names, key + (bound,))} {counts[i]}"
+                 for i, bound in enumerate(self.buckets)]
+        lines.append(f"{self.name}_bucket{_label_str(names, key + ('+Inf',))} {count}")
+        lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {total}")
+        lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {count}")
+        return lines
+
+
+def render():
+    """All registered metrics in Prometheus text format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency",
+                                 ["method", "path", "status"])
+STAGE_SECONDS = Histogram("pipeline_stage_duration_seconds", "Latency of each getCrops pipeline stage", ["stage"])
+UPSTREAM_REQUESTS = Counter("upstream_requests_total", "Calls to upstream services", ["service", "outcome"])
+UPSTREAM_SECONDS = Histogram("upstream_request_duration_seconds", "Upstream call latency", ["service"])
+CIRCUIT_STATE = Gauge("circuit_breaker_state", "Upstream circuit breaker (0 closed, 1 half-open, 2 open)",
+                      ["service"])
+CIRCUIT_REJECTIONS = Counter("circuit_breaker_rejections_total", "Upstream calls skipped by an open circuit",
+                             ["service"])
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups", ["cache", "result"])
+LLM_TOKENS = Counter("llm_tokens_total", "Anthropic token usage", ["type"])
+EXECUTOR_QUEUE_DEPTH = Gauge("executor_queue_depth", "Admitted requests waiting for a worker", ["executor"])
+EXECUTOR_ACTIVE = Gauge("executor_active_workers", "Workers currently running a request", ["executor"])
+EXECUTOR_QUEUE_WAIT = Histogram("executor_queue_wait_seconds", "Time from admission to a worker picking it up",
+                                ["executor"])
+EXECUTOR_REJECTIONS = Counter("executor_rejections_total", "Requests turned away by admission control",
+                              ["executor", "reason"])
+
+
+@contextmanager
+def collect_timings():
+    """Collect {stage: seconds} for every stage() run inside this block (same thread/task)."""
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def record_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = round(timings.get(name, 0.0) + seconds, 4)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def record_upstream(service, seconds, ok):
+    UPSTREAM_SECONDS.observe(seconds, service=service)
+    UPSTREAM_REQUESTS.inc(service=service, outcome="ok" if ok else "error")
+
+
+@contextmanager
+def upstream(service):
+    """Time an upstream call; an exception escaping the block counts as an error."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        record_upstream(service, time.perf_counter() - start, ok=False)
+        raise
+    record_upstream(service, time.perf_counter() - start, ok=True)
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_llm_usage(usage):
+    """Count tokens from an Anthropic `response.usage` object."""
+    if usage is None:
+        return
+    for kind in ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"):
+        value = getattr(usage, kind, None)
+        if value:
+            LLM_TOKENS.inc(value, type=kind)
@@ -0,0 +1,228 @@
+"""
+Versioned single-file bundle of the regional extreme-weather models.
+
+Layout of models/bundles/bundle-<version>.bin:
+
+    b"ICHBNDL1" | uint32 header length | header JSON | payload
+
+The header lists the regions, variables, feature names, training metrics, a SHA-256 of
+the payload and the byte ranges of each section. The payload is the dense seasonal-stats
+array (float64, regions x variables x [mean, std] x 12 months) followed by every booster
+in XGBoost's binary UBJSON format. Loading is one read (or one mmap) of one file.
+
+    python model_bundle.py build [--version V]   # pack models/ into a new bundle and activate it
+    python model_bundle.py activate V            # point models/bundles/CURRENT at bundle V
+    python model_bundle.py list
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+from datetime import datetime, timezone
+
+import numpy as np
+import xgboost as xgb
+
+MAGIC = b"ICHBNDL1"
+FORMAT_VERSION = 1
+BUNDLE_DIR = "bundles"
+CURRENT_FILE = "CURRENT"
+STATS = ("mean", "std")
+
+
+class SeasonalStats:
+    """Dense per-region, per-variable monthly mean/std lookup."""
+
+    def __init__(self, regions, variables, values):
+        self.regions = list(regions)
+        self.variables = list(variables)
+        # shape (regions, variables, 2, 12); month m lives at index m - 1
+        self.values = values
+        self._region_idx = {r: i for i, r in enumerate(self.regions)}
+        self._var_idx = {v: i for i, v in enumerate(self.variables)}
+
+    @classmethod
+    def from_json(cls, stats, variables):
+        """Convert seasonal_stats.json ({region: {var: {stat: {"1".."12": value}}}})."""
+        regions = list(stats.keys())
+        values = np.full((len(regions), len(variables), len(STATS), 12), np.nan)
+        for ri, region in enumerate(regions):
+            for vi, var in enumerate(variables):
+                for si, stat in enumerate(STATS):
+                    for month, value in stats[region][var][stat].items():
+                        values[ri, vi, si, int(month) - 1] = value
+        return cls(regions, variables, values)
+
+    def __contains__(self, region):
+        return region in self._region_idx
+
+    def mean_std(self, region, var, month):
+        cell = self.values[self._region_idx[region], self._var_idx[var], :, int(month) - 1]
+        return float(cell[0]), float(cell[1])
+
+    def monthly(self, region, var, months):
+        """Vectorised mean_std: (means, stds) arrays aligned with an array of months (1-12)."""
+        cell = self.values[self._region_idx[region], self._var_idx[var]]
+        idx = np.asarray(months, dtype=int) - 1
+        return cell[0, idx], cell[1, idx]
+
+
+class ModelBundle:
+    def __init__(self, version, models, seasonal_stats, feature_names, metrics, _buffer=None):
+        self.version = version
+        self.models = models
+        self.seasonal_stats = seasonal_stats
+        self.feature_names = feature_names
+        self.metrics = metrics
+        # Keeps an mmap alive while the stats array views into it
+        self._buffer = _buffer
+
+    @staticmethod
+    def write(path, version, boosters, seasonal_stats, feature_names, metrics):
+        """Serialise boosters ({region: XGBClassifier}) and stats into one bundle file (atomically)."""
+        stats_bytes = np.ascontiguousarray(seasonal_stats.values, dtype="<f8").tobytes()
+        sections = {
+            "seasonal_stats": {"offset": 0, "length": len(stats_bytes),
+                               "shape": list(seasonal_stats.values.shape)},
+            "boosters": {},
+        }
+        chunks = [stats_bytes]
+        offset = len(stats_bytes)
+        for region, model in boosters.items():
+            raw = bytes(model.get_booster().save_raw(raw_format="ubj"))
+            sections["boosters"][region] = {"offset": offset, "length": len(raw)}
+            chunks.append(raw)
+            offset += len(raw)
+        payload = b"".join(chunks)
+
+        header = json.dumps({
+            "format_version": FORMAT_VERSION,
+            "version": version,
+            "created": datetime.now(timezone.utc).isoformat(),
+            "regions": seasonal_stats.regions,
+            "variables": seasonal_stats.variables,
+            "feature_names": feature_names,
+            "metrics": metrics,
+            "sections": sections,
+            "sha256": hashlib.sha256(payload).hexdigest(),
+        }).encode("utf-8")
+
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            f.write(payload)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, use_mmap=False, verify=True):
+        from model_trainer import ExtremeWeatherModel
+
+        with open(path, "rb") as f:
+            if use_mmap:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buf = f.read()
+        view = memoryview(buf)
+
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a model bundle")
+        (header_len,) = struct.unpack_from("<I", view, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(bytes(view[start:start + header_len]))
+        if header["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported bundle format {header['format_version']}")
+        payload = view[start + header_len:]
+
+        if verify and hashlib.sha256(payload).hexdigest() != header["sha256"]:
+            raise ValueError(f"Checksum mismatch in {path}")
+
+        sec = header["sections"]["seasonal_stats"]
+        values = np.frombuffer(payload[sec["offset"]:sec["offset"] + sec["length"]], dtype="<f8")
+        stats = SeasonalStats(header["regions"], header["variables"], values.reshape(sec["shape"]))
+
+        models = {}
+        for region, sec in header["sections"]["boosters"].items():
+            inst = ExtremeWeatherModel(region)
+            inst.model = xgb.XGBClassifier()
+            inst.model.load_model(bytearray(payload[sec["offset"]:sec["offset"] + sec["length"]]))
+            models[region] = inst
+
+        return cls(header["version"], models, stats, header["feature_names"], header["metrics"],
+                   _buffer=buf if use_mmap else None)
+
+
+def bundle_path(model_dir, version):
+    return os.path.join(model_dir, BUNDLE_DIR, "bundle-" + version + ".bin")
+
+
+def current_bundle_path(model_dir="models"):
+    """Path of the active bundle, or None if no bundle has been activated."""
+    pointer = os.path.join(model_dir, BUNDLE_DIR, CURRENT_FILE)
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        return bundle_path(model_dir, f.read().strip())
+
+
+def activate(model_dir, version):
+    """Atomically repoint CURRENT at an existing bundle version."""
+    if not os.path.exists(bundle_path(model_dir, version)):
+        raise FileNotFoundError(bundle_path(model_dir, version))
+    pointer = os.path.join(model_dir, BUNDLE_DIR, CURRENT_FILE)
+    with open(pointer + ".tmp", "w") as f:
+        f.write(version)
+    os.replace(pointer + ".tmp", pointer)
+
+
+def build(model_dir="models", version=None):
+    from anomaly_labeler import AnomalyLabeler
+    from hybrid_predictor import EXTREME_VARS
+    from model_trainer import ExtremeWeatherModel
+    from weather_fetcher import WeatherDataFetcher
+
+    version = version or datetime.now().strftime("%Y%m%d%H%M%S")
+    with open(os.path.join(model_dir, "seasonal_stats.json")) as f:
+        stats = SeasonalStats.from_json(json.load(f), EXTREME_VARS)
+
+    metrics = {}
+    summary_file = os.path.join(model_dir, "training_summary.json")
+    if os.path.exists(summary_file):
+        with open(summary_file) as f:
+            metrics = json.load(f)
+
+    boosters = {
+        reg: ExtremeWeatherModel.load(reg, model_dir).model
+        for reg in WeatherDataFetcher.UK_REGIONS.keys()
+        if reg in stats and os.path.exists(os.path.join(model_dir, reg + ".json"))
+    }
+
+    os.makedirs(os.path.join(model_dir, BUNDLE_DIR), exist_ok=True)
+    path = bundle_path(model_dir, version)
+    ModelBundle.write(path, version, boosters, stats, AnomalyLabeler.FEATURE_COLS, metrics)
+    activate(model_dir, version)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["build", "activate", "list"])
+    parser.add_argument("version", nargs="?")
+    parser.add_argument("--model-dir", default="models")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print("Wrote " + build(args.model_dir, args.version))
+    elif args.command == "activate":
+        activate(args.model_dir, args.version)
+        print("Active bundle: " + args.version)
+    else:
+        current = current_bundle_path(args.model_dir)
+        folder = os.path.join(args.model_dir, BUNDLE_DIR)
+        for name in sorted(os.listdir(folder)) if os.path.isdir(folder) else []:
+            if name.endswith(".bin"):
+                marker = "*" if current and os.path.basename(current) == name else " "
+                print(marker + " " + name)
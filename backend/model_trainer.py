@@ -1,20 +1,24 @@
-import pandas as pd
 import numpy as np
 import xgboost as xgb
-from sklearn.model_selection import train_test_split
-import os, glob
-from tqdm.contrib.concurrent import process_map
+import os
 from anomaly_labeler import AnomalyLabeler
 
+XGB_PARAMS = dict(max_depth=4, learning_rate=0.05, n_estimators=150, tree_method='hist')
+TEST_SIZE = 0.2
+SPLIT_SEED = 42
+
 class ExtremeWeatherModel:
     def __init__(self, name="model"):
         self.name = name
         self.model = None
 
     def train(self, X, y):
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
+        # Training-only dependency: keep it out of the serving import path
+        from sklearn.model_selection import train_test_split
+
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, stratify=y, random_state=SPLIT_SEED)
         pos_weight = np.sqrt((y == 0).sum() / (y == 1).sum())
-        self.model = xgb.XGBClassifier(max_depth=4, learning_rate=0.05, n_estimators=150, scale_pos_weight=pos_weight, tree_method='hist')
+        self.model = xgb.XGBClassifier(**XGB_PARAMS, scale_pos_weight=pos_weight)
         self.model.fit(X_train, y_train, eval_set=[(X_test, y_test)], verbose=False)
 
     def save(self, folder="models"):
@@ -28,9 +32,11 @@ class ExtremeWeatherModel:
         inst.model.load_model(os.path.join(folder, name + ".json"))
         return inst
 
-def train_single_region(file_path):
-    region_name = os.path.basename(file_path).replace("_labeled.parquet", "")
-    df = pd.read_parquet(file_path)
+def train_single_region(region_name):
+    from weather_dataset import load_region
+
+    # Only the model inputs and label are read from the labeled dataset
+    df = load_region("labeled", region_name, columns=AnomalyLabeler.FEATURE_COLS + ['target'])
     X = df[AnomalyLabeler.FEATURE_COLS]
     y = df['target']
     m = ExtremeWeatherModel(region_name)
@@ -39,5 +45,8 @@ def train_single_region(file_path):
     return region_name
 
 if __name__ == "__main__":
-    files = glob.glob("data/labeled/*.parquet")
-    results = process_map(train_single_region, files, max_workers=os.cpu_count(), desc="Training Regional Models")
\ No newline at end of file
+    from tqdm.contrib.concurrent import process_map
+    from weather_dataset import list_regions
+
+    regions = list_regions("labeled")
+    results = process_map(train_single_region, regions, max_workers=os.cpu_count(), desc="Training Regional Models")
\ No newline at end of file
@@ -0,0 +1,317 @@
+"""
+Incremental model build: fetch -> label -> train -> bundle.
+
+Each region is a chain of nodes over its own artifacts:
+
+    fetch   archive API         -> data/raw_ds/region=<r>/
+    label   raw partitions      -> data/labeled_ds/region=<r>/ + its seasonal_stats.json entry
+    train   labeled partitions  -> models/<r>.json
+
+and one bundle node packs every region's model (model_bundle.build). A node's fingerprint
+hashes its parameters, the content of its inputs and the source of the step that produces it.
+The node is skipped when that fingerprint and the hash of its outputs both match the last
+build recorded in the state file. The archive fetch for every stale region is one batched
+request; label and train run per region in a process pool.
+
+Pin the date range, otherwise "the last 15 years" moves every day and always refetches.
+
+Run from backend/:
+    python pipeline.py build --start 2011-01-01 --end 2025-12-31
+    python pipeline.py build --regions east_anglia --force
+    python pipeline.py status
+
+Environment:
+    PIPELINE_STATE   state file (default data/pipeline_state.json)
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from log_setup import configure_logging, get_logger
+
+logger = get_logger(__name__)
+
+STATE_FILE = os.getenv("PIPELINE_STATE", "data/pipeline_state.json")
+MODEL_DIR = "models"
+STATS_FILE = os.path.join(MODEL_DIR, "seasonal_stats.json")
+STEPS = ("fetch", "label", "train")
+
+
+def fingerprint(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def hash_file(path):
+    if not path or not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_tree(path):
+    """Content hash of every file under `path`, or None if it does not exist."""
+    if not os.path.isdir(path):
+        return None
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            digest.update(os.path.relpath(full, path).encode())
+            digest.update(hash_file(full).encode())
+    return digest.hexdigest()
+
+
+def code_hash(filename):
+    return hash_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), filename))
+
+
+def model_path(region):
+    return os.path.join(MODEL_DIR, region + ".json")
+
+
+def _write_json(path, data):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def load_state():
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE) as f:
+        return json.load(f)
+
+
+def load_stats():
+    if not os.path.exists(STATS_FILE):
+        return {}
+    with open(STATS_FILE) as f:
+        return json.load(f)
+
+
+def node_record(fp, output, elapsed_s):
+    return {"fingerprint": fp, "output": output, "elapsed_s": round(elapsed_s, 2),
+            "built_at": datetime.now().isoformat(timespec="seconds")}
+
+
+def is_current(state, node_id, fp, output):
+    rec = state.get(node_id)
+    return output is not None and rec is not None and rec["fingerprint"] == fp and rec["output"] == output
+
+
+# ---- node inputs and outputs ----
+
+def fetch_fingerprint(region, start, end):
+    from weather_fetcher import WeatherDataFetcher
+
+    lat, lon = WeatherDataFetcher.UK_REGIONS[region]
+    return fingerprint({"step": "fetch", "lat": lat, "lon": lon, "start": start, "end": end,
+                        "variables": WeatherDataFetcher.VARIABLES})
+
+
+def label_fingerprint(raw_output, z_threshold):
+    return fingerprint({"step": "label", "raw": raw_output, "z_threshold": z_threshold,
+                        "code": code_hash("anomaly_labeler.py")})
+
+
+def train_fingerprint(label_output):
+    from model_trainer import SPLIT_SEED, TEST_SIZE, XGB_PARAMS
+
+    return fingerprint({"step": "train", "labeled": label_output, "params": XGB_PARAMS,
+                        "split": [TEST_SIZE, SPLIT_SEED], "code": code_hash("model_trainer.py")})
+
+
+def raw_output(region):
+    from weather_dataset import region_path
+
+    return hash_tree(region_path("raw", region))
+
+
+def label_output(region, region_stats):
+    from weather_dataset import region_path
+
+    tree = hash_tree(region_path("labeled", region))
+    return fingerprint([tree, region_stats]) if tree and region_stats is not None else None
+
+
+# ---- build ----
+
+def build_region(region, z_threshold, state, region_stats, force=False):
+    """
+    Label and train one region where their inputs changed (runs in a worker process).
+
+    Returns (region, {node_id: record} for the nodes that ran, the region's seasonal stats).
+    """
+    from anomaly_labeler import AnomalyLabeler
+    from model_trainer import train_single_region
+    from weather_dataset import load_region, save_region
+
+    records = {}
+    fp = label_fingerprint(raw_output(region), z_threshold)
+    output = label_output(region, region_stats)
+    if force or not is_current(state, region + "/label", fp, output):
+        start = time.perf_counter()
+        df, stats = AnomalyLabeler(z_threshold).label_extremes(load_region("raw", region, compact=False))
+        save_region(df, "labeled", region)
+        # Round-trip so the stats hash the same as when read back from seasonal_stats.json
+        region_stats = json.loads(json.dumps(stats))
+        output = label_output(region, region_stats)
+        records[region + "/label"] = node_record(fp, output, time.perf_counter() - start)
+
+    fp = train_fingerprint(output)
+    if force or not is_current(state, region + "/train", fp, hash_file(model_path(region))):
+        start = time.perf_counter()
+        train_single_region(region)
+        records[region + "/train"] = node_record(fp, hash_file(model_path(region)), time.perf_counter() - start)
+
+    return region, records, region_stats
+
+
+def build(regions=None, start=None, end=None, years=15, z_threshold=2.5, workers=None, force=False):
+    from model_bundle import build as build_bundle, current_bundle_path
+    from weather_dataset import save_region
+    from weather_fetcher import WeatherDataFetcher
+
+    regions = regions or list(WeatherDataFetcher.UK_REGIONS)
+    if not start:
+        today = datetime.now()
+        start, end = (today - timedelta(days=365 * years)).strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d")
+    state, stats = load_state(), load_stats()
+    ran, failed = {}, {}
+    run_start = time.perf_counter()
+
+    # 1. fetch: every stale region in one batched archive request
+    stale = []
+    for region in regions:
+        fp = fetch_fingerprint(region, start, end)
+        if force or not is_current(state, region + "/fetch", fp, raw_output(region)):
+            stale.append((region, fp))
+    if stale:
+        fetch_start = time.perf_counter()
+        frames = WeatherDataFetcher().fetch_historical_batch(
+            [WeatherDataFetcher.UK_REGIONS[region] for region, _ in stale], start_date_str=start, end_date_str=end)
+        for (region, fp), df in zip(stale, frames):
+            if df is None:
+                failed[region] = "archive fetch failed"
+                continue
+            save_region(df, "raw", region)
+            # Shared request: each region records the whole batch's time
+            record = node_record(fp, raw_output(region), time.perf_counter() - fetch_start)
+            state[region + "/fetch"] = ran[region + "/fetch"] = record
+        _write_json(STATE_FILE, state)
+
+    # 2. label + train, independent regions in parallel
+    todo = [r for r in regions if r not in failed and raw_output(r) is not None]
+    failed.update({r: "no raw data" for r in regions if r not in failed and r not in todo})
+    if todo:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(todo)))
+        with ProcessPoolExecutor(max_workers=workers, initializer=configure_logging) as pool:
+            futures = {
+                pool.submit(build_region, region, z_threshold,
+                            {k: v for k, v in state.items() if k.startswith(region + "/")},
+                            stats.get(region), force): region
+                for region in todo
+            }
+            for future in as_completed(futures):
+                region = futures[future]
+                try:
+                    _, records, region_stats = future.result()
+                except Exception as e:
+                    logger.exception("Build failed for %s", region)
+                    failed[region] = str(e)
+                    continue
+                if stats.get(region) != region_stats:
+                    stats[region] = region_stats
+                    _write_json(STATS_FILE, stats)
+                state.update(records)
+                ran.update(records)
+                _write_json(STATE_FILE, state)
+
+    # 3. bundle every trained region so serving picks the new models up
+    models = {r: hash_file(model_path(r)) for r in WeatherDataFetcher.UK_REGIONS if os.path.exists(model_path(r))}
+    if models:
+        fp = fingerprint({"step": "bundle", "models": models, "stats": hash_file(STATS_FILE)})
+        if force or not is_current(state, "bundle", fp, hash_file(current_bundle_path(MODEL_DIR))):
+            bundle_start = time.perf_counter()
+            path = build_bundle(MODEL_DIR)
+            state["bundle"] = ran["bundle"] = node_record(fp, hash_file(path), time.perf_counter() - bundle_start)
+            _write_json(STATE_FILE, state)
+
+    return {
+        "ran": {node: rec["elapsed_s"] for node, rec in sorted(ran.items())},
+        "skipped": sorted(f"{r}/{step}" for r in regions if r not in failed
+                          for step in STEPS if f"{r}/{step}" not in ran),
+        "failed": failed,
+        "elapsed_s": round(time.perf_counter() - run_start, 1),
+    }
+
+
+def status(regions=None):
+    """Last build of every node and whether its outputs are still the ones it produced."""
+    from model_bundle import current_bundle_path
+    from weather_fetcher import WeatherDataFetcher
+
+    state, stats = load_state(), load_stats()
+    outputs = {}
+    for region in regions or WeatherDataFetcher.UK_REGIONS:
+        outputs[region + "/fetch"] = raw_output(region)
+        outputs[region + "/label"] = label_output(region, stats.get(region))
+        outputs[region + "/train"] = hash_file(model_path(region))
+    outputs["bundle"] = hash_file(current_bundle_path(MODEL_DIR))
+
+    rows = {}
+    for node, output in outputs.items():
+        rec = state.get(node)
+        if rec is None:
+            rows[node] = "never built"
+        elif output is None:
+            rows[node] = "missing"
+        elif output != rec["output"]:
+            rows[node] = "modified since " + rec["built_at"]
+        else:
+            rows[node] = f"built {rec['built_at']} ({rec['elapsed_s']}s)"
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["build", "status"])
+    parser.add_argument("--regions", help="comma-separated regions (default: all)")
+    parser.add_argument("--start", help="archive start date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="archive end date (YYYY-MM-DD)")
+    parser.add_argument("--years", type=int, default=15, help="history length when --start is not given")
+    parser.add_argument("--z-threshold", type=float, default=2.5)
+    parser.add_argument("--workers", type=int, help="parallel regions (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="rebuild every node")
+    args = parser.parse_args()
+
+    configure_logging()
+    regions = [r.strip() for r in args.regions.split(",")] if args.regions else None
+    if args.command == "build":
+        if bool(args.start) != bool(args.end):
+            parser.error("--start and --end go together")
+        summary = build(regions, args.start, args.end, args.years, args.z_threshold, args.workers, args.force)
+        for node, elapsed in summary["ran"].items():
+            print(f"  ran     {node:28} {elapsed:>8.2f}s")
+        for node in summary["skipped"]:
+            print(f"  skipped {node}")
+        for region, reason in summary["failed"].items():
+            print(f"  FAILED  {region}: {reason}")
+        print(f"Done in {summary['elapsed_s']}s")
+    else:
+        for node, line in status(regions).items():
+            print(f"{node:28} {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Nightly precompute of location/day telemetry for every UK postcode district.
+
+Walks the outward codes in the pgeocode GB table (~3,000 districts), computes soil, weather
+anomalies and extreme-weather risk at each district centroid with bounded concurrency, and
+stores the result in telemetry_store for Agent to read.
+
+Run from backend/:
+    python precompute.py run --concurrency 4            # skips districts computed in the last 12h
+    python precompute.py run --districts SW1A,NR1 --force
+    python precompute.py report                          # coverage and freshness
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from log_setup import configure_logging, get_logger
+import telemetry_store
+
+logger = get_logger(__name__)
+
+# A run skips districts computed more recently than this. Much shorter than the 26h Agent
+# serves rows for, so a nightly run recomputes last night's rows rather than skipping them
+# until they expire mid-day. It only saves work when a run is repeated, e.g. after a failure.
+SKIP_YOUNGER_THAN_H = 12.0
+
+
+def list_districts():
+    """DataFrame of district -> centroid latitude/longitude from the pgeocode GB table."""
+    from weatherSubAgent import get_nominatim
+
+    data = get_nominatim("gb")._data[["postal_code", "latitude", "longitude"]].dropna()
+    data["district"] = data["postal_code"].str.split().str[0].str.upper()
+    return data.groupby("district")[["latitude", "longitude"]].mean()
+
+
+def compute_district(district, lat, lon, anomaly_mode, predictor, raw_forecast=None):
+    from agent import compute_telemetry, format_soil_data, stale_entry
+    from soilPrediction import get_soil_at
+    from weatherSubAgent import WeatherSubAgent
+
+    if raw_forecast is None:
+        raise ValueError("no forecast data")
+    weather = WeatherSubAgent(district, mode=anomaly_mode, coordinates=(lat, lon), raw_data=raw_forecast)
+    soil_result = get_soil_at(lat, lon)
+    stale = {}
+    if soil_result and soil_result.get('stale_age_s') is not None:
+        stale['soil'] = stale_entry(soil_result['stale_age_s'])
+    telemetry = compute_telemetry(weather, predictor, format_soil_data(soil_result), stale)
+    if telemetry is None:
+        raise ValueError("weather model could not score the forecast")
+    # Stale inputs are only for keeping live requests up; leave the district for the next run
+    if telemetry['stale']:
+        raise ValueError(f"upstream unavailable, stale inputs: {sorted(telemetry['stale'])}")
+    telemetry_store.save(district, anomaly_mode, lat, lon, telemetry)
+
+
+def compute_chunk(chunk, anomaly_mode, predictor):
+    """One batched forecast request for the chunk, then each district in turn. Returns {district: error}."""
+    from weatherSubAgent import fetch_forecasts
+
+    forecasts = fetch_forecasts(list(zip(chunk.latitude, chunk.longitude)))
+    failed = {}
+    for (district, row), forecast in zip(chunk.iterrows(), forecasts):
+        try:
+            compute_district(district, row.latitude, row.longitude, anomaly_mode, predictor, forecast)
+        except Exception as e:
+            failed[district] = str(e)
+            logger.warning("Precompute failed for %s: %s", district, e)
+    return failed
+
+
+def run(anomaly_mode, concurrency=4, only=None, limit=None, force=False, batch_size=25,
+        skip_younger_than_h=SKIP_YOUNGER_THAN_H):
+    from hybrid_predictor import get_predictor
+    from weather_fetcher import plan_batches
+
+    districts = list_districts()
+    if only:
+        districts = districts.loc[districts.index.intersection(only)]
+    if not force:
+        cutoff = time.time() - skip_younger_than_h * 3600
+        recent = {d for d, ts in telemetry_store.computed_at(anomaly_mode).items() if ts >= cutoff}
+        districts = districts.loc[~districts.index.isin(recent)]
+    if limit:
+        districts = districts.head(limit)
+
+    predictor = get_predictor()
+    print(f"Precomputing {len(districts)} districts ({anomaly_mode}, concurrency {concurrency})")
+    start = time.perf_counter()
+    done, failed = 0, {}
+    # A chunk shares one forecast request, then makes an archive and one or more SoilGrids calls
+    # per district; the pool size is the bound on concurrent upstream traffic
+    chunks = [districts.iloc[lo:hi] for lo, hi in plan_batches(len(districts), 1, max_locations=batch_size)]
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="precompute") as pool:
+        futures = {pool.submit(compute_chunk, chunk, anomaly_mode, predictor): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            chunk_failed = future.result()
+            failed.update(chunk_failed)
+            done += len(futures[future]) - len(chunk_failed)
+            print(f"  {done + len(failed)}/{len(districts)} ({len(failed)} failed)", flush=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"Done in {elapsed / 60:.1f} min: {done} computed, {len(failed)} failed")
+    return {"computed": done, "failed": failed, "elapsed_s": round(elapsed, 1)}
+
+
+def report(anomaly_mode):
+    """Coverage of the district list and age of the stored rows."""
+    districts = set(list_districts().index)
+    stored = telemetry_store.computed_at(anomaly_mode)
+    now = time.time()
+    ages_h = np.array([(now - ts) / 3600 for d, ts in stored.items() if d in districts])
+    fresh = int((ages_h <= telemetry_store.MAX_AGE_S / 3600).sum())
+    summary = {
+        "anomaly_mode": anomaly_mode,
+        "districts": len(districts),
+        "stored": len(ages_h),
+        "fresh": fresh,
+        "coverage": round(fresh / len(districts), 4) if districts else 0.0,
+        "age_hours": {
+            "min": round(float(ages_h.min()), 1),
+            "median": round(float(np.median(ages_h)), 1),
+            "max": round(float(ages_h.max()), 1),
+        } if len(ages_h) else None,
+        "missing": sorted(districts - set(stored))[:20],
+    }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["run", "report"])
+    parser.add_argument("--mode", default=None, help="anomaly mode (default: WEATHER_ANOMALY_MODE)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=25, help="districts per forecast request")
+    parser.add_argument("--districts", help="comma-separated outward codes to compute")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--skip-younger-than", type=float, default=SKIP_YOUNGER_THAN_H, metavar="HOURS",
+                        help="skip districts computed within this many hours (default: %(default)s)")
+    parser.add_argument("--force", action="store_true", help="recompute every district")
+    args = parser.parse_args()
+
+    configure_logging()
+    from anomaly_modes import DEFAULT_ANOMALY_MODE
+    mode = args.mode or DEFAULT_ANOMALY_MODE
+
+    if args.command == "run":
+        only = [d.strip().upper() for d in args.districts.split(",")] if args.districts else None
+        run(mode, args.concurrency, only, args.limit, args.force, args.batch_size, args.skip_younger_than)
+    print(json.dumps(report(mode), indent=2))
+
+
+if __name__ == "__main__":
+    main()
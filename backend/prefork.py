@@ -0,0 +1,163 @@
+"""
+Multi-worker serving: load the read-only models and indexes once, then fork uvicorn workers.
+
+The master warms up (warmup.warm_up: request-path imports, regional boosters and seasonal
+stats, the postcode index, market history), then gc.freeze()s so no child's collector writes
+to those objects and their pages stay shared copy-on-write. Every worker accepts on the same
+listening socket. The mutable caches (market prices, soil profiles, weather history, strategy
+results) use the SQLite backend in cache.py, so one worker's fetch warms them all.
+
+Run from backend/:
+    python prefork.py --workers 4 --port 8000
+
+Beside the serving workers the master forks one job runner (jobs.run_forever), which runs
+every /jobs job on JOB_WORKERS threads with the same shared models; the serving workers only
+queue jobs. Children that die are restarted. SIGTERM or SIGINT stops all of them. Each worker
+still has its own /metrics counters and its own predict executor. Only the master, which is
+never restarted, releases jobs whose owner has gone and expires old ones (jobs.py); the job
+runner then adopts each released job.
+
+The master must not run model inference: XGBoost's OpenMP thread pool does not survive a fork.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+RESTART_DELAY_S = 1.0
+POLL_S = 0.5
+# Child index of the job runner
+JOB_RUNNER = "jobs"
+
+
+def serve_worker(index, sock, app, config_kwargs):
+    import uvicorn
+
+    os.environ["SERVE_WORKER"] = str(index)
+    # uvicorn installs its own handlers once it starts
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    uvicorn.Server(uvicorn.Config(app, **config_kwargs)).run(sockets=[sock])
+
+
+def run_jobs():
+    import jobs
+
+    os.environ["SERVE_WORKER"] = JOB_RUNNER
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    jobs.run_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVE_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--backlog", type=int, default=2048)
+    args = parser.parse_args()
+
+    # Before anything creates a cache
+    os.environ.setdefault("CACHE_BACKEND", "sqlite")
+    # Tells the workers' job upkeep that the master releases orphaned jobs
+    os.environ["SERVE_PREFORK"] = "1"
+
+    import cache
+    import jobs
+    import warmup
+    from log_setup import flush_logging, get_logger
+    # Imported in the master so workers share it; importing it also configures logging
+    import server
+
+    logger = get_logger("prefork")
+    if not warmup.warm_up():
+        sys.exit(1)
+    # Jobs left by the previous deployment, before any worker starts adopting
+    jobs.release_orphans()
+    jobs.cleanup()
+    gc.collect()
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(args.backlog)
+    sock.set_inheritable(True)
+    config_kwargs = {"log_config": None, "backlog": args.backlog}
+
+    children = {}
+    stopping = False
+
+    def spawn(index):
+        # Children open their own SQLite connections
+        cache.close_db()
+        jobs.close_db()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                if index == JOB_RUNNER:
+                    run_jobs()
+                else:
+                    serve_worker(index, sock, server.app, config_kwargs)
+                code = 0
+            except BaseException:
+                logger.exception("Worker %s failed", index)
+            finally:
+                flush_logging()
+                os._exit(code)
+        children[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(args.workers):
+        spawn(index)
+    if jobs.JOB_WORKERS > 0:
+        spawn(JOB_RUNNER)
+    logger.info("Serving on %s:%d with %d workers", args.host, args.port, args.workers,
+                extra={"workers": sorted(children)})
+
+    next_release = time.monotonic() + jobs.JOB_HEARTBEAT_S
+    next_cleanup = time.monotonic() + jobs.CLEANUP_INTERVAL_S
+    while children:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            now = time.monotonic()
+            try:
+                if now >= next_release and not stopping:
+                    next_release = now + jobs.JOB_HEARTBEAT_S
+                    jobs.release_orphans()
+                if now >= next_cleanup and not stopping:
+                    next_cleanup = now + jobs.CLEANUP_INTERVAL_S
+                    jobs.cleanup()
+            except Exception:
+                logger.exception("Job upkeep failed")
+            time.sleep(POLL_S)
+            continue
+        index = children.pop(pid, None)
+        if index is None or stopping:
+            continue
+        logger.warning("Worker %s (pid %d) exited with %d, restarting", index, pid, os.waitstatus_to_exitcode(status))
+        time.sleep(RESTART_DELAY_S)
+        if not stopping:
+            spawn(index)
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Opt-in per-request sampling profiler.
+
+A background thread samples the request thread's Python stack every PROFILE_INTERVAL_MS
+and writes two flamegraph files per profiled request into PROFILE_DIR:
+    <stamp>-<request id>.speedscope.json   (open at https://www.speedscope.app)
+    <stamp>-<request id>.folded            (collapsed stacks for flamegraph.pl / inferno)
+
+A request is profiled when an admin asks for it (X-Profile: 1 header or ?profile=true, plus
+X-Admin-Token matching PROFILE_ADMIN_TOKEN) or when it is picked by random sampling at
+PROFILE_SAMPLE_RATE (0.0 = never, the default).
+"""
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from log_setup import get_logger, request_id
+
+logger = get_logger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN")
+
+SUFFIXES = (".speedscope.json", ".folded")
+# The request ID comes from the caller: keep it to a short, path-safe token in file names
+_UNSAFE_ID = re.compile(r"[^A-Za-z0-9_-]")
+MAX_ID_LEN = 64
+
+
+class SamplingProfiler:
+    """Samples one thread's stack from a helper thread; the profiled code is not instrumented."""
+
+    def __init__(self, thread_id=None, interval=PROFILE_INTERVAL_MS / 1000):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        if stack:
+            # Root first
+            self.samples[tuple(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+
+    def to_collapsed(self):
+        lines = []
+        for stack, count in self.samples.most_common():
+            names = ";".join(f"{name} ({os.path.basename(path)}:{line})" for name, path, line in stack)
+            lines.append(f"{names} {count}")
+        return "\n".join(lines) + "\n"
+
+    def to_speedscope(self, name):
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, count in self.samples.items():
+            ids = []
+            for fn, path, line in stack:
+                key = (fn, path, line)
+                if key not in index:
+                    index[key] = len(frames)
+                    frames.append({"name": fn, "file": path, "line": line})
+                ids.append(index[key])
+            samples.append(ids)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "ichack-sampling-profiler",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(self.duration, 6),
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+
+def is_admin(token):
+    return bool(PROFILE_ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, PROFILE_ADMIN_TOKEN)
+
+
+def should_profile(requested, admin_token):
+    """Explicit requests need the admin token; otherwise fall back to random sampling."""
+    if requested:
+        return is_admin(admin_token)
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@contextmanager
+def maybe_profile(enabled, label="request"):
+    """Profile the calling thread for the duration of the block if `enabled`."""
+    if not enabled:
+        yield None
+        return
+
+    profiler = SamplingProfiler()
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        rid = request_id.get()
+        rid = _UNSAFE_ID.sub("", rid)[:MAX_ID_LEN] if rid != "-" else ""
+        name = time.strftime("%Y%m%dT%H%M%S") + "-" + (rid or uuid.uuid4().hex)
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            with open(os.path.join(PROFILE_DIR, name + ".speedscope.json"), "w") as f:
+                json.dump(profiler.to_speedscope(f"{label} {name}"), f)
+            with open(os.path.join(PROFILE_DIR, name + ".folded"), "w") as f:
+                f.write(profiler.to_collapsed())
+            logger.info("Saved profile %s (%d samples, %.2fs)", name, sum(profiler.samples.values()), profiler.duration)
+        except OSError as e:
+            logger.warning("Could not save profile %s: %s", name, e)
+
+
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    entries = []
+    for fname in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if fname.endswith(SUFFIXES):
+            path = os.path.join(PROFILE_DIR, fname)
+            entries.append({"name": fname, "bytes": os.path.getsize(path), "modified": os.path.getmtime(path)})
+    return entries
+
+
+def profile_path(fname):
+    """Path of a saved profile, or None if the name is not a profile in PROFILE_DIR."""
+    if os.path.basename(fname) != fname or not fname.endswith(SUFFIXES):
+        return None
+    path = os.path.join(PROFILE_DIR, fname)
+    return path if os.path.isfile(path) else None
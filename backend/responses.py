@@ -0,0 +1,139 @@
+"""
+Response encoding for the API: orjson bodies and gzip/brotli compression.
+
+FastJSONResponse is the app's default response class. CompressionMiddleware compresses
+bodies of at least COMPRESS_MIN_BYTES with the best encoding the client accepts (br, then
+gzip). A strong ETag names one byte sequence, so the middleware tags each encoding
+separately ("<tag>-br") and strips the suffix from If-None-Match before the app compares.
+
+Environment:
+    COMPRESS_MIN_BYTES       smallest body worth compressing (default 1024)
+    COMPRESS_GZIP_LEVEL      default 6
+    COMPRESS_BROTLI_QUALITY  default 4 (higher levels cost far more CPU for a few % less)
+"""
+import gzip
+import os
+
+import brotli
+import orjson
+from fastapi.responses import JSONResponse
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+
+# Content types that are already compressed or streamed
+SKIP_TYPES = ("image/", "video/", "audio/", "application/zip", "application/gzip", "text/event-stream")
+
+
+def dumps(content):
+    """JSON bytes; numpy scalars/arrays and non-string dict keys are accepted."""
+    return orjson.dumps(content, default=float,
+                        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+
+def negotiate(accept_encoding):
+    """"br", "gzip" or None for an Accept-Encoding header value."""
+    offered = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip().lower()] = q
+    wildcard = offered.get("*", 0.0)
+    for encoding in ("br", "gzip"):
+        if offered.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def _strip_encoding_suffix(if_none_match):
+    tags = []
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        for encoding in ("br", "gzip"):
+            if tag.endswith(f'-{encoding}"'):
+                tag = tag[:-len(encoding) - 2] + '"'
+        tags.append(tag)
+    return ", ".join(tags)
+
+
+class CompressionMiddleware:
+    """ASGI middleware; buffers each response body (API responses are small and not streamed)."""
+
+    def __init__(self, app, minimum_size=None):
+        self.app = app
+        self.minimum_size = COMPRESS_MIN_BYTES if minimum_size is None else minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        encoding = negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if_none_match = headers.get(b"if-none-match", b"").decode("latin-1")
+        if if_none_match:
+            scope = dict(scope)
+            scope["headers"] = [
+                (k, _strip_encoding_suffix(if_none_match).encode("latin-1") if k == b"if-none-match" else v)
+                for k, v in scope["headers"]
+            ]
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        suffix = f'-{encoding}"'.encode()
+        start = None
+        chunks = []
+
+        def tag_encoding(response_headers):
+            return [(k, v[:-1] + suffix if k == b"etag" and v.startswith(b'"') else v) for k, v in response_headers]
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                return await send(message)
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            response_headers = list(start["headers"])
+            names = {k.lower(): v for k, v in response_headers}
+            content_type = names.get(b"content-type", b"").decode("latin-1")
+
+            if start["status"] == 304:
+                # Echo the tag in the form the client holds it
+                etag = names.get(b"etag", b"")
+                if etag and (etag[:-1] + suffix).decode("latin-1") in if_none_match:
+                    response_headers = tag_encoding(response_headers)
+            elif (len(body) >= self.minimum_size and b"content-encoding" not in names
+                    and not content_type.startswith(SKIP_TYPES)):
+                body = compress(body, encoding)
+                response_headers = [(k, v) for k, v in tag_encoding(response_headers) if k != b"content-length"]
+                response_headers += [
+                    (b"content-encoding", encoding.encode()),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"vary", b"Accept-Encoding"),
+                ]
+            await send({**start, "headers": response_headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
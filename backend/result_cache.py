@@ -0,0 +1,107 @@
+"""
+Whole-strategy result cache.
+
+Advice is acreage-independent and crop_data is a proportional split, so a finished strategy
+is stored as allocation fractions plus advice and telemetry. A hit is rescaled to the requested
+acreage with rescale_allocation. Keys combine the normalised postcode (or its outward-code
+district), today's date, the telemetry version and the anomaly mode. Fresh entries are served
+as-is; stale ones are served immediately while one background run refreshes them.
+
+A served entry carries a strong ETag built from the key, the entry's content hash, the
+requested postcode and acreage, and the cache state. Those fix every byte of the response.
+
+Only responses built from Claude's answer are cached, never the rule-based fallback.
+
+Environment:
+    RESULT_CACHE_SCOPE    "postcode" (default) or "district"
+    RESULT_CACHE_FRESH_S  seconds an entry is fresh (default 21600)
+    RESULT_CACHE_STALE_S  further seconds it may be served stale (default 64800)
+"""
+import hashlib
+import json
+import os
+from datetime import date
+
+from anomaly_modes import DEFAULT_ANOMALY_MODE
+from cache import FRESH, get_cache
+
+RESULT_CACHE_SCOPE = os.getenv("RESULT_CACHE_SCOPE", "postcode")
+RESULT_CACHE_FRESH_S = float(os.getenv("RESULT_CACHE_FRESH_S", "21600"))
+RESULT_CACHE_STALE_S = float(os.getenv("RESULT_CACHE_STALE_S", "64800"))
+
+results = get_cache("strategy_results", fresh_s=RESULT_CACHE_FRESH_S, stale_s=RESULT_CACHE_STALE_S)
+
+
+def normalise_postcode(postcode):
+    return postcode.replace(" ", "").upper()
+
+
+def outward_code(postcode):
+    """District part of a UK postcode ("SW1A 1AA" -> "SW1A")."""
+    compact = normalise_postcode(postcode)
+    return compact[:-3] if len(compact) > 4 else compact
+
+
+def telemetry_version():
+    from agent import TELEMETRY_VERSION
+    from hybrid_predictor import get_predictor
+
+    return f"{TELEMETRY_VERSION}:{get_predictor().bundle.version or 'loose'}"
+
+
+def cache_key(postcode, anomaly_mode=None, scope=None):
+    scope = scope or RESULT_CACHE_SCOPE
+    place = outward_code(postcode) if scope == "district" else normalise_postcode(postcode)
+    return f"{scope}:{place}|{date.today().isoformat()}|{telemetry_version()}|{anomaly_mode or DEFAULT_ANOMALY_MODE}"
+
+
+def store(key, response):
+    """Cache a getCrops response as acreage-independent fractions."""
+    crop_data = response["crop_data"]
+    total = sum(crop_data.values())
+    if total <= 0:
+        return
+    metadata = response.get("metadata", {})
+    entry = {
+        "fractions": {crop: acres / total for crop, acres in crop_data.items()},
+        "advice": response["advice"],
+        "ml_telemetry": metadata.get("ml_telemetry"),
+        "telemetry_source": metadata.get("telemetry_source"),
+        "coordinates": metadata.get("coordinates"),
+    }
+    entry["version"] = hashlib.sha1(json.dumps(entry, sort_keys=True, default=float).encode()).hexdigest()[:16]
+    results.set(key, entry)
+
+
+def etag(key, entry, state, postcode, acreage):
+    parts = f"{key}|{entry['version']}|{state}|{postcode}|{acreage!r}"
+    return '"' + hashlib.sha1(parts.encode()).hexdigest() + '"'
+
+
+def current_etag(key, postcode, acreage):
+    """ETag a request would be served right now if the entry is fresh, else None."""
+    entry, state, _ = results.peek(key)
+    return etag(key, entry, state, postcode, acreage) if state == FRESH else None
+
+
+def lookup(key, postcode, acreage):
+    """(response rescaled to `acreage`, state, age_s) or (None, "miss", None)."""
+    from agent import rescale_allocation
+
+    entry, state, age = results.get(key)
+    if entry is None:
+        return None, state, None
+    response = {
+        "crop_data": rescale_allocation(entry["fractions"], acreage),
+        "advice": entry["advice"],
+        "metadata": {
+            "postcode": postcode,
+            "total_acres": acreage,
+            "ml_telemetry": entry["ml_telemetry"],
+            # Absent from entries stored by older versions
+            "telemetry_source": entry.get("telemetry_source"),
+            "coordinates": entry["coordinates"],
+            "cache": {"status": state, "etag": etag(key, entry, state, postcode, acreage)},
+        },
+    }
+    return response, state, age
@@ -1,11 +1,93 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from agent import Agent
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from CropRequest import CropPrediction
+from anomaly_modes import ANOMALY_MODE_NAMES
+from downsample import lttb
+import warmup
+import metrics
+import jobs
+import profiling
+import responses
+import breaker
+from executor import BoundedExecutor, DeadlineExceeded, Overloaded
+import hashlib
+import time
 import json
-import traceback
+import os
+import uuid
+from log_setup import configure_logging, get_logger, request_id
 
-app = FastAPI(title="Agricultural Strategy API")
+configure_logging()
+logger = get_logger(__name__)
+
+# The request-path modules (agent -> anthropic, xgboost, pgeocode, yfinance, ...) are imported
+# lazily; warm-up loads them and the models in the background so /ready gates traffic.
+
+# getCrops blocks for seconds, so it runs on a bounded pool instead of the event loop.
+# Beyond PREDICT_WORKERS running + PREDICT_QUEUE_LIMIT waiting, requests get 429; one that
+# has not finished after PREDICT_DEADLINE_S gets 503.
+PREDICT_DEADLINE_S = float(os.getenv("PREDICT_DEADLINE_S", "90"))
+predict_executor = BoundedExecutor(
+    "predict",
+    workers=int(os.getenv("PREDICT_WORKERS", "4")),
+    queue_limit=int(os.getenv("PREDICT_QUEUE_LIMIT", "16")),
+)
+# Stale-while-revalidate refreshes of cached strategies get their own small pool, so they
+# never hold predict workers; when it is full the refresh is skipped and a later hit retries
+refresh_executor = BoundedExecutor(
+    "refresh",
+    workers=int(os.getenv("REFRESH_WORKERS", "2")),
+    queue_limit=int(os.getenv("REFRESH_QUEUE_LIMIT", "4")),
+)
+
+
+async def _warm_up():
+    # Retried until it succeeds (a transient failure, e.g. pgeocode's first download, must not
+    # leave /ready at 503 for the life of the process)
+    delay = warmup.WARMUP_RETRY_S
+    while not await run_in_threadpool(warmup.warm_up):
+        logger.warning("Warm-up failed, retrying in %.0fs", delay, extra={"error": warmup.STATE["error"]})
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, warmup.WARMUP_MAX_BACKOFF_S)
+
+
+async def _maintain_jobs():
+    # Heartbeat this process's jobs, release orphaned ones and adopt them. Not run under
+    # prefork.py, whose master and job runner look after every job.
+    last_cleanup = None
+    # A failed round (e.g. jobs.db locked past busy_timeout) must not end the loop: without
+    # heartbeats this process's running jobs would be released and run a second time
+    while True:
+        try:
+            await run_in_threadpool(jobs.maintain)
+            if last_cleanup is None or time.monotonic() - last_cleanup >= jobs.CLEANUP_INTERVAL_S:
+                await run_in_threadpool(jobs.cleanup)
+                last_cleanup = time.monotonic()
+        except Exception:
+            logger.exception("Job upkeep failed")
+        await asyncio.sleep(jobs.JOB_HEARTBEAT_S)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # prefork.py warms up before forking; its workers inherit the loaded models
+    task = None if warmup.STATE["ready"] else asyncio.create_task(_warm_up())
+    job_task = None if jobs.shared_runner() else asyncio.create_task(_maintain_jobs())
+    yield
+    for t in (task, job_task):
+        if t is not None:
+            t.cancel()
+    predict_executor.shutdown()
+    refresh_executor.shutdown()
+    jobs.shutdown()
+
+
+app = FastAPI(title="Agricultural Strategy API", lifespan=lifespan,
+              default_response_class=responses.FastJSONResponse)
 
 # Add CORS middleware for frontend integration
 app.add_middleware(
@@ -16,6 +98,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Starlette runs the last-registered middleware first: compression goes in before the
+# latency hook below so that the recorded latency includes it
+app.add_middleware(responses.CompressionMiddleware)
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    # Correlate every log line of this request; honour an ID set by the caller or proxy
+    rid = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = request_id.set(rid)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = rid
+        return response
+    finally:
+        request_id.reset(token)
+        # Label by route template, not raw path, to keep label cardinality bounded
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            path=route.path if route else "unmatched",
+            status=status,
+        )
+
 
 @app.get("/")
 async def status():
@@ -43,12 +153,144 @@ async def health_check():
             "extreme_weather": "active",
             "soil_analysis": "active",
             "market_futures": "active"
-        }
+        },
+        # Circuit breaker per upstream service (this worker's view)
+        "upstreams": breaker.states(),
     }
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until models and caches have been preloaded."""
+    body = {k: warmup.STATE[k] for k in ("ready", "duration_s", "steps", "error", "attempts")}
+    return JSONResponse(body, status_code=200 if warmup.STATE["ready"] else 503)
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint: stage latencies, upstream calls, cache hits, LLM tokens."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+def _require_admin(token):
+    if not profiling.is_admin(token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@app.get("/profiles")
+async def list_profiles(x_admin_token: str = Header(None)):
+    """Saved request profiles, newest first (admin only)."""
+    _require_admin(x_admin_token)
+    return {"profiles": profiling.list_profiles()}
+
+
+@app.get("/profiles/{name}")
+async def download_profile(name: str, x_admin_token: str = Header(None)):
+    """Download a .speedscope.json or .folded profile (admin only)."""
+    _require_admin(x_admin_token)
+    path = profiling.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "application/json" if name.endswith(".json") else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=name)
+
+
+@app.get("/market/history")
+def market_history(
+    request: Request,
+    points: int = Query(300, ge=3, le=5000, description="Maximum points per crop series"),
+    crops: str = Query(None, description="Comma-separated crop names (default: all)"),
+    period: str = Query("5y", pattern="^(1y|2y|5y)$"),
+):
+    """
+    Daily close-price history per crop, LTTB-downsampled to `points` for the price_trend charts.
+
+    Every period is cut from the cached 5y history that MarketModel keeps for forward prices,
+    so it adds no Yahoo traffic. Responses carry an ETag; send it back in If-None-Match to get a 304.
+    """
+    import pandas as pd
+    from marketPrediction import MarketModel
+    from marketSubAgent import TICKER_DICT
+
+    close_prices = MarketModel(TICKER_DICT).get_close_prices()
+    since = close_prices.index[-1] - pd.DateOffset(years=int(period[0]))
+    close_prices = close_prices[close_prices.index > since]
+
+    selected = list(close_prices.columns)
+    if crops:
+        selected = [c.strip() for c in crops.split(",") if c.strip()]
+        unknown = [c for c in selected if c not in close_prices.columns]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown crops: {unknown}")
+
+    as_of = str(close_prices.index[-1].date())
+    etag = '"' + hashlib.sha1(f"{period}|{as_of}|{points}|{','.join(selected)}".encode()).hexdigest() + '"'
+    cache_headers = {"ETag": etag, "Cache-Control": "public, max-age=3600"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=cache_headers)
+
+    series = {}
+    for crop in selected:
+        prices = close_prices[crop].dropna()
+        idx = lttb(prices.index.asi8, prices.to_numpy(), points)
+        series[crop] = {
+            "dates": [d.strftime("%Y-%m-%d") for d in prices.index[idx]],
+            "price_trend": [round(float(v), 2) for v in prices.to_numpy()[idx]],
+        }
+
+    body = responses.dumps({"as_of": as_of, "period": period, "points": points, "crops": series})
+    return Response(content=body, media_type="application/json", headers=cache_headers)
+
+
+def _validate_prediction(request: CropPrediction):
+    if request.acreage <= 0:
+        raise HTTPException(status_code=400, detail="Acreage must be positive")
+
+    if not request.postcode:
+        raise HTTPException(status_code=400, detail="Postcode is required")
+
+    if request.anomaly_mode and request.anomaly_mode not in ANOMALY_MODE_NAMES:
+        raise HTTPException(status_code=400, detail=f"anomaly_mode must be one of {list(ANOMALY_MODE_NAMES)}")
+
+
+@app.post("/jobs/predict-crops", status_code=202)
+async def submit_prediction_job(request: CropPrediction, response: Response):
+    """
+    Queue a /predict-crops run and return its job ID immediately.
+
+    An identical job that is still pending or running is returned instead of a new one
+    ("deduplicated": true). Poll GET /jobs/{id} for the result.
+    """
+    _validate_prediction(request)
+    try:
+        job, created = await run_in_threadpool(jobs.submit, request.postcode, request.acreage, request.anomaly_mode)
+    except jobs.QueueFull:
+        raise HTTPException(status_code=429, detail="Too many queued jobs", headers={"Retry-After": "30"})
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return {"id": job.id, "status": job.status, "deduplicated": not created}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = Query(0, ge=0, le=60, description="Long-poll up to this many seconds")):
+    """Job status, plus `result` once done or `error` once failed."""
+    deadline = time.monotonic() + wait
+    while True:
+        job = await run_in_threadpool(jobs.get_job, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job["status"] in jobs.FINISHED or time.monotonic() >= deadline:
+            return job
+        await asyncio.sleep(0.5)
+
+
 @app.post("/predict-crops")
-async def predict_crops(request: CropPrediction):
+async def predict_crops(
+    request: CropPrediction,
+    timings: bool = False,
+    profile: bool = False,
+    x_profile: str = Header(None),
+    x_admin_token: str = Header(None),
+):
     """
     Main endpoint that receives postcode and acreage, then returns 
     structured crop allocation and farming advice based on:
@@ -74,25 +316,79 @@ async def predict_crops(request: CropPrediction):
         "metadata": {
             "postcode": "SE11 5HS",
             "total_acres": 13.2,
-            "ml_telemetry": {...}
+            "ml_telemetry": {...},
+            "timings": {"weather": 3.1, "llm": 6.4, ...}   # only with ?timings=true
         }
     }
+
+    Admins can profile a request with ?profile=true or `X-Profile: 1` plus `X-Admin-Token`;
+    the flamegraphs are listed under /profiles.
+
+    Responds 429 when the worker queue is full and 503 when the request did not finish within its
+    deadline, both with a Retry-After header.
+
+    Strategies served from the result cache carry a strong ETag; revalidate with
+    GET /predict-crops and If-None-Match.
     """
+    return await _predict(request, timings, profile, x_profile, x_admin_token)
+
+
+@app.get("/predict-crops")
+async def predict_crops_get(
+    postcode: str,
+    acreage: float,
+    anomaly_mode: str = None,
+    timings: bool = False,
+    profile: bool = False,
+    x_profile: str = Header(None),
+    x_admin_token: str = Header(None),
+    if_none_match: str = Header(None),
+):
+    """Same as POST /predict-crops, with the request in the query string so it can be revalidated (304)."""
+    request = CropPrediction(postcode=postcode, acreage=acreage, anomaly_mode=anomaly_mode)
+    return await _predict(request, timings, profile, x_profile, x_admin_token, if_none_match)
+
+
+def _fresh_strategy_etag(request):
+    import result_cache
+
     try:
-        # Validate inputs
-        if request.acreage <= 0:
-            raise HTTPException(status_code=400, detail="Acreage must be positive")
-        
-        if not request.postcode:
-            raise HTTPException(status_code=400, detail="Postcode is required")
+        key = result_cache.cache_key(request.postcode, request.anomaly_mode)
+    except Exception:
+        return None
+    return result_cache.current_etag(key, request.postcode, request.acreage)
+
+
+async def _predict(request, timings, profile, x_profile, x_admin_token, if_none_match=None):
+    try:
+        _validate_prediction(request)
+
+        # Bodies with timings differ on every call, so only plain requests are revalidated
+        if if_none_match and not timings:
+            etag = await run_in_threadpool(_fresh_strategy_etag, request)
+            if etag and etag in [t.strip() for t in if_none_match.split(",")]:
+                return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
         
         # Call the main logic function
-        result = getCrops(request.postcode, request.acreage)
+        profiled = profiling.should_profile(profile or x_profile == "1", x_admin_token)
+        try:
+            result = await predict_executor.run(_profiled_get_crops, request, timings, profiled,
+                                                deadline=PREDICT_DEADLINE_S)
+        except Overloaded as e:
+            raise HTTPException(status_code=429, detail="Server busy, retry later",
+                                headers={"Retry-After": str(e.retry_after)})
+        except DeadlineExceeded as e:
+            raise HTTPException(status_code=503, detail="Request deadline exceeded",
+                                headers={"Retry-After": str(e.retry_after)})
         
         if "error" in result:
             raise HTTPException(status_code=500, detail=result)
-        
-        return result
+
+        headers = {"Cache-Control": "no-cache"}
+        etag = result.get("metadata", {}).get("cache", {}).get("etag")
+        if etag and not timings:
+            headers["ETag"] = etag
+        return responses.FastJSONResponse(result, headers=headers)
         
     except HTTPException:
         raise
@@ -103,56 +399,122 @@ async def predict_crops(request: CropPrediction):
         )
 
 
-def getCrops(postcode: str, acreage: float):
+def _profiled_get_crops(request, timings, profiled):
+    # The sampler watches the calling thread, so it has to start on the worker
+    with profiling.maybe_profile(profiled, label=request.postcode):
+        return getCrops(request.postcode, request.acreage, request.anomaly_mode, timings=timings)
+
+
+def getCrops(postcode: str, acreage: float, anomaly_mode: str = None, timings: bool = False,
+             use_cache: bool = True):
     """
     Core business logic that orchestrates all ML models and generates recommendations.
     
     Args:
         postcode: UK postcode for location
         acreage: Total farmable acres
+        anomaly_mode: Weather anomaly estimator ("xgboost" or "climatology")
+        timings: Include per-stage seconds in metadata['timings']
+        use_cache: Serve and store the day's strategy in the result cache
         
     Returns:
         dict: Structured response with crop allocation and advice
     """
+    import result_cache
+    from cache import STALE
+
+    start = time.perf_counter()
+    key = None
+    if use_cache:
+        try:
+            key = result_cache.cache_key(postcode, anomaly_mode)
+        except Exception as e:
+            logger.warning("Result cache unavailable: %s", e)
+
+    if key is not None:
+        cached, state, age = result_cache.lookup(key, postcode, acreage)
+        if cached is not None:
+            if state == STALE and result_cache.results.claim_refresh(key):
+                _refresh_in_background(key, postcode, acreage, anomaly_mode)
+            if timings:
+                cached['metadata']['timings'] = {'total': round(time.perf_counter() - start, 4)}
+            logger.info("Served cached strategy for %s", postcode, extra={"cache": state, "age_s": round(age, 1)})
+            return cached
+
+    return _run_pipeline(postcode, acreage, anomaly_mode, timings, key)
+
+
+def _refresh_in_background(key, postcode, acreage, anomaly_mode):
+    import result_cache
+
+    def refresh():
+        try:
+            _run_pipeline(postcode, acreage, anomaly_mode, False, key)
+        except Exception:
+            logger.exception("Background refresh failed for %s", postcode)
+        finally:
+            # No-op if the run stored a new entry; otherwise lets a later request retry
+            result_cache.results.release_refresh(key)
+
     try:
-        print(f"\n{'='*60}")
-        print(f"Processing request for {postcode} - {acreage} acres")
-        print(f"{'='*60}\n")
+        refresh_executor.submit(refresh)
+    except Overloaded:
+        logger.info("Refresh pool full, serving %s stale without refreshing", postcode)
+        result_cache.results.release_refresh(key)
+
+
+def _run_pipeline(postcode, acreage, anomaly_mode, timings, cache_key):
+    from agent import Agent
+    import result_cache
+
+    # Stage timers inside the pipeline report into stage_timings as well as /metrics
+    with metrics.collect_timings() as stage_timings:
+        start = time.perf_counter()
+        try:
+            logger.info("Processing request for %s - %s acres", postcode, acreage)
         
-        # Initialize agent (this triggers all ML model runs)
-        agent = Agent(postcode, acreage)
+            # Initialize agent (this triggers all ML model runs)
+            agent = Agent(postcode, acreage, anomaly_mode=anomaly_mode)
         
-        # Generate AI-powered response
-        print("\nGenerating AI recommendations...")
-        final_response = agent.generate_response()
+            # Generate AI-powered response
+            final_response = agent.generate_response()
         
-        # Add metadata for frontend
-        final_response['metadata'] = {
-            'postcode': postcode,
-            'total_acres': acreage,
-            'ml_telemetry': agent.ml_telemetry,
-            'coordinates': {
-                'latitude': agent.weatherAgent.lat,
-                'longitude': agent.weatherAgent.long
+            # Add metadata for frontend
+            final_response['metadata'] = {
+                'postcode': postcode,
+                'total_acres': acreage,
+                'ml_telemetry': agent.ml_telemetry,
+                'telemetry_source': agent.telemetry_source,
+                'coordinates': {
+                    'latitude': agent.lat,
+                    'longitude': agent.long
+                }
             }
-        }
-        
-        # Verification
-        print("\nSuccessfully generated agricultural strategy")
-        print(f"Crops allocated: {list(final_response.get('crop_data', {}).keys())}")
-        print(f"Advice categories: {list(final_response.get('advice', {}).keys())}")
+
+            # Rule-based fallbacks and answers from stale inputs are not worth pinning for the rest of the day
+            if cache_key is not None and agent.response_source == "llm" and not agent.stale:
+                result_cache.store(cache_key, final_response)
+
+            if timings:
+                final_response['metadata']['timings'] = {
+                    **stage_timings,
+                    'total': round(time.perf_counter() - start, 4)
+                }
+
+            # Verification
+            logger.info("Generated agricultural strategy",
+                        extra={"crops": len(final_response.get('crop_data', {})),
+                               "advice_categories": list(final_response.get('advice', {}).keys())})
         
-        return final_response
+            return final_response
         
-    except Exception as e:
-        print(f"\nError during agent generation: {e}")
-        traceback.print_exc()
+        except Exception as e:
+            logger.exception("Error during agent generation")
         
-        return {
-            "error": "Failed to generate agricultural strategy",
-            "details": str(e)
-        }
-
+            return {
+                "error": "Failed to generate agricultural strategy",
+                "details": str(e)
+            }
 
 if __name__ == "__main__":
     print("\n" + "="*60)
@@ -1,42 +1,94 @@
+import copy
+import os
 import requests
 import time
+import breaker
+import metrics
+from cache import FRESH, get_cache
+from log_setup import get_logger
 from uklookup import lookup_postcode_lat_long
 
-def get_soil_texture(lon, lat, depth="0-5cm"):
-    """Query SoilGrids for soil texture components"""
-    base_url = "https://rest.isric.org/soilgrids/v2.0/properties/query"
+logger = get_logger(__name__)
+
+SOILGRIDS_URL = os.getenv("SOILGRIDS_URL", "https://rest.isric.org/soilgrids/v2.0/properties/query")
+SOILGRIDS_TIMEOUT_S = float(os.getenv("SOILGRIDS_TIMEOUT_S", "15"))
+
+# Standard SoilGrids layers down to 60cm; one query returns them all
+PROFILE_DEPTHS = ["0-5cm", "5-15cm", "15-30cm", "30-60cm"]
+ROOT_ZONE = "0-60cm"
+
+# Soil barely changes, so a profile is kept for a month (keyed by point rounded to ~10m), and
+# for up to a year more it is still served, marked stale, while SoilGrids is unavailable
+SOIL_CACHE_TTL_S = float(os.getenv("SOIL_CACHE_TTL_S", str(30 * 24 * 3600)))
+SOIL_LAST_GOOD_S = float(os.getenv("SOIL_LAST_GOOD_S", str(365 * 24 * 3600)))
+profiles = get_cache("soil_profiles", fresh_s=SOIL_CACHE_TTL_S, stale_s=SOIL_LAST_GOOD_S, max_entries=20000)
+
+
+def depth_thickness(depth):
+    top, bottom = depth.rstrip("cm").split("-")
+    return float(bottom) - float(top)
+
+
+def get_soil_profile(lon, lat, depths=PROFILE_DEPTHS):
+    """Clay/sand/silt percentages for every requested depth in one SoilGrids query.
+
+    Returns {depth: {'clay': .., 'sand': .., 'silt': ..}} for the depths with data, or None.
+    Raises breaker.CircuitOpen while SoilGrids' circuit is open, and on 5xx/429 responses,
+    so a failing service ends the probe spiral instead of using up every attempt.
+    """
+    base_url = SOILGRIDS_URL
 
     params = {
         'lon': lon,
         'lat': lat,
         'property': ['clay', 'sand', 'silt'],
-        'depth': depth,
+        'depth': list(depths),
         'value': 'mean'
     }
 
-    response = requests.get(base_url, params=params)
+    breaker.check("soilgrids")
+    start = time.perf_counter()
+    try:
+        response = requests.get(base_url, params=params, timeout=SOILGRIDS_TIMEOUT_S)
+    except Exception:
+        breaker.record("soilgrids", time.perf_counter() - start, ok=False)
+        raise
+    breaker.record("soilgrids", time.perf_counter() - start, ok=response.status_code == 200)
+
+    if response.status_code != 200:
+        if response.status_code >= 500 or response.status_code == 429:
+            response.raise_for_status()
+        return None
 
-    if response.status_code == 200:
-        data = response.json()
-        properties = data['properties']['layers']
+    layers = {depth: {} for depth in depths}
+    for prop in response.json()['properties']['layers']:
+        for i, layer in enumerate(prop['depths']):
+            depth = layer.get('label') or (depths[i] if i < len(depths) else None)
+            if depth not in layers:
+                continue
+            mean_val = layer['values']['mean']
+            layers[depth][prop['name']] = mean_val / 10 if mean_val is not None else None
 
-        result = {}
-        has_data = False
+    profile = {depth: values for depth, values in layers.items()
+               if values and all(values.get(name) is not None for name in ('clay', 'sand', 'silt'))}
+    return profile or None
 
-        for prop in properties:
-            name = prop['name']
-            mean_val = prop['depths'][0]['values']['mean']
 
-            if mean_val is not None:
-                value = mean_val / 10
-                result[name] = value
-                has_data = True
-            else:
-                result[name] = None
+def get_soil_texture(lon, lat, depth="0-5cm"):
+    """Query SoilGrids for soil texture components"""
+    profile = get_soil_profile(lon, lat, [depth])
+    return profile.get(depth) if profile else None
+
+
+def root_zone_texture(profile):
+    """Thickness-weighted clay/sand/silt over the layers present (0-60cm when complete)."""
+    weights = {depth: depth_thickness(depth) for depth in profile}
+    total = sum(weights.values())
+    return {
+        name: round(sum(profile[depth][name] * w for depth, w in weights.items()) / total, 1)
+        for name in ('clay', 'sand', 'silt')
+    }
 
-        return result if has_data else None
-    else:
-        return None
 
 def classify_soil_texture(clay, sand, silt):
     """
@@ -177,6 +229,10 @@ def get_soil_properties(texture_class):
         "description": "No data available"
     })
 
+def _query_depths(depth):
+    return PROFILE_DEPTHS if depth in PROFILE_DEPTHS else [depth] + PROFILE_DEPTHS
+
+
 def get_soil_texture_with_fallback(lon, lat, depth="0-5cm", max_attempts=10, initial_radius=0.005, radius_multiplier=1.5):
     """
     Try to get soil data, expanding search radius if initial location has no data
@@ -220,17 +276,18 @@ def get_soil_texture_with_fallback(lon, lat, depth="0-5cm", max_attempts=10, ini
             # Calculate approximate distance in km
             distance_km = ((lon_offset**2 + lat_offset**2)**0.5) * 111
 
-            print(f"Attempt {attempt+1}/{max_attempts}: Radius ~{distance_km:.1f}km, coords ({test_lon:.4f}, {test_lat:.4f})")
+            logger.debug("Soil probe %d/%d: radius ~%.1fkm, coords (%.4f, %.4f)",
+                         attempt + 1, max_attempts, distance_km, test_lon, test_lat)
 
-            result = get_soil_texture(test_lon, test_lat, depth)
+            profile = get_soil_profile(test_lon, test_lat, _query_depths(depth))
+            result = profile.get(depth) if profile else None
 
             if result is not None:
-                if attempt > 0:
-                    print(f"[OK] Found data ~{distance_km:.1f}km away from original location")
-                else:
-                    print(f"[OK] Found data at original location")
+                logger.info("Found soil data ~%.1fkm from the original location after %d probes",
+                            distance_km, attempt + 1)
                 return {
                     'soil_data': result,
+                    'profile': profile,
                     'actual_lon': test_lon,
                     'actual_lat': test_lat,
                     'offset_from_original': attempt > 0,
@@ -242,9 +299,9 @@ def get_soil_texture_with_fallback(lon, lat, depth="0-5cm", max_attempts=10, ini
 
         # Expand search radius for next iteration
         radius *= radius_multiplier
-        print(f"[INFO] Expanding search radius to ~{radius*111:.1f}km")
+        logger.debug("Expanding soil search radius to ~%.1fkm", radius * 111)
 
-    print("[ERROR] No soil data found in surrounding area")
+    logger.warning("No soil data found in surrounding area after %d probes", max_attempts)
     return None
 
 def get_soil_from_postcode(postcode, depth="0-5cm", max_attempts=10, initial_radius=0.005, radius_multiplier=1.5):
@@ -258,30 +315,61 @@ def get_soil_from_postcode(postcode, depth="0-5cm", max_attempts=10, initial_rad
         initial_radius: Starting search radius in degrees (~0.005 = 500m)
         radius_multiplier: Factor to expand radius on each failure (e.g., 1.5 = 50% larger)
     """
-    print(f"Looking up postcode: {postcode}")
+    logger.debug("Looking up postcode: %s", postcode)
 
     # Convert postcode to lat/long using uklookup
     try:
-        location_data = lookup_postcode_lat_long(postcode)
+        with metrics.stage("soil.geocode"):
+            location_data = lookup_postcode_lat_long(postcode)
 
         if location_data is None:
-            print(f"[ERROR] Could not find coordinates for postcode: {postcode}")
+            logger.warning("Could not find coordinates for postcode: %s", postcode)
             return None
 
         lat = location_data[0]
         lon = location_data[1]
 
-        print(f"[INFO] Coordinates: {lat:.4f}, {lon:.4f}")
+        logger.debug("Coordinates: %.4f, %.4f", lat, lon)
 
     except Exception as e:
-        print(f"[ERROR] Error looking up postcode: {e}")
+        logger.warning("Error looking up postcode %s: %s", postcode, e)
         return None
 
+    result = get_soil_at(lat, lon, depth, max_attempts, initial_radius, radius_multiplier)
+    if result:
+        result['postcode'] = postcode
+
+    return result
+
+def classify_layer(depth, texture):
+    texture_class = classify_soil_texture(texture['clay'], texture['sand'], texture['silt'])
+    return {'depth': depth, **texture, 'texture_class': texture_class}
+
+
+def get_soil_at(lat, lon, depth="0-5cm", max_attempts=10, initial_radius=0.005, radius_multiplier=1.5):
+    """Soil texture and its classified properties at a point (see get_soil_from_postcode)
+
+    Also returns every profile layer classified ('layers') and a thickness-weighted
+    'root_zone'. The whole record is cached per point, so repeat lookups skip the probe spiral.
+    A record older than SOIL_CACHE_TTL_S is refetched; if SoilGrids fails, it is returned
+    with 'stale_age_s' set instead.
+    """
+    key = f"{lat:.4f},{lon:.4f}|{depth}"
+    cached, state, age = profiles.get(key)
+    if state == FRESH:
+        return copy.deepcopy(cached)
+
     # Get soil data with fallback
-    result = get_soil_texture_with_fallback(lon, lat, depth, max_attempts, initial_radius, radius_multiplier)
+    try:
+        with metrics.stage("soil.probe"):
+            result = get_soil_texture_with_fallback(lon, lat, depth, max_attempts, initial_radius, radius_multiplier)
+    except Exception as e:
+        if cached is None:
+            raise
+        logger.warning("SoilGrids unavailable (%s), using the profile cached %.0f days ago", e, age / 86400)
+        return {**copy.deepcopy(cached), 'stale_age_s': age}
 
     if result:
-        result['postcode'] = postcode
         result['original_lon'] = lon
         result['original_lat'] = lat
 
@@ -295,6 +383,14 @@ def get_soil_from_postcode(postcode, depth="0-5cm", max_attempts=10, initial_rad
         result['texture_class'] = texture_class
         result['properties'] = get_soil_properties(texture_class)
 
+        profile = result.pop('profile')
+        result['layers'] = [classify_layer(d, profile[d]) for d in PROFILE_DEPTHS if d in profile]
+        root_zone = root_zone_texture({d: profile[d] for d in PROFILE_DEPTHS if d in profile} or {depth: soil_data})
+        root_zone.update(classify_layer(ROOT_ZONE, root_zone))
+        root_zone['properties'] = get_soil_properties(root_zone['texture_class'])
+        result['root_zone'] = root_zone
+        profiles.set(key, copy.deepcopy(result))
+
     return result
 
 # Test with different postcodes
@@ -0,0 +1,213 @@
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from hybrid_predictor import ImprovedHybridPredictor, EXTREME_VARS, LAGS, risk_label
+
+# Variables tracked with per-hour-of-day baselines for the anomaly score
+ANOMALY_VARS = ['temperature_2m', 'precipitation', 'soil_temperature_0cm', 'wind_speed_10m',
+                'cloud_cover', 'precipitation_probability', 'soil_moisture_0_to_7cm', 'wind_gusts_10m']
+
+# Used for the extreme-weather model when a feed does not carry a variable (same as Agent)
+EXTREME_DEFAULTS = {'temperature_2m': 15.0, 'precipitation': 0.0, 'soil_moisture_0_to_7cm': 0.3, 'wind_gusts_10m': 10.0}
+
+
+class RingBuffer:
+    """Fixed-size float buffer with O(1) push, k-steps-back lookup and a running mean."""
+
+    def __init__(self, size):
+        self.values = np.full(size, np.nan)
+        self.size = size
+        self.pos = 0
+        self.count = 0
+        self.total = 0.0
+        self.valid = 0
+
+    def push(self, value):
+        value = np.nan if value is None else float(value)
+        old = self.values[self.pos]
+        if not math.isnan(old):
+            self.total -= old
+            self.valid -= 1
+        if not math.isnan(value):
+            self.total += value
+            self.valid += 1
+        self.values[self.pos] = value
+        self.pos = (self.pos + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def ago(self, k):
+        """Value pushed k steps before the latest one (k=0 is the latest), NaN if not seen yet."""
+        if k >= self.count:
+            return np.nan
+        return self.values[(self.pos - 1 - k) % self.size]
+
+    def mean(self):
+        return self.total / self.valid if self.valid else np.nan
+
+
+class HourlyBaseline:
+    """Exponentially weighted mean/variance per hour of day, updated in O(1)."""
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.mean = np.zeros(24)
+        self.var = np.zeros(24)
+        self.seen = np.zeros(24, dtype=int)
+
+    def score_and_update(self, hour, value):
+        """Return the z-score of `value` against the baseline for `hour`, then fold it in."""
+        if math.isnan(value):
+            return np.nan, 0
+        seen = self.seen[hour]
+        if seen == 0:
+            z = np.nan
+            self.mean[hour] = value
+        else:
+            std = math.sqrt(self.var[hour])
+            z = (value - self.mean[hour]) / (std + 1e-6) if std > 0 else 0.0
+            diff = value - self.mean[hour]
+            incr = self.alpha * diff
+            self.mean[hour] += incr
+            self.var[hour] = (1 - self.alpha) * (self.var[hour] + diff * incr)
+        self.seen[hour] = seen + 1
+        return z, seen
+
+
+class LocationState:
+    def __init__(self, lat, lon, region, alpha):
+        self.lat = lat
+        self.lon = lon
+        self.region = region
+        self.last_time = None
+        # One slot more than the longest lag so ago(72) is available
+        self.history = {v: RingBuffer(max(LAGS) + 1) for v in EXTREME_VARS}
+        self.temperature = RingBuffer(2)
+        self.precip_24h = RingBuffer(24)
+        self.baselines = {v: HourlyBaseline(alpha) for v in ANOMALY_VARS}
+
+    def advance(self, timestamp, obs):
+        """Push one hourly observation, back-filling skipped hours with NaN so lags stay aligned."""
+        if self.last_time is not None:
+            gap = int((timestamp - self.last_time) / timedelta(hours=1)) - 1
+            for _ in range(min(max(gap, 0), max(LAGS) + 1)):
+                for buf in self.history.values():
+                    buf.push(None)
+                self.temperature.push(None)
+                self.precip_24h.push(None)
+        self.last_time = timestamp
+
+        for v, buf in self.history.items():
+            buf.push(obs.get(v))
+        self.temperature.push(obs.get('temperature_2m'))
+        self.precip_24h.push(obs.get('precipitation'))
+
+
+class StreamingScorer:
+    """
+    Incremental anomaly + extreme-weather scoring for many locations.
+
+    Feed hourly observations one at a time per location; every update costs O(1) in the
+    length of the history. `update_many` batches the extreme-weather model call per region.
+    """
+
+    def __init__(self, predictor=None, alpha=0.05, z_threshold=3.0, min_samples=7):
+        self.predictor = predictor or ImprovedHybridPredictor()
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        # Baseline observations per hour of day before an hour can be flagged
+        self.min_samples = min_samples
+        self.locations = {}
+
+    def _state(self, location_id, lat, lon):
+        state = self.locations.get(location_id)
+        if state is None:
+            region = self.predictor.resolve_region(lat, lon)
+            state = LocationState(lat, lon, region, self.alpha)
+            self.locations[location_id] = state
+        return state
+
+    def _ingest(self, location_id, lat, lon, timestamp, obs):
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        state = self._state(location_id, lat, lon)
+        if state.last_time is not None and timestamp <= state.last_time:
+            raise ValueError(f"Out-of-order observation for {location_id}: {timestamp} <= {state.last_time}")
+        state.advance(timestamp, obs)
+
+        # Anomaly score against this location's per-hour baselines
+        z_scores = {}
+        for v, baseline in state.baselines.items():
+            if v not in obs:
+                continue
+            z, seen = baseline.score_and_update(timestamp.hour, np.nan if obs[v] is None else float(obs[v]))
+            if seen >= self.min_samples and not math.isnan(z):
+                z_scores[v] = round(float(z), 2)
+        worst = max(z_scores, key=lambda k: abs(z_scores[k]), default=None)
+
+        # Extreme-weather model input from the ring buffers
+        current = {}
+        lags = {}
+        for v in EXTREME_VARS:
+            value = state.history[v].ago(0)
+            current[v] = EXTREME_DEFAULTS[v] if math.isnan(value) else value
+            for lag in LAGS:
+                lag_val = state.history[v].ago(lag)
+                # Same fallback as ImprovedHybridPredictor.predict when history is short
+                lags[(v, lag)] = current['temperature_2m'] if math.isnan(lag_val) else lag_val
+        row = self.predictor.build_features(state.region, timestamp.month, current, lags)
+
+        result = {
+            'location_id': location_id,
+            'time': timestamp.isoformat(),
+            'region': state.region,
+            'features': {
+                'temp_lag_1h': float(state.temperature.ago(1)),
+                'precip_rolling_24h': float(state.precip_24h.mean()),
+            },
+            'anomaly': {
+                'z_scores': z_scores,
+                'max_variable': worst,
+                'risk_level': 'CRITICAL' if worst and abs(z_scores[worst]) > self.z_threshold else 'STABLE',
+            },
+        }
+        return result, row
+
+    def update(self, location_id, lat, lon, timestamp, obs):
+        """Score one hourly observation for one location."""
+        return self.update_many([(location_id, lat, lon, timestamp, obs)])[0]
+
+    def update_many(self, observations):
+        """
+        Score a batch of (location_id, lat, lon, timestamp, obs) tuples.
+
+        Observations for the same location must be in time order within and across batches.
+        """
+        results = []
+        rows_by_region = {}
+        for location_id, lat, lon, timestamp, obs in observations:
+            result, row = self._ingest(location_id, lat, lon, timestamp, obs)
+            results.append(result)
+            rows_by_region.setdefault(result['region'], []).append((len(results) - 1, row))
+
+        for region, items in rows_by_region.items():
+            probs = self.predictor.predict_proba_batch(region, [row for _, row in items])
+            for (idx, _), prob in zip(items, probs):
+                prob = float(prob)
+                results[idx]['extreme_weather'] = {
+                    'likelihood': str(round(prob * 100, 2)) + "%",
+                    'risk': risk_label(prob),
+                }
+        return results
+
+
+if __name__ == "__main__":
+    from benchmarks.synthetic import forecast_hourly
+
+    scorer = StreamingScorer()
+    hourly = forecast_hourly(past_days=14, forecast_days=0)
+    for i, t in enumerate(hourly['time']):
+        obs = {k: hourly[k][i] for k in hourly if k != 'time'}
+        out = scorer.update("demo", 52.63, 1.29, t, obs)
+    print(out)
@@ -0,0 +1,96 @@
+"""
+Precomputed per-district telemetry (SQLite via peewee), filled nightly by precompute.py.
+
+One row per (outward-code district, anomaly mode) holding the district centroid and the
+zlib-compressed telemetry JSON. Agent reads it before falling back to live computation.
+
+Environment:
+    TELEMETRY_DB            default data/telemetry.db
+    PRECOMPUTED_TELEMETRY   "0" to always compute telemetry live
+    PRECOMPUTED_MAX_AGE_S   oldest row Agent will use (default 93600, 26h)
+"""
+import json
+import os
+import threading
+import time
+import zlib
+
+from peewee import BlobField, CharField, CompositeKey, FloatField, Model, SqliteDatabase
+
+import metrics
+from result_cache import outward_code
+
+TELEMETRY_DB = os.getenv("TELEMETRY_DB", "data/telemetry.db")
+ENABLED = os.getenv("PRECOMPUTED_TELEMETRY", "1") != "0"
+MAX_AGE_S = float(os.getenv("PRECOMPUTED_MAX_AGE_S", "93600"))
+
+db = SqliteDatabase(None)
+_db_lock = threading.Lock()
+
+
+class DistrictTelemetry(Model):
+    district = CharField()
+    anomaly_mode = CharField()
+    latitude = FloatField()
+    longitude = FloatField()
+    computed_at = FloatField(index=True)
+    telemetry = BlobField()
+
+    class Meta:
+        database = db
+        table_name = "district_telemetry"
+        primary_key = CompositeKey("district", "anomaly_mode")
+
+
+def init_db(path=None):
+    with _db_lock:
+        if db.database is not None:
+            return
+        path = path or TELEMETRY_DB
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        db.init(path, pragmas={"journal_mode": "wal", "busy_timeout": 5000, "synchronous": "normal"})
+        db.create_tables([DistrictTelemetry], safe=True)
+
+
+def save(district, anomaly_mode, latitude, longitude, telemetry):
+    init_db()
+    blob = zlib.compress(json.dumps(telemetry, default=float).encode())
+    DistrictTelemetry.insert(
+        district=district, anomaly_mode=anomaly_mode, latitude=latitude, longitude=longitude,
+        computed_at=time.time(), telemetry=blob,
+    ).on_conflict_replace().execute()
+
+
+def lookup(postcode, anomaly_mode=None, max_age=None):
+    """Fresh precomputed telemetry for the postcode's district, or None."""
+    if not ENABLED or (db.database is None and not os.path.exists(TELEMETRY_DB)):
+        return None
+    from weatherSubAgent import DEFAULT_ANOMALY_MODE
+
+    init_db()
+    max_age = MAX_AGE_S if max_age is None else max_age
+    row = DistrictTelemetry.get_or_none(
+        (DistrictTelemetry.district == outward_code(postcode))
+        & (DistrictTelemetry.anomaly_mode == (anomaly_mode or DEFAULT_ANOMALY_MODE))
+        & (DistrictTelemetry.computed_at >= time.time() - max_age)
+    )
+    metrics.record_cache("district_telemetry", row is not None)
+    if row is None:
+        return None
+    return {
+        "district": row.district,
+        "latitude": row.latitude,
+        "longitude": row.longitude,
+        "computed_at": row.computed_at,
+        "telemetry": json.loads(zlib.decompress(row.telemetry)),
+    }
+
+
+def computed_at(anomaly_mode):
+    """{district: computed_at} for every stored row of one anomaly mode."""
+    init_db()
+    query = (DistrictTelemetry
+             .select(DistrictTelemetry.district, DistrictTelemetry.computed_at)
+             .where(DistrictTelemetry.anomaly_mode == anomaly_mode))
+    return {row.district: row.computed_at for row in query}
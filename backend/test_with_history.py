@@ -1,34 +1,31 @@
 # test_improved.py
+# Same conditions in two seasons. Pass --offline to serve the history lookups from
+# benchmarks/fixtures instead of the Open-Meteo archive.
 
+import sys
+from contextlib import nullcontext
 from datetime import datetime
 
+from hybrid_predictor import ImprovedHybridPredictor
+
 predictor = ImprovedHybridPredictor()
 
-# Same conditions, different seasons
-print("\n🌸 APRIL (should be HIGH/EXTREME):")
-result_april = predictor.predict(
-    latitude=52.63,
-    longitude=1.29,
-    temperature=28.5,
-    precipitation=0.0,
-    soil_moisture=0.15,
-    wind_gusts=45.0,
-    timestamp=datetime(2024, 4, 15)  # April!
-)
-print(f"Likelihood: {result_april['likelihood']*100:.1f}%")
-print(f"Risk: {result_april['risk_level']}")
-print(f"Z-scores: {result_april['z_scores']}")
-
-print("\n☀️ JULY (should be LOW/MODERATE):")
-result_july = predictor.predict(
-    latitude=52.63,
-    longitude=1.29,
-    temperature=28.5,  # Same temp
-    precipitation=0.0,
-    soil_moisture=0.15,
-    wind_gusts=45.0,
-    timestamp=datetime(2024, 7, 15)  # July
-)
-print(f"Likelihood: {result_july['likelihood']*100:.1f}%")
-print(f"Risk: {result_july['risk_level']}")
-print(f"Z-scores: {result_july['z_scores']}")
\ No newline at end of file
+if "--offline" in sys.argv:
+    from benchmarks import fixtures
+    upstream = fixtures.replay()
+else:
+    upstream = nullcontext()
+
+
+def show(result):
+    print(f"Likelihood: {result['prediction']['likelihood']}")
+    print(f"Risk: {result['prediction']['risk']}")
+    print(f"Diagnostics: {result['diagnostics']}")
+
+
+with upstream:
+    print("\n🌸 APRIL (should be HIGH/EXTREME):")
+    show(predictor.predict(52.63, 1.29, 28.5, 0.0, 0.15, 45.0, date=datetime(2024, 4, 15)))  # April!
+
+    print("\n☀️ JULY (should be LOW/MODERATE):")
+    show(predictor.predict(52.63, 1.29, 28.5, 0.0, 0.15, 45.0, date=datetime(2024, 7, 15)))  # Same temp, July
@@ -0,0 +1,8 @@
+"""
+Behaviour tests for the backend modules. Run from backend/ (needs pytest):
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
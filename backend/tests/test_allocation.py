@@ -0,0 +1,21 @@
+import pytest
+
+agent = pytest.importorskip("agent")
+
+
+def test_rescales_to_exact_acreage():
+    result = agent.rescale_allocation({"wheat": 3.0, "oat": 1.0, "corn": 1.0}, 17)
+    assert round(sum(result.values()), 1) == 17
+    assert all(round(v, 1) == v for v in result.values())
+    assert result["wheat"] > result["oat"]
+
+
+def test_rounding_remainder_goes_to_the_largest_crop():
+    result = agent.rescale_allocation({"wheat": 1.0, "oat": 1.0, "corn": 1.0, "sugar": 0.0}, 10)
+    assert round(sum(result.values()), 1) == 10
+    assert result["sugar"] == 0.0
+    assert sorted(result.values()) == [0.0, 3.3, 3.3, 3.4]
+
+
+def test_empty_allocation_is_left_alone():
+    assert agent.rescale_allocation({"wheat": 0.0, "oat": 0.0}, 10) == {"wheat": 0.0, "oat": 0.0}
@@ -0,0 +1,115 @@
+import pytest
+
+import breaker
+from breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(breaker, "time", clock)
+    return clock
+
+
+def make(**kwargs):
+    settings = dict(slow_call_s=1.0, window_s=60, min_calls=4, error_rate=0.5, slow_rate=0.5, cooldown_s=30)
+    settings.update(kwargs)
+    return CircuitBreaker("test", **settings)
+
+
+def test_stays_closed_below_min_calls(clock):
+    b = make()
+    for _ in range(3):
+        b.record(0.1, ok=False)
+    assert b.state == CLOSED
+    assert b.allow()
+
+
+def test_opens_on_error_rate_and_rejects_during_cooldown(clock):
+    b = make()
+    for ok in (True, True, False, False):
+        b.record(0.1, ok=ok)
+    assert b.state == OPEN
+    clock.now += 29
+    assert not b.allow()
+    assert b.retry_after() == 1
+
+
+def test_opens_on_slow_calls_that_succeed(clock):
+    b = make()
+    for seconds in (0.1, 0.1, 2.0, 2.0):
+        b.record(seconds, ok=True)
+    assert b.state == OPEN
+
+
+def test_old_calls_leave_the_window(clock):
+    b = make()
+    for _ in range(3):
+        b.record(0.1, ok=False)
+    clock.now += 61
+    b.record(0.1, ok=True)
+    assert b.state == CLOSED
+
+
+def test_half_open_lets_one_trial_through(clock):
+    b = make()
+    for _ in range(4):
+        b.record(0.1, ok=False)
+    clock.now += 30
+    assert b.allow()
+    assert b.state == HALF_OPEN
+    assert not b.allow()
+
+
+def test_successful_trial_closes(clock):
+    b = make()
+    for _ in range(4):
+        b.record(0.1, ok=False)
+    clock.now += 30
+    assert b.allow()
+    b.record(0.1, ok=True)
+    assert b.state == CLOSED
+    assert b.allow()
+    # The failures from before the outage are forgotten
+    b.record(0.1, ok=False)
+    assert b.state == CLOSED
+
+
+@pytest.mark.parametrize("seconds, ok", [(0.1, False), (2.0, True)])
+def test_failed_or_slow_trial_reopens(clock, seconds, ok):
+    b = make()
+    for _ in range(4):
+        b.record(0.1, ok=False)
+    clock.now += 30
+    assert b.allow()
+    b.record(seconds, ok=ok)
+    assert b.state == OPEN
+    clock.now += 29
+    assert not b.allow()
+    clock.now += 1
+    assert b.allow()
+
+
+def test_guard_records_failures_and_raises_circuit_open(clock, monkeypatch):
+    monkeypatch.setattr(breaker, "_breakers", {"flaky": make()})
+    for _ in range(4):
+        with pytest.raises(ValueError):
+            with breaker.guard("flaky"):
+                raise ValueError("upstream down")
+    assert breaker.states() == {"flaky": OPEN}
+    with pytest.raises(CircuitOpen) as exc:
+        with breaker.guard("flaky"):
+            pytest.fail("called out while open")
+    assert exc.value.service == "flaky"
+    assert exc.value.retry_after == 30
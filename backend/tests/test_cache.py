@@ -0,0 +1,144 @@
+import multiprocessing
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import cache
+from cache import FRESH, MISS, STALE, SharedTTLCache, TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    clock.time = lambda: clock.now
+    clock.monotonic = lambda: clock.now
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def shared_db(tmp_path):
+    cache.close_db()
+    cache.db.init(None)
+    cache.init_db(str(tmp_path / "cache.db"))
+    yield str(tmp_path / "cache.db")
+    cache.close_db()
+    cache.db.init(None)
+
+
+def in_thread(fn):
+    """fn() on a fresh thread, which gets its own SQLite connection."""
+    result = {}
+
+    def run():
+        try:
+            result["value"] = fn()
+        finally:
+            cache.close_db()
+
+    t = threading.Thread(target=run)
+    t.start()
+    t.join()
+    return result["value"]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def ttl_cache(request, clock):
+    if request.param == "memory":
+        return TTLCache("test", fresh_s=10, stale_s=20)
+    request.getfixturevalue("shared_db")
+    return SharedTTLCache("test", fresh_s=10, stale_s=20)
+
+
+def test_fresh_stale_miss(ttl_cache, clock):
+    assert ttl_cache.get("k") == (None, MISS, None)
+    ttl_cache.set("k", {"v": 1})
+    assert ttl_cache.get("k") == ({"v": 1}, FRESH, 0)
+    clock.now += 15
+    assert ttl_cache.get("k") == ({"v": 1}, STALE, 15)
+    assert ttl_cache.peek("k") == ({"v": 1}, STALE, 15)
+    clock.now += 16
+    assert ttl_cache.get("k") == (None, MISS, None)
+
+
+def test_one_claim_until_set_or_release(ttl_cache):
+    ttl_cache.set("k", 1)
+    assert ttl_cache.claim_refresh("k")
+    assert not ttl_cache.claim_refresh("k")
+    ttl_cache.release_refresh("k")
+    assert ttl_cache.claim_refresh("k")
+    ttl_cache.set("k", 2)
+    assert ttl_cache.claim_refresh("k")
+
+
+def test_evicts_least_recently_used(clock):
+    c = TTLCache("test", fresh_s=10, max_entries=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")
+    c.set("c", 3)
+    assert c.peek("b") == (None, MISS, None)
+    assert c.peek("a")[0] == 1 and c.peek("c")[0] == 3
+
+
+def test_entries_are_shared_between_connections(shared_db, clock):
+    writer = SharedTTLCache("test", fresh_s=10, stale_s=20)
+    reader = SharedTTLCache("test", fresh_s=10, stale_s=20)
+    in_thread(lambda: writer.set("k", [1, 2, 3]))
+    assert reader.get("k") == ([1, 2, 3], FRESH, 0)
+    # A newer value from the other connection replaces the reader's decoded copy
+    clock.now += 5
+    in_thread(lambda: writer.set("k", [4]))
+    assert reader.get("k") == ([4], FRESH, 0)
+    clock.now += 15
+    assert in_thread(lambda: reader.get("k")) == ([4], STALE, 15)
+
+
+def test_namespaces_do_not_collide(shared_db, clock):
+    SharedTTLCache("a", fresh_s=10).set("k", "a")
+    assert SharedTTLCache("b", fresh_s=10).get("k") == (None, MISS, None)
+
+
+def test_claim_is_exclusive_across_connections(shared_db, clock):
+    c = SharedTTLCache("test", fresh_s=10, stale_s=20)
+    assert in_thread(lambda: c.claim_refresh("k"))
+    assert not c.claim_refresh("k")
+    in_thread(lambda: c.release_refresh("k"))
+    assert c.claim_refresh("k")
+
+
+def test_abandoned_claim_expires(shared_db, clock):
+    c = SharedTTLCache("test", fresh_s=10, stale_s=20)
+    assert in_thread(lambda: c.claim_refresh("k"))
+    clock.now += SharedTTLCache.CLAIM_TIMEOUT_S + 1
+    assert c.claim_refresh("k")
+
+
+def _claim_in_child(path, queue):
+    cache.db.init(None)
+    cache.init_db(path)
+    queue.put(SharedTTLCache("test", fresh_s=10).claim_refresh("k"))
+
+
+def test_claim_is_exclusive_across_processes(shared_db):
+    c = SharedTTLCache("test", fresh_s=10)
+    assert c.claim_refresh("k")
+    cache.close_db()
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    child = ctx.Process(target=_claim_in_child, args=(shared_db, queue))
+    child.start()
+    claimed = queue.get(timeout=10)
+    child.join(10)
+    assert claimed is False
+
+
+def test_trim_keeps_the_newest_entries(shared_db, clock, monkeypatch):
+    monkeypatch.setattr(SharedTTLCache, "TRIM_EVERY", 1)
+    c = SharedTTLCache("test", fresh_s=100, max_entries=2)
+    for i in range(4):
+        clock.now += 1
+        c.set(f"k{i}", i)
+    kept = {key for (key,) in cache.CacheEntry.select(cache.CacheEntry.key).tuples()}
+    assert kept == {"k2", "k3"}
@@ -0,0 +1,24 @@
+import numpy as np
+
+from downsample import lttb
+
+
+def test_short_series_are_returned_whole():
+    assert lttb(np.arange(5), np.arange(5), 10).tolist() == [0, 1, 2, 3, 4]
+    assert lttb(np.arange(5), np.arange(5), 2).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_keeps_endpoints_sorted_and_unique():
+    x = np.arange(1000)
+    y = np.sin(x / 20.0) + np.random.default_rng(0).normal(0, 0.1, len(x))
+    kept = lttb(x, y, 50)
+    assert len(kept) == 50
+    assert kept[0] == 0 and kept[-1] == 999
+    assert (np.diff(kept) > 0).all()
+
+
+def test_keeps_isolated_spikes():
+    y = np.zeros(500)
+    y[[123, 321]] = [10.0, -10.0]
+    kept = lttb(np.arange(500), y, 20)
+    assert {123, 321} <= set(kept.tolist())
@@ -0,0 +1,72 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+import pytest
+
+from executor import BoundedExecutor, DeadlineExceeded, Overloaded
+
+request_tag = contextvars.ContextVar("request_tag", default=None)
+
+
+@pytest.fixture
+def executor():
+    ex = BoundedExecutor("test", workers=1, queue_limit=1, initial_service_s=2.0)
+    yield ex
+    ex.shutdown()
+
+
+def test_runs_calls_in_the_callers_context(executor):
+    async def main():
+        request_tag.set("req-1")
+        return await executor.run(request_tag.get)
+
+    assert asyncio.run(main()) == "req-1"
+
+
+def test_rejects_beyond_workers_plus_queue(executor):
+    gate = threading.Event()
+
+    async def main():
+        running = asyncio.ensure_future(executor.run(gate.wait, 5))
+        queued = asyncio.ensure_future(executor.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        assert executor.queue_depth == 1
+        with pytest.raises(Overloaded) as exc:
+            await executor.run(lambda: "rejected")
+        # Two calls ahead at ~2s each on one worker
+        assert exc.value.retry_after == 4
+        gate.set()
+        return await running, await queued
+
+    assert asyncio.run(main()) == (True, "queued")
+    assert executor.queue_depth == 0
+
+
+def test_deadline_drops_a_call_that_has_not_started(executor):
+    gate = threading.Event()
+    ran = []
+
+    async def main():
+        running = asyncio.ensure_future(executor.run(gate.wait, 5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(DeadlineExceeded):
+            await executor.run(ran.append, "late", deadline=0.05)
+        gate.set()
+        await running
+        # The dropped call freed its slot and never ran
+        assert await executor.run(lambda: "next") == "next"
+
+    asyncio.run(main())
+    assert ran == []
+
+
+def test_submit_admits_without_awaiting(executor):
+    futures = [executor.submit(time.sleep, 0.05), executor.submit(time.sleep, 0.05)]
+    with pytest.raises(Overloaded):
+        executor.submit(time.sleep, 0)
+    for f in futures:
+        f.result(5)
+    time.sleep(0.01)
+    assert executor.submit(lambda: 1).result(5) == 1
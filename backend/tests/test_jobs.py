@@ -0,0 +1,141 @@
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import jobs
+from jobs import DONE, FAILED, PENDING, RUNNING, Job
+
+
+@pytest.fixture(autouse=True)
+def jobs_db(tmp_path, monkeypatch):
+    jobs.close_db()
+    jobs.db.init(None)
+    jobs.init_db(str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(jobs, "_pool", None)
+    yield
+    jobs.close_db()
+    jobs.db.init(None)
+
+
+@pytest.fixture
+def dispatched(monkeypatch):
+    """Job IDs a standalone process would hand to its worker pool."""
+    ids = []
+    monkeypatch.delenv("SERVE_PREFORK", raising=False)
+    monkeypatch.setattr(jobs, "_dispatch", ids.append)
+    return ids
+
+
+def dead_owner():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return f"{jobs.HOST}:{proc.pid}"
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_prefork_workers_queue_jobs_without_an_owner_or_pool(monkeypatch):
+    monkeypatch.setenv("SERVE_PREFORK", "1")
+    job, created = jobs.submit("SW1A 1AA", 10)
+    assert created
+    assert Job.get_by_id(job.id).owner is None
+    assert jobs._pool is None
+
+
+def test_runner_adopts_only_what_its_threads_can_start(monkeypatch):
+    monkeypatch.setenv("SERVE_PREFORK", "1")
+    release = threading.Event()
+
+    def run_job(job_id):
+        Job.update(status=RUNNING).where(Job.id == job_id).execute()
+        release.wait(5)
+        jobs._finish(job_id, result={"ok": job_id})
+
+    monkeypatch.setattr(jobs, "run_job", run_job)
+    ids = [jobs.submit(f"AB{i} 1CD", 10)[0].id for i in range(3)]
+    stop = threading.Event()
+    runner = threading.Thread(target=jobs.run_forever, kwargs={"workers": 2, "poll_s": 0.01, "stop": stop})
+    runner.start()
+
+    wait_for(lambda: Job.select().where(Job.status == RUNNING).count() == 2)
+    time.sleep(0.05)
+    third = Job.get_by_id(ids[2])
+    assert (third.status, third.owner) == (PENDING, None)
+
+    release.set()
+    wait_for(lambda: Job.select().where(Job.status == DONE).count() == 3)
+    assert {Job.get_by_id(i).owner for i in ids} == {jobs.owner_id()}
+    stop.set()
+    runner.join(5)
+
+
+def test_identical_unfinished_job_is_reused(dispatched):
+    job, created = jobs.submit("sw1a 1aa", 10)
+    again, created_again = jobs.submit("SW1A1AA", 10.0)
+    assert created and not created_again
+    assert again.id == job.id
+    assert dispatched == [job.id]
+    assert jobs.job_key("SW1A 1AA", 10, "climatology") != job.key
+
+
+def test_finished_job_is_not_reused(dispatched):
+    job, _ = jobs.submit("SW1A 1AA", 10)
+    jobs._finish(job.id, result={"ok": True})
+    again, created = jobs.submit("SW1A 1AA", 10)
+    assert created and again.id != job.id
+    assert jobs.get_job(job.id)["result"] == {"ok": True}
+
+
+def test_queue_limit(dispatched, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_QUEUE_LIMIT", 2)
+    jobs.submit("AB1 1CD", 1)
+    jobs.submit("AB2 1CD", 1)
+    with pytest.raises(jobs.QueueFull):
+        jobs.submit("AB3 1CD", 1)
+
+
+def test_releases_only_jobs_whose_owner_is_gone(dispatched):
+    live, _ = jobs.submit("AB1 1CD", 1)
+    dead, _ = jobs.submit("AB2 1CD", 1)
+    silent, _ = jobs.submit("AB3 1CD", 1)
+    Job.update(status=RUNNING, started_at=time.time()).execute()
+    Job.update(owner=dead_owner()).where(Job.id == dead.id).execute()
+    Job.update(heartbeat_at=time.time() - jobs.JOB_ORPHAN_S - 1).where(Job.id == silent.id).execute()
+
+    assert jobs.release_orphans() == 2
+    assert Job.get_by_id(live.id).status == RUNNING
+    for job_id in (dead.id, silent.id):
+        job = Job.get_by_id(job_id)
+        assert (job.status, job.owner, job.started_at) == (PENDING, None, None)
+    # Released once: a second pass finds nothing to do
+    assert jobs.release_orphans() == 0
+
+
+def test_released_job_is_adopted_once(dispatched):
+    job, _ = jobs.submit("AB1 1CD", 1)
+    Job.update(owner=dead_owner()).where(Job.id == job.id).execute()
+    jobs.release_orphans()
+    assert jobs.adopt() == 1
+    assert jobs.adopt() == 0
+    assert dispatched == [job.id, job.id]
+    assert Job.get_by_id(job.id).owner == jobs.owner_id()
+
+
+def test_cleanup_removes_only_expired_finished_jobs(dispatched):
+    old, _ = jobs.submit("AB1 1CD", 1)
+    recent, _ = jobs.submit("AB2 1CD", 1)
+    pending, _ = jobs.submit("AB3 1CD", 1)
+    jobs._finish(old.id, error="boom")
+    jobs._finish(recent.id, result={})
+    Job.update(finished_at=time.time() - 100).where(Job.id == old.id).execute()
+    assert Job.get_by_id(old.id).status == FAILED
+    assert jobs.cleanup(ttl=50) == 1
+    assert {j.id for j in Job.select()} == {recent.id, pending.id}
@@ -0,0 +1,74 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("brotli")
+
+from starlette.applications import Starlette  # noqa: E402
+from starlette.responses import Response  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+from starlette.testclient import TestClient  # noqa: E402
+
+from responses import CompressionMiddleware, _strip_encoding_suffix, negotiate  # noqa: E402
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("*", "br"),
+    ("*, br;q=0", "gzip"),
+    ("GZIP;q=0.5", "gzip"),
+    ("br;q=oops, gzip", "gzip"),
+])
+def test_negotiate(header, expected):
+    assert negotiate(header) == expected
+
+
+@pytest.mark.parametrize("header, expected", [
+    ('"abc"', '"abc"'),
+    ('"abc-br"', '"abc"'),
+    ('"abc-gzip"', '"abc"'),
+    ('W/"abc-gzip"', 'W/"abc"'),
+    ('"abc-br", "def-gzip", "ghi"', '"abc", "def", "ghi"'),
+])
+def test_strip_encoding_suffix(header, expected):
+    assert _strip_encoding_suffix(header) == expected
+
+
+def _app():
+    etag = '"v1"'
+
+    async def data(request):
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(b'{"x": "' + b"a" * 4000 + b'"}', media_type="application/json", headers={"ETag": etag})
+
+    async def small(request):
+        return Response(b"{}", media_type="application/json")
+
+    app = Starlette(routes=[Route("/data", data), Route("/small", small)])
+    app.add_middleware(CompressionMiddleware)
+    return app
+
+
+def test_compresses_and_tags_each_encoding():
+    client = TestClient(_app())
+    for encoding in ("br", "gzip"):
+        r = client.get("/data", headers={"Accept-Encoding": encoding})
+        assert r.headers["content-encoding"] == encoding
+        assert r.headers["etag"] == f'"v1-{encoding}"'
+        assert r.headers["vary"] == "Accept-Encoding"
+        assert len(r.content) == 4009
+
+    r = client.get("/small", headers={"Accept-Encoding": "br"})
+    assert "content-encoding" not in r.headers
+
+
+def test_revalidates_an_encoded_etag():
+    client = TestClient(_app())
+    r = client.get("/data", headers={"Accept-Encoding": "br", "If-None-Match": '"v1-br"'})
+    assert r.status_code == 304
+    assert r.headers["etag"] == '"v1-br"'
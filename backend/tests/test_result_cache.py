@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("agent")
+
+import result_cache  # noqa: E402
+from cache import TTLCache  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def results(monkeypatch):
+    cache = TTLCache("strategy_results", fresh_s=3600, stale_s=3600)
+    monkeypatch.setattr(result_cache, "results", cache)
+    return cache
+
+
+def live_response():
+    return {
+        "crop_data": {"wheat": 6.0, "oat": 4.0},
+        "advice": {"Market Strategy": ["Sell forward."]},
+        "metadata": {
+            "postcode": "SW1A 1AA",
+            "total_acres": 10.0,
+            "ml_telemetry": {"risk": 0.2},
+            "telemetry_source": "precomputed",
+            "coordinates": {"latitude": 51.5, "longitude": -0.14},
+        },
+    }
+
+
+def test_hit_has_the_same_metadata_as_a_miss():
+    live = live_response()
+    result_cache.store("k", live)
+    hit, state, _ = result_cache.lookup("k", "SW1A 1AA", 20.0)
+    assert state == "fresh"
+    assert set(hit["metadata"]) == set(live["metadata"]) | {"cache"}
+    assert hit["metadata"]["telemetry_source"] == "precomputed"
+    assert hit["crop_data"] == {"wheat": 12.0, "oat": 8.0}
+    assert hit["metadata"]["total_acres"] == 20.0
@@ -0,0 +1,34 @@
+import pytest
+
+import warmup
+
+
+@pytest.fixture(autouse=True)
+def state(monkeypatch):
+    state = {"ready": False, "started_at": None, "duration_s": None, "steps": {}, "error": None, "attempts": 0}
+    monkeypatch.setattr(warmup, "STATE", state)
+    return state
+
+
+def test_retry_skips_finished_steps(monkeypatch, state):
+    calls = {"imports": 0, "models": 0, "postcodes": 0}
+    failures = ["GB.zip download failed"]
+
+    def step(name, fail=False):
+        def run():
+            calls[name] += 1
+            if fail and failures:
+                raise OSError(failures.pop())
+        return run
+
+    monkeypatch.setattr(warmup, "_import_request_path", step("imports"))
+    monkeypatch.setattr(warmup, "_load_models", step("models"))
+    monkeypatch.setattr(warmup, "_load_postcodes", step("postcodes", fail=True))
+
+    assert not warmup.warm_up(market=False)
+    assert state["error"] == "GB.zip download failed"
+    assert warmup.warm_up(market=False)
+    assert state["error"] is None
+    assert state["attempts"] == 2
+    assert calls == {"imports": 1, "models": 1, "postcodes": 2}
+    assert set(state["steps"]) == {"imports", "extreme_weather_models", "postcode_index"}
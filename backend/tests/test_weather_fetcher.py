@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import breaker
+from weather_fetcher import WeatherDataFetcher, batch_params, plan_batches, split_locations
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(breaker, "_breakers", {})
+
+
+def test_plan_batches_by_location_count():
+    assert plan_batches(5, 10, max_locations=2, max_values=1000) == [(0, 2), (2, 4), (4, 5)]
+
+
+def test_plan_batches_by_value_count():
+    # 300 values per location, at most 1000 per request -> 3 locations per batch
+    assert plan_batches(7, 300, max_locations=100, max_values=1000) == [(0, 3), (3, 6), (6, 7)]
+
+
+def test_plan_batches_edges():
+    assert plan_batches(0, 10, max_locations=5, max_values=100) == []
+    # A location bigger than the value limit still gets a request of its own
+    assert plan_batches(2, 500, max_locations=5, max_values=100) == [(0, 1), (1, 2)]
+
+
+def test_batch_params_joins_coordinates_in_order():
+    params = batch_params([(51.5, -0.12345), (55.95, -3.2)], hourly="temperature_2m")
+    assert params == {"latitude": "51.5000,55.9500", "longitude": "-0.1235,-3.2000", "hourly": "temperature_2m"}
+
+
+def test_split_locations():
+    assert split_locations({"hourly": 1}) == [{"hourly": 1}]
+    assert split_locations([{"hourly": 1}, {"hourly": 2}]) == [{"hourly": 1}, {"hourly": 2}]
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code))
+
+
+def archive_payload(lats):
+    def one(lat):
+        return {"latitude": lat, "hourly": {"time": ["2024-01-01T00:00"], "temperature_2m": [lat]}}
+    return [one(lat) for lat in lats] if len(lats) > 1 else one(lats[0])
+
+
+def test_historical_batch_keeps_order_and_marks_failed_batches():
+    calls = []
+
+    def get(url, params, timeout):
+        lats = [float(v) for v in params["latitude"].split(",")]
+        calls.append(lats)
+        return FakeResponse(None, 500) if 3.0 in lats else FakeResponse(archive_payload(lats))
+
+    fetcher = WeatherDataFetcher(attempts=1)
+    fetcher.session = SimpleNamespace(get=get)
+    locations = [(float(i), 0.0) for i in range(5)]
+    frames = fetcher.fetch_historical_batch(locations, start_date_str="2024-01-01", end_date_str="2024-01-01",
+                                            max_locations=2)
+    assert calls == [[0.0, 1.0], [2.0, 3.0], [4.0]]
+    assert [None if f is None else float(f["temperature_2m"].iloc[0]) for f in frames] == [0.0, 1.0, None, None, 4.0]
@@ -0,0 +1,89 @@
+"""
+Serving warm-up: import the heavy request-path modules and preload models and caches once,
+before the readiness probe reports ready.
+
+A failed warm-up can be run again: steps that already finished are skipped. The server retries
+with exponential backoff from WARMUP_RETRY_S (default 5) up to WARMUP_MAX_BACKOFF_S (default 300).
+"""
+import os
+import time
+
+from log_setup import get_logger
+
+logger = get_logger(__name__)
+
+WARMUP_RETRY_S = float(os.getenv("WARMUP_RETRY_S", "5"))
+WARMUP_MAX_BACKOFF_S = float(os.getenv("WARMUP_MAX_BACKOFF_S", "300"))
+
+# Read by /ready; written only by warm_up()
+STATE = {
+    "ready": False,
+    "started_at": None,
+    "duration_s": None,
+    "steps": {},
+    "error": None,
+    "attempts": 0,
+}
+
+
+def _step(name, fn):
+    if name in STATE["steps"]:
+        return
+    start = time.perf_counter()
+    fn()
+    STATE["steps"][name] = round(time.perf_counter() - start, 3)
+
+
+def _import_request_path():
+    # Imported here rather than by server.py so the app module itself stays cheap to import
+    import agent  # noqa: F401  (anthropic, pandas, xgboost, soil + market + weather agents)
+
+
+def _load_models():
+    from hybrid_predictor import get_predictor
+    get_predictor()
+
+
+def _load_postcodes():
+    from weatherSubAgent import get_nominatim
+    get_nominatim("gb")
+
+
+def _load_market_prices():
+    from marketPrediction import MarketModel
+    from marketSubAgent import TICKER_DICT
+    MarketModel(TICKER_DICT).get_forward_curve()
+
+
+def warm_up(market=None):
+    """
+    Run every warm-up step and flip STATE["ready"].
+
+    Market prices need Yahoo; set WARMUP_MARKET=0 to skip them (the first request fetches them).
+    """
+    if market is None:
+        market = os.getenv("WARMUP_MARKET", "1") != "0"
+
+    STATE["started_at"] = time.time()
+    STATE["attempts"] += 1
+    STATE["error"] = None
+    start = time.perf_counter()
+    try:
+        _step("imports", _import_request_path)
+        _step("extreme_weather_models", _load_models)
+        _step("postcode_index", _load_postcodes)
+        if market:
+            try:
+                _step("market_prices", _load_market_prices)
+            except Exception as e:
+                # Not fatal: the cache fills on the first request instead
+                logger.warning("Warm-up: market prices unavailable (%s)", e)
+        STATE["ready"] = True
+    except Exception as e:
+        STATE["error"] = str(e)
+        logger.exception("Warm-up failed")
+    finally:
+        STATE["duration_s"] = round(time.perf_counter() - start, 3)
+        logger.info("Warm-up finished", extra={"ready": STATE["ready"], "steps": STATE["steps"],
+                                              "duration_s": STATE["duration_s"]})
+    return STATE["ready"]
@@ -1,79 +1,171 @@
 # This is the weather prediction model for just regular weather predictions and stuff.
 
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import xgboost as xgb
+
+from log_setup import get_logger
+
+logger = get_logger(__name__)
+
+# We define all the variables we want to monitor for anomalies
+TARGETS = [
+    'soil_temperature_0cm', 
+    'precipitation', 
+    'wind_speed_10m', 
+    'cloud_cover',
+    'wind_direction_10m',
+    'precipitation_probability',
+    'weather_code',
+    'temp_lag_1h'
+]
+
+# All potential features available in the dataset
+# (We use the user's desired list + our engineered features)
+FEATURE_POOL = [
+    'hour', 'day_of_year', 'temperature_2m', 'precipitation',
+    'wind_speed_10m', 'cloud_cover', 'wind_direction_10m',
+    'precipitation_probability', 'weather_code',
+    'temp_lag_1h', 'precip_rolling_24h', 'soil_temperature_0cm'
+]
+
+XGB_PARAMS = dict(
+    n_estimators=200,
+    learning_rate=0.05,
+    max_depth=6,
+    subsample=0.8,
+    objective='reg:squarederror'
+)
+
+
+def features_for_target(target):
+    """Feature columns used to predict `target` (the target itself and leaky columns removed)."""
+    # Remove the target itself and derived features that "leak" the answer
+    features = [f for f in FEATURE_POOL if f != target]
+
+    # Anti-leakage: if predicting precip, remove rolling precip
+    if target == 'precipitation' and 'precip_rolling_24h' in features:
+        features.remove('precip_rolling_24h')
+    # Anti-leakage: if predicting lag, remove current temp (optional, but good practice)
+    if target == 'temp_lag_1h' and 'temperature_2m' in features:
+        features.remove('temperature_2m')
+    return features
+
+
+def engineer_features(df):
+    df = df.copy()
+    df['time'] = pd.to_datetime(df['time'])
+    df['hour'] = df['time'].dt.hour
+    df['day_of_year'] = df['time'].dt.dayofyear
+
+    # Derived features
+    df['temp_lag_1h'] = df['temperature_2m'].shift(1).bfill()
+    
+    # Rolling average for precipitation context
+    df['precip_rolling_24h'] = df['precipitation'].rolling(window=24).mean().bfill()
+
+    return df
+
+
 class WeatherModel:
     def __init__(self):
-        # We define all the variables we want to monitor for anomalies
-        self.targets = [
-            'soil_temperature_0cm', 
-            'precipitation', 
-            'wind_speed_10m', 
-            'cloud_cover',
-            'wind_direction_10m',
-            'precipitation_probability',
-            'weather_code',
-            'temp_lag_1h'
-        ]
+        self.targets = list(TARGETS)
         
         # Dictionary to hold a separate model for each target
         self.models = {
-            target: xgb.XGBRegressor(
-                n_estimators=200,
-                learning_rate=0.05,
-                max_depth=6,
-                subsample=0.8,
-                objective='reg:squarederror'
-            ) for target in self.targets
+            target: xgb.XGBRegressor(**XGB_PARAMS) for target in self.targets
         }
+        # Column of a multi-output model's prediction belonging to each target
+        # (only set for targets trained together in a multi-output group)
+        self.output_index = {}
         self.is_trained = False
 
     def engineer_features(self, df):
-        df = df.copy()
-        df['time'] = pd.to_datetime(df['time'])
-        df['hour'] = df['time'].dt.hour
-        df['day_of_year'] = df['time'].dt.dayofyear
+        return engineer_features(df)
+    
+    def train(self, dataframe, parallel=False, n_threads=None, multi_output=False):
+        """
+        Fit one regressor per target.
 
-        # Derived features
-        df['temp_lag_1h'] = df['temperature_2m'].shift(1).bfill()
-        
-        # Rolling average for precipitation context
-        df['precip_rolling_24h'] = df['precipitation'].rolling(window=24).mean().bfill()
+        Args:
+            dataframe: Hourly weather frame as returned by Open-Meteo
+            parallel: Build one shared feature matrix and fit targets concurrently
+            n_threads: Total thread budget shared by all concurrent fits (default: CPU count)
+            multi_output: Fit targets with identical feature sets as one multi-output model
+        """
+        if not parallel and not multi_output:
+            return self._train_serial(dataframe)
 
-        return df
-    
-    def train(self, dataframe):
         df = self.engineer_features(dataframe)
-        
-        # All potential features available in the dataset
-        # (We use the user's desired list + our engineered features)
-        all_features_pool = [
-            'hour', 'day_of_year', 'temperature_2m', 'precipitation', 
-            'wind_speed_10m', 'cloud_cover', 'wind_direction_10m', 
-            'precipitation_probability', 'weather_code',
-            'temp_lag_1h', 'precip_rolling_24h', 'soil_temperature_0cm'
-        ]
-
-        print(f"Starting multi-target training on {len(df)} rows...")
+        logger.debug("Starting parallel multi-target training on %d rows", len(df))
+
+        # One feature matrix for every target; each fit takes a column slice of it
+        matrix = df[FEATURE_POOL].fillna(0)
+
+        jobs = []
+        for targets in self._group_targets(multi_output):
+            mask = df[targets].notna().all(axis=1).to_numpy()
+            if not mask.any():
+                logger.warning("Skipping %s: no valid data found", ", ".join(targets))
+                continue
+            jobs.append((targets, mask))
+
+        if not jobs:
+            return False
+
+        n_threads = n_threads or os.cpu_count() or 1
+        workers = max(1, min(len(jobs), n_threads))
+        # Split the thread budget between concurrent fits so we never oversubscribe
+        threads_per_fit = max(1, n_threads // workers)
+
+        def fit(job):
+            targets, mask = job
+            x = matrix.loc[mask, features_for_target(targets[0])]
+            if len(targets) == 1:
+                model = xgb.XGBRegressor(**XGB_PARAMS, n_jobs=threads_per_fit)
+                model.fit(x, df.loc[mask, targets[0]])
+            else:
+                model = xgb.XGBRegressor(**XGB_PARAMS, n_jobs=threads_per_fit,
+                                         tree_method='hist', multi_strategy='multi_output_tree')
+                model.fit(x, df.loc[mask, targets])
+            return targets, model
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for targets, model in pool.map(fit, jobs):
+                for i, target in enumerate(targets):
+                    self.models[target] = model
+                    if len(targets) > 1:
+                        self.output_index[target] = i
+
+        self.is_trained = True
+        return True
+
+    def _group_targets(self, multi_output):
+        """Group targets that share an identical feature set (singletons unless multi_output)."""
+        if not multi_output:
+            return [[t] for t in self.targets]
+        groups = {}
+        for target in self.targets:
+            groups.setdefault(tuple(features_for_target(target)), []).append(target)
+        return list(groups.values())
+
+    def _train_serial(self, dataframe):
+        df = self.engineer_features(dataframe)
+
+        logger.debug("Starting multi-target training on %d rows", len(df))
         
         for target in self.targets:
             # 1. Drop rows where THIS specific target is missing
             df_t = df.dropna(subset=[target])
             
             if df_t.empty:
-                print(f"Skipping {target}: No valid data found.")
+                logger.warning("Skipping %s: no valid data found", target)
                 continue
 
             # 2. Select Features (X)
-            # Remove the target itself and derived features that "leak" the answer
-            features = [f for f in all_features_pool if f != target]
-            
-            # Anti-leakage: if predicting precip, remove rolling precip
-            if target == 'precipitation' and 'precip_rolling_24h' in features:
-                features.remove('precip_rolling_24h')
-            # Anti-leakage: if predicting lag, remove current temp (optional, but good practice)
-            if target == 'temp_lag_1h' and 'temperature_2m' in features:
-                features.remove('temperature_2m')
+            features = features_for_target(target)
 
             x = df_t[features].fillna(0)
             y = df_t[target]
@@ -101,58 +193,61 @@ class WeatherModel:
         df_now = df.tail(1)
         
         results = {}
-        all_features_pool = [
-            'hour', 'day_of_year', 'temperature_2m', 'precipitation', 
-            'wind_speed_10m', 'cloud_cover', 'wind_direction_10m', 
-            'precipitation_probability', 'weather_code',
-            'temp_lag_1h', 'precip_rolling_24h', 'soil_temperature_0cm'
-        ]
 
         for target in self.targets:
             # Prepare X features (excluding the target)
-            features = [f for f in all_features_pool if f != target]
-            if target == 'precipitation' and 'precip_rolling_24h' in features:
-                features.remove('precip_rolling_24h')
-            if target == 'temp_lag_1h' and 'temperature_2m' in features:
-                features.remove('temperature_2m')
+            features = features_for_target(target)
 
             x_now = df_now[features].fillna(0)
             
             # Prediction
             try:
-                pred_val = float(self.models[target].predict(x_now)[0])
+                pred = self.models[target].predict(x_now)[0]
+                if target in self.output_index:
+                    pred = pred[self.output_index[target]]
+                pred_val = float(pred)
             except Exception:
                 pred_val = 0.0
 
-            # Post-processing for specific types
-            if target == 'weather_code':
-                pred_val = round(pred_val) # Codes are integers
-            elif target == 'precipitation_probability':
-                pred_val = max(0.0, min(100.0, pred_val)) # Clamp between 0-100
-
             # Actual Value
             actual_val = df_now[target].iloc[0]
-            if pd.isna(actual_val):
-                actual_val = 0.0 # Fallback if API returned null for this hour
-            else:
-                actual_val = float(actual_val)
+            results[target] = prediction_entry(target, pred_val, actual_val)
 
-            delta = actual_val - pred_val
-            
-            results[target] = {
-                "predicted": round(pred_val, 2),
-                "actual": round(actual_val, 2),
-                "delta": round(delta, 2)
-            }
-
-        soil_risk = abs(results['soil_temperature_0cm']['delta']) > 5.0
-        wind_risk = results['wind_speed_10m']['delta'] > 10.0 
-        
-        return {
-            "predictions": results,
-            "risk_level": "CRITICAL" if (soil_risk or wind_risk) else "STABLE",
-            # Flattened keys for easy access in your main agent
-            "predicted_soil_temp": results['soil_temperature_0cm']['predicted'],
-            "actual_soil_temp": results['soil_temperature_0cm']['actual'],
-            "anomaly_delta": results['soil_temperature_0cm']['delta']
-        }
\ No newline at end of file
+        return summarise_risk(results)
+
+
+def prediction_entry(target, pred_val, actual_val):
+    """Build the predicted/actual/delta record for one target."""
+    # Post-processing for specific types
+    if target == 'weather_code':
+        pred_val = round(pred_val) # Codes are integers
+    elif target == 'precipitation_probability':
+        pred_val = max(0.0, min(100.0, pred_val)) # Clamp between 0-100
+
+    if pd.isna(actual_val):
+        actual_val = 0.0 # Fallback if API returned null for this hour
+    else:
+        actual_val = float(actual_val)
+
+    delta = actual_val - pred_val
+
+    return {
+        "predicted": round(pred_val, 2),
+        "actual": round(actual_val, 2),
+        "delta": round(delta, 2)
+    }
+
+
+def summarise_risk(results):
+    """Wrap per-target predictions in the predict_risk_score output contract."""
+    soil_risk = abs(results['soil_temperature_0cm']['delta']) > 5.0
+    wind_risk = results['wind_speed_10m']['delta'] > 10.0 
+    
+    return {
+        "predictions": results,
+        "risk_level": "CRITICAL" if (soil_risk or wind_risk) else "STABLE",
+        # Flattened keys for easy access in your main agent
+        "predicted_soil_temp": results['soil_temperature_0cm']['predicted'],
+        "actual_soil_temp": results['soil_temperature_0cm']['actual'],
+        "anomaly_delta": results['soil_temperature_0cm']['delta']
+    }
@@ -1,57 +1,143 @@
 from weatherPrediction import WeatherModel
+from climatologyPrediction import ClimatologyModel
+import os
 import numpy as np
-import pandas as pd
 import requests
-import pgeocode
+import threading
+import breaker
+import metrics
+from anomaly_modes import DEFAULT_ANOMALY_MODE
+from cache import get_cache
+from log_setup import get_logger, debug_dumps_enabled
+from weather_fetcher import batch_params, plan_batches, split_locations
+from weather_schema import frame_from_hourly
+
+logger = get_logger(__name__)
+
+# Anomaly estimators selectable per request. "climatology" skips model training
+# and is meant for latency-critical callers that only need the anomaly flag.
+# The keys are listed again in anomaly_modes.ANOMALY_MODE_NAMES for request validation.
+ANOMALY_MODES = {
+    "xgboost": WeatherModel,
+    "climatology": ClimatologyModel,
+}
+
+# Overridable so load tests can point at a local stand-in
+FORECAST_URL = os.getenv("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+FORECAST_VARIABLES = ["temperature_2m", "precipitation", "soil_temperature_0cm",
+                      "wind_speed_10m", "cloud_cover", "wind_direction_10m", "precipitation_probability", "weather_code"]
+PAST_DAYS = 92      # Get last 3 months of history for training
+FORECAST_DAYS = 2   # Get today's forecast
+FORECAST_TIMEOUT_S = float(os.getenv("FORECAST_TIMEOUT_S", "30"))
+
+# Last good forecast frame per ~1km point, served (marked stale) while Open-Meteo is unavailable.
+# Stored in the compact weather_schema dtypes: ~85KB pickled for the 94-day window, so the
+# default cap is ~17MB per process (the raw JSON would be several times that).
+FORECAST_LAST_GOOD_S = float(os.getenv("FORECAST_LAST_GOOD_S", str(24 * 3600)))
+FORECAST_LAST_GOOD_ENTRIES = int(os.getenv("FORECAST_LAST_GOOD_ENTRIES", "200"))
+last_good_forecasts = get_cache("last_good_forecasts", fresh_s=FORECAST_LAST_GOOD_S,
+                                max_entries=FORECAST_LAST_GOOD_ENTRIES)
+
+# pgeocode parses its whole postcode table on construction, so build it once per country
+_nominatim = {}
+_nominatim_lock = threading.Lock()
+
+
+def get_nominatim(country_code="gb"):
+    with _nominatim_lock:
+        if country_code not in _nominatim:
+            import pgeocode
+            _nominatim[country_code] = pgeocode.Nominatim(country_code)
+        return _nominatim[country_code]
+
+
+def fetch_forecasts(locations, max_locations=None, max_values=None):
+    """
+    Forecast responses for many (lat, lon) points, packing several into each request.
+
+    Returns one raw response dict per location, in order (None where its batch failed).
+    """
+    values_per_location = (PAST_DAYS + FORECAST_DAYS) * 24 * len(FORECAST_VARIABLES)
+    results = [None] * len(locations)
+    for lo, hi in plan_batches(len(locations), values_per_location, max_locations, max_values):
+        params = batch_params(locations[lo:hi], past_days=PAST_DAYS, forecast_days=FORECAST_DAYS,
+                              hourly=FORECAST_VARIABLES, timezone="auto")
+        try:
+            with breaker.guard("open_meteo_forecast"):
+                response = requests.get(FORECAST_URL, params=params, timeout=FORECAST_TIMEOUT_S)
+                response.raise_for_status()
+            for i, location_data in enumerate(split_locations(response.json())):
+                results[lo + i] = location_data
+        except Exception as e:
+            logger.warning("Open-Meteo forecast request for %d locations failed: %s", hi - lo, e)
+    return results
 
 
 class WeatherSubAgent:
-    def __init__(self, postcode, country_code="gb"):
-        self.model = WeatherModel()
+    def __init__(self, postcode, country_code="gb", mode=None, coordinates=None, raw_data=None):
+        self.mode = mode or DEFAULT_ANOMALY_MODE
+        if self.mode not in ANOMALY_MODES:
+            raise ValueError(f"Unknown anomaly mode: {self.mode}")
+        self.model = ANOMALY_MODES[self.mode]()
         self.postcode = postcode
         self.country_code = country_code
+        # Age of the forecast when it is a last known good copy rather than a fresh fetch
+        self.stale_age_s = None
 
-        # 1. Get Coordinates
-        self.nomi = pgeocode.Nominatim(country_code)
-        self.location = self.nomi.query_postal_code(postcode)
-        self.lat = self.location.latitude
-        self.long = self.location.longitude
+        # 1. Get Coordinates (batch callers that already know them pass `coordinates`)
+        if coordinates is not None:
+            self.lat, self.long = coordinates
+        else:
+            with metrics.stage("weather.geocode"):
+                self.nomi = get_nominatim(country_code)
+                self.location = self.nomi.query_postal_code(postcode)
+            self.lat = self.location.latitude
+            self.long = self.location.longitude
 
         if np.isnan(self.lat):
             raise ValueError(f"Invalid Postcode: {postcode}")
 
         # 2. Fetch Data & Train
-        print(f"Fetching weather data for {postcode} ({self.lat}, {self.long})...")
-        raw_data = self.fetch_data()
-        
+        logger.info("Fetching weather data for %s (%s, %s)", postcode, self.lat, self.long)
+        fetched = raw_data is None
+        if fetched:
+            with metrics.stage("weather.fetch"):
+                raw_data = self.fetch_data()
+
+        self.dataframe = None
         if raw_data and "hourly" in raw_data:
-            self.dataframe = pd.DataFrame(raw_data["hourly"])
+            self.dataframe = frame_from_hourly(raw_data["hourly"])
+            if fetched:
+                last_good_forecasts.set(self._last_good_key(), self.dataframe)
+        elif fetched:
+            self.dataframe = self._last_good_frame()
+
+        if self.dataframe is not None:
             # Train the model immediately
-            print(self.dataframe.tail(200))
-            success = self.model.train(self.dataframe)
+            if debug_dumps_enabled(logger):
+                logger.debug("Weather frame tail:\n%s", self.dataframe.tail(200))
+            with metrics.stage("weather.train"):
+                if self.mode == "xgboost":
+                    success = self.model.train(self.dataframe, parallel=True)
+                else:
+                    success = self.model.train(self.dataframe)
             if not success:
-                print("WARNING: Model training failed due to empty data.")
+                logger.warning("Model training failed due to empty data")
         else:
             raise ValueError("Failed to fetch weather data. Check API connection.")
 
     def fetch_data(self):
-        url = "https://api.open-meteo.com/v1/forecast"
-        params = {
-            "latitude": self.lat,
-            "longitude": self.long,
-            "past_days": 92,    # Get last 3 months of history for training
-            "forecast_days": 2, # Get today's forecast
-            "hourly": ["temperature_2m", "precipitation", "soil_temperature_0cm", 
-                       "wind_speed_10m", "cloud_cover", "wind_direction_10m", "precipitation_probability", "weather_code"],
-            "timezone": "auto",
-        }
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            print(f"API Request Error: {e}")
-            return None
+        return fetch_forecasts([(self.lat, self.long)])[0]
+
+    def _last_good_key(self):
+        return f"{self.lat:.2f},{self.long:.2f}"
+
+    def _last_good_frame(self):
+        frame, _, age = last_good_forecasts.get(self._last_good_key())
+        if frame is not None:
+            logger.warning("Open-Meteo unavailable, using the forecast fetched %.0fs ago", age)
+            self.stale_age_s = age
+        return frame
 
     def get_strategy_signal(self):
         analysis = self.model.predict_risk_score(self.dataframe)
@@ -0,0 +1,197 @@
+"""
+Hive-partitioned (region/year/month) parquet layout for the raw and labeled weather data.
+
+Readers push time ranges down to partition pruning plus row-group statistics and only
+materialise the requested columns, so a one-week history lookup touches one or two
+row groups instead of a 15-year file. Frames come back in the weather_schema dtypes;
+labeled partitions are also written in them.
+
+    python weather_dataset.py migrate     # convert data/raw/*.parquet and data/labeled/*_labeled.parquet
+"""
+import glob
+import os
+import shutil
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+import weather_schema
+
+DATASET_ROOTS = {"raw": "data/raw_ds", "labeled": "data/labeled_ds"}
+LEGACY_PATTERNS = {"raw": "data/raw/{region}.parquet", "labeled": "data/labeled/{region}_labeled.parquet"}
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("region", pa.string()), ("year", pa.int16()), ("month", pa.int8())]),
+    flavor="hive",
+)
+# Layout below one region's directory
+REGION_PARTITIONING = ds.partitioning(pa.schema([("year", pa.int16()), ("month", pa.int8())]), flavor="hive")
+
+# One row group per week of hourly rows: a month file holds ~4-5 groups, each with
+# min/max statistics on `timestamp`, so sub-month range reads skip most of the file.
+ROW_GROUP_ROWS = 24 * 7
+
+
+def _root(kind, root=None):
+    return root or DATASET_ROOTS[kind]
+
+
+def save_region(df, kind, region, root=None):
+    """
+    Write one region's frame into the partitioned dataset, replacing all of its old partitions.
+
+    The region is written to a hidden directory beside it and renamed into place, so readers
+    never see a partly written file. Labeled frames are stored in the compact schema with
+    dictionary-encoded codes and flags; raw frames keep full precision because labeling runs on them.
+    """
+    df = df.sort_values("timestamp").reset_index(drop=True)
+    ts = weather_schema.parse_times(df["timestamp"])
+    df = df.drop(columns="region", errors="ignore").assign(
+        timestamp=ts, year=ts.dt.year.astype("int16"), month=ts.dt.month.astype("int8"))
+    if kind == "labeled":
+        weather_schema.apply(df)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    file_format = ds.ParquetFileFormat()
+    dictionary = weather_schema.dictionary_columns(df) if kind == "labeled" else True
+    # Hidden names: dataset discovery skips paths starting with "."
+    final = region_path(kind, region, root)
+    tmp = os.path.join(_root(kind, root), f".region={region}.tmp-{os.getpid()}")
+    old = os.path.join(_root(kind, root), f".region={region}.old-{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    ds.write_dataset(
+        table,
+        tmp,
+        format=file_format,
+        partitioning=REGION_PARTITIONING,
+        file_options=file_format.make_write_options(compression="zstd", write_statistics=True,
+                                                   use_dictionary=dictionary),
+        min_rows_per_group=ROW_GROUP_ROWS,
+        max_rows_per_group=ROW_GROUP_ROWS,
+        basename_template="part-{i}.parquet",
+    )
+    # A directory can only be renamed over an empty one, so move the old copy aside first
+    if os.path.isdir(final):
+        os.replace(final, old)
+    os.replace(tmp, final)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def region_path(kind, region, root=None):
+    """Directory holding every partition of one region."""
+    return os.path.join(_root(kind, root), "region=" + region)
+
+
+def has_dataset(kind, root=None):
+    return os.path.isdir(_root(kind, root))
+
+
+def list_regions(kind, root=None):
+    """Regions available in the dataset (or in the legacy one-file-per-region layout)."""
+    if has_dataset(kind, root):
+        return sorted(
+            d.split("=", 1)[1] for d in os.listdir(_root(kind, root)) if d.startswith("region=")
+        )
+    suffix = "_labeled.parquet" if kind == "labeled" else ".parquet"
+    pattern = LEGACY_PATTERNS[kind].format(region="*")
+    return sorted(os.path.basename(f)[:-len(suffix)] for f in glob.glob(pattern))
+
+
+def _time_filter(dataset, start, end):
+    """Partition-pruning and row-group filter for start <= timestamp < end."""
+    ts_type = dataset.schema.field("timestamp").type
+    year, month = ds.field("year"), ds.field("month")
+    expr = None
+    if start is not None:
+        start = pd.Timestamp(start)
+        part = (year > start.year) | ((year == start.year) & (month >= start.month))
+        rows = ds.field("timestamp") >= pa.scalar(start.to_pydatetime(), type=ts_type)
+        expr = part & rows
+    if end is not None:
+        end = pd.Timestamp(end)
+        part = (year < end.year) | ((year == end.year) & (month <= end.month))
+        rows = ds.field("timestamp") < pa.scalar(end.to_pydatetime(), type=ts_type)
+        expr = part & rows if expr is None else expr & part & rows
+    return expr
+
+
+def read_weather(kind, region=None, start=None, end=None, columns=None, root=None, compact=True):
+    """
+    Read rows for start <= timestamp < end, projecting to `columns` (timestamp is always kept).
+
+    Falls back to the legacy single-file layout when the dataset has not been migrated.
+    `compact=False` keeps the stored dtypes (the labeler reads raw data at full precision).
+    """
+    if columns is not None and "timestamp" not in columns:
+        columns = ["timestamp"] + list(columns)
+
+    if not has_dataset(kind, root):
+        df = _read_legacy(kind, region, start, end, columns)
+        return weather_schema.apply(df) if compact else df
+
+    # A region's read only lists its own directory, so it never opens files that another
+    # region's build is replacing
+    if region is not None:
+        dataset = ds.dataset(region_path(kind, region, root), format="parquet", partitioning=REGION_PARTITIONING)
+    else:
+        dataset = ds.dataset(_root(kind, root), format="parquet", partitioning=PARTITIONING)
+    expr = _time_filter(dataset, start, end)
+
+    if columns is None:
+        # Partition keys are layout, not data (labeled frames carry their own `month`)
+        layout = ("region", "year") if kind == "labeled" else ("region", "year", "month")
+        columns = [c for c in dataset.schema.names if c not in layout]
+        if region is None:
+            columns.append("region")
+
+    df = dataset.to_table(columns=columns, filter=expr).to_pandas()
+    df = df.sort_values("timestamp").reset_index(drop=True)
+    return weather_schema.apply(df) if compact else df
+
+
+def _read_legacy(kind, region, start, end, columns):
+    regions = [region] if region else list_regions(kind)
+    frames = []
+    for r in regions:
+        df = pd.read_parquet(LEGACY_PATTERNS[kind].format(region=r), columns=columns)
+        if region is None:
+            df["region"] = r
+        frames.append(df)
+    df = pd.concat(frames, ignore_index=True)
+    if start is not None:
+        df = df[df["timestamp"] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df["timestamp"] < pd.Timestamp(end)]
+    return df.sort_values("timestamp").reset_index(drop=True)
+
+
+def load_region(kind, region, columns=None, compact=True):
+    """Full history for one region (the per-region training / labeling read)."""
+    return read_weather(kind, region=region, columns=columns, compact=compact)
+
+
+def read_history(kind, region, at, hours, columns=None):
+    """Point-in-time lookup: the `hours` hourly rows ending at (and including) `at`."""
+    at = pd.Timestamp(at)
+    return read_weather(kind, region=region, start=at - pd.Timedelta(hours=hours - 1),
+                        end=at + pd.Timedelta(hours=1), columns=columns)
+
+
+def migrate():
+    for kind in ("raw", "labeled"):
+        if has_dataset(kind):
+            print(f"{DATASET_ROOTS[kind]} already exists, skipping")
+            continue
+        for region in list_regions(kind):
+            df = pd.read_parquet(LEGACY_PATTERNS[kind].format(region=region))
+            save_region(df, kind, region)
+            print(f"{kind}/{region}: {len(df)} rows")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["migrate"]:
+        migrate()
+    else:
+        print(__doc__)
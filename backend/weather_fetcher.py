@@ -4,10 +4,38 @@ from datetime import datetime, timedelta
 import requests
 import time
 import os
-from tqdm import tqdm
+import breaker
+
+# Open-Meteo takes comma-separated coordinate lists; a batch is capped by location count and
+# by total values (locations x hours x variables) so responses stay a manageable size
+MAX_BATCH_LOCATIONS = int(os.getenv("OPEN_METEO_BATCH_LOCATIONS", "100"))
+MAX_BATCH_VALUES = int(os.getenv("OPEN_METEO_BATCH_VALUES", "2000000"))
+
+
+def plan_batches(n_locations, values_per_location, max_locations=None, max_values=None):
+    """[(start, stop), ...] slices of the location list, each within both limits."""
+    max_locations = max_locations or MAX_BATCH_LOCATIONS
+    max_values = max_values or MAX_BATCH_VALUES
+    size = max(1, min(max_locations, max_values // max(values_per_location, 1)))
+    return [(i, min(i + size, n_locations)) for i in range(0, n_locations, size)]
+
+
+def batch_params(locations, **params):
+    """Request params for several (lat, lon) points in one Open-Meteo call."""
+    return {
+        "latitude": ",".join(f"{lat:.4f}" for lat, _ in locations),
+        "longitude": ",".join(f"{lon:.4f}" for _, lon in locations),
+        **params,
+    }
+
+
+def split_locations(data):
+    """Open-Meteo answers one location with an object and several with a list, in request order."""
+    return data if isinstance(data, list) else [data]
+
 
 class WeatherDataFetcher:
-    BASE_URL = "https://archive-api.open-meteo.com/v1/archive"
+    BASE_URL = os.getenv("OPEN_METEO_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive")
     UK_REGIONS = {
         'scotland': (57.0, -4.0), 'northeast': (55.0, -1.5),
         'northwest': (53.5, -2.5), 'yorkshire': (53.8, -1.5),
@@ -16,47 +44,97 @@ class WeatherDataFetcher:
     }
     VARIABLES = ['temperature_2m', 'precipitation', 'soil_moisture_0_to_7cm', 'wind_gusts_10m']
     
-    def __init__(self):
+    def __init__(self, attempts=5, max_backoff_s=None, timeout=120):
+        # Serving callers pass a small max_backoff_s; backfills can wait out rate limits
+        self.attempts = attempts
+        self.max_backoff_s = max_backoff_s
+        self.timeout = timeout
         self.session = requests.Session()
     
-    def fetch_historical_data(self, latitude, longitude, years=15, location_name="custom", start_date_str=None, end_date_str=None):
+    def _date_range(self, years, start_date_str, end_date_str):
         if not start_date_str:
             end_date = datetime.now()
             start_date = end_date - timedelta(days=365 * years)
             start_date_str = start_date.strftime('%Y-%m-%d')
             end_date_str = end_date.strftime('%Y-%m-%d')
-            
-        params = {
-            'latitude': latitude, 'longitude': longitude,
-            'start_date': start_date_str,
-            'end_date': end_date_str,
-            'hourly': ','.join(self.VARIABLES), 'timezone': 'Europe/London'
-        }
-        
-        for attempt in range(5):
+        return start_date_str, end_date_str
+
+    def _backoff(self, attempt, seconds):
+        if attempt + 1 < self.attempts:
+            time.sleep(seconds if self.max_backoff_s is None else min(seconds, self.max_backoff_s))
+
+    def _get(self, params):
+        """GET the archive API with retries; parsed JSON or None (also while its circuit is open)."""
+        for attempt in range(self.attempts):
             try:
-                response = self.session.get(self.BASE_URL, params=params, timeout=120)
+                breaker.check("open_meteo_archive")
+            except breaker.CircuitOpen:
+                return None
+            start = time.perf_counter()
+            try:
+                response = self.session.get(self.BASE_URL, params=params, timeout=self.timeout)
                 if response.status_code == 429:
-                    time.sleep(60 * (attempt + 1))
+                    breaker.record("open_meteo_archive", time.perf_counter() - start, ok=False)
+                    self._backoff(attempt, 60 * (attempt + 1))
                     continue
                 response.raise_for_status()
                 data = response.json()
-                df = pd.DataFrame(data['hourly'])
-                df['time'] = pd.to_datetime(df['time'])
-                df.rename(columns={'time': 'timestamp'}, inplace=True)
-                return df
+                breaker.record("open_meteo_archive", time.perf_counter() - start, ok=True)
+                return data
             except Exception:
-                time.sleep(5)
+                breaker.record("open_meteo_archive", time.perf_counter() - start, ok=False)
+                self._backoff(attempt, 5)
         return None
 
-    def save_regional_data(self, output_dir="data/raw"):
-        if not os.path.exists(output_dir): os.makedirs(output_dir)
-        for name, (lat, lon) in tqdm(self.UK_REGIONS.items(), desc="Downloading Weather Data"):
-            df = self.fetch_historical_data(latitude=lat, longitude=lon, location_name=name)
+    @staticmethod
+    def _to_frame(location_data):
+        df = pd.DataFrame(location_data['hourly'])
+        df['time'] = pd.to_datetime(df['time'])
+        df.rename(columns={'time': 'timestamp'}, inplace=True)
+        return df
+
+    def fetch_historical_data(self, latitude, longitude, years=15, location_name="custom", start_date_str=None, end_date_str=None):
+        start_date_str, end_date_str = self._date_range(years, start_date_str, end_date_str)
+        params = {
+            'latitude': latitude, 'longitude': longitude,
+            'start_date': start_date_str,
+            'end_date': end_date_str,
+            'hourly': ','.join(self.VARIABLES), 'timezone': 'Europe/London'
+        }
+        data = self._get(params)
+        return self._to_frame(data) if data is not None else None
+
+    def fetch_historical_batch(self, locations, years=15, start_date_str=None, end_date_str=None,
+                               max_locations=None, max_values=None):
+        """
+        Hourly archive data for many (lat, lon) points with as few requests as the limits allow.
+
+        Returns one DataFrame per location, in order (None where its batch failed).
+        """
+        start_date_str, end_date_str = self._date_range(years, start_date_str, end_date_str)
+        days = (datetime.strptime(end_date_str, '%Y-%m-%d') - datetime.strptime(start_date_str, '%Y-%m-%d')).days + 1
+        frames = [None] * len(locations)
+        for lo, hi in plan_batches(len(locations), days * 24 * len(self.VARIABLES), max_locations, max_values):
+            params = batch_params(locations[lo:hi], start_date=start_date_str, end_date=end_date_str,
+                                  hourly=','.join(self.VARIABLES), timezone='Europe/London')
+            data = self._get(params)
+            if data is None:
+                continue
+            for i, location_data in enumerate(split_locations(data)):
+                frames[lo + i] = self._to_frame(location_data)
+        return frames
+
+    def save_regional_data(self, output_dir=None):
+        # output_dir=None writes to weather_dataset.DATASET_ROOTS["raw"]
+        # Backfill-only dependencies
+        from tqdm import tqdm
+        from weather_dataset import save_region
+
+        names = list(self.UK_REGIONS)
+        frames = self.fetch_historical_batch([self.UK_REGIONS[name] for name in names])
+        for name, df in tqdm(zip(names, frames), total=len(names), desc="Saving Weather Data"):
             if df is not None:
-                output_path = os.path.join(output_dir, name + ".parquet")
-                df.to_parquet(output_path, engine='pyarrow', index=False)
-                time.sleep(2)
+                save_region(df, "raw", name, root=output_dir)
 
 def get_nearest_region(lat, lon):
     best_region = None
@@ -0,0 +1,60 @@
+"""
+Column dtype policy for the hourly weather frames.
+
+Measurements and model features are float32 (XGBoost bins in float32, so model inputs are
+unchanged). Codes and flags are int8, or nullable Int8 where the API can return nulls. Partition
+keys are small ints and region is categorical. Timestamps are parsed once, at ingest.
+
+Frames are converted where they enter the process: forecast JSON via frame_from_hourly and
+parquet via weather_dataset.read_weather. Labeled files are written in the same dtypes.
+Raw archive data stays float64 on disk and is labeled at full precision.
+"""
+import pandas as pd
+
+FLOAT_DTYPE = "float32"
+TIME_COLUMNS = ("time", "timestamp")
+INT_COLUMNS = {"weather_code": "int8", "target": "int8", "month": "int8", "year": "int16"}
+FLAG_SUFFIX = "_is_extreme"
+CATEGORY_COLUMNS = ("region",)
+
+
+def column_dtype(name, series):
+    """Policy dtype for one column, or None to leave it as it is."""
+    if name in CATEGORY_COLUMNS:
+        return "category"
+    if name in INT_COLUMNS or name.endswith(FLAG_SUFFIX):
+        dtype = INT_COLUMNS.get(name, "int8")
+        # numpy ints cannot hold missing values; fall back to the nullable pandas type
+        return dtype.capitalize() if series.hasnans else dtype
+    if pd.api.types.is_float_dtype(series):
+        return FLOAT_DTYPE
+    return None
+
+
+def parse_times(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.to_datetime(series, format="ISO8601")
+
+
+def apply(df):
+    """Convert `df` to the policy dtypes in place and return it."""
+    for name in df.columns:
+        if name in TIME_COLUMNS:
+            df[name] = parse_times(df[name])
+            continue
+        dtype = column_dtype(name, df[name])
+        if dtype is not None and df[name].dtype != dtype:
+            df[name] = df[name].astype(dtype)
+    return df
+
+
+def frame_from_hourly(hourly):
+    """DataFrame from an Open-Meteo `hourly` block, already in policy dtypes."""
+    return apply(pd.DataFrame(hourly))
+
+
+def dictionary_columns(df):
+    """Low-cardinality columns worth dictionary-encoding in parquet."""
+    return [name for name in df.columns
+            if name in INT_COLUMNS or name.endswith(FLAG_SUFFIX) or name in CATEGORY_COLUMNS]